@@ -1,28 +1,19 @@
 # app/api/admin.py
 from fastapi import APIRouter, Request, HTTPException, Depends, Path
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, FileResponse
 from sqlmodel import Session, select
 from typing import List, Dict, Any
 import logging
 from app.db import engine
 from app.models import User
+from app.utils.session import get_current_user_from_cookie, invalidate_principal, Principal
+from app.utils.profiling import arm_sync_profile, sync_profile_status, list_profiles, profile_path
 from datetime import datetime
 
 logger = logging.getLogger("wotcs.admin")
 router = APIRouter()
 
-# Helper: obtain current user from cookie (local copy of logic to avoid circular import)
-def get_current_user_from_cookie(request: Request) -> User:
-    username = request.cookies.get("user")
-    if not username:
-        raise HTTPException(status_code=401, detail="Não autenticado")
-    with Session(engine) as s:
-        user = s.exec(select(User).where(User.username == username)).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="Usuário não existe")
-        return user
-
-def require_commander(request: Request) -> User:
+def require_commander(request: Request) -> Principal:
     user = get_current_user_from_cookie(request)
     if getattr(user, "role", None) != "commander":
         raise HTTPException(status_code=403, detail="Apenas comandantes podem acessar")
@@ -30,7 +21,7 @@ def require_commander(request: Request) -> User:
 
 # GET /admin/pending -> lista usuários com role='pending'
 @router.get("/admin/pending")
-def list_pending(request: Request, commander: User = Depends(require_commander)):
+def list_pending(request: Request, commander: Principal = Depends(require_commander)):
     with Session(engine) as s:
         rows = s.exec(select(User).where(User.role == "pending")).all()
         out = []
@@ -41,7 +32,7 @@ def list_pending(request: Request, commander: User = Depends(require_commander))
 
 # POST /admin/promote/{user_id} -> promove para commander (grava auditoria se tabelas existirem)
 @router.post("/admin/promote/{user_id}")
-def promote_user(request: Request, user_id: int = Path(...), commander: User = Depends(require_commander)):
+def promote_user(request: Request, user_id: int = Path(...), commander: Principal = Depends(require_commander)):
     promoted_by = commander.username
     now = datetime.utcnow()
     with Session(engine) as s:
@@ -56,6 +47,8 @@ def promote_user(request: Request, user_id: int = Path(...), commander: User = D
         s.add(target)
         s.commit()
         s.refresh(target)
+        # sessões existentes passam a enxergar a nova role sem novo login
+        invalidate_principal(target.username)
 
         # Try insert audit record (if role_changes table exists)
         try:
@@ -69,3 +62,45 @@ def promote_user(request: Request, user_id: int = Path(...), commander: User = D
             logger.debug("role_changes table not present or audit insert failed; continuing without audit")
 
     return JSONResponse(content={"ok": True, "user_id": user_id, "old_role": old_role, "new_role": "commander", "promoted_by": promoted_by})
+
+
+# POST /admin/sync/clan/{clan_id} -> sync só de um dos clãs configurados (CLAN_IDS)
+@router.post("/admin/sync/clan/{clan_id}")
+def sync_clan(request: Request, clan_id: int = Path(...), commander: Principal = Depends(require_commander)):
+    from app.utils.clans import CLAN_IDS
+    from app.sync import enqueue_clan_sync
+
+    if clan_id not in CLAN_IDS:
+        raise HTTPException(status_code=404, detail="Clã não configurado em CLAN_IDS")
+    result = enqueue_clan_sync(clan_id)
+    if result["status"] == "cooldown":
+        return JSONResponse(result, status_code=429, headers={"Retry-After": str(result["retry_after"])})
+    return JSONResponse(result, status_code=202)
+
+# POST /admin/profile/sync -> o próximo sync completo roda com o profiler (?run=1 já enfileira um; com worker separado sempre enfileira)
+@router.post("/admin/profile/sync")
+def arm_sync_profiling(request: Request, run: bool = False, commander: Principal = Depends(require_commander)):
+    from app.sync import SYNC_IN_PROCESS, enqueue_full_sync
+
+    if not SYNC_IN_PROCESS:
+        # worker separado: o pedido leva o profiling e o worker arma o profiler dele
+        queued = enqueue_full_sync(profile_by=commander.username)
+        return JSONResponse(content={"ok": True, "armed": {"requested_by": commander.username, "worker": True}, "queued": queued})
+    armed = arm_sync_profile(commander.username)
+    queued = None
+    if run:
+        queued = enqueue_full_sync()
+    return JSONResponse(content={"ok": True, "armed": armed, "queued": queued})
+
+# GET /admin/profiles -> arquivos em data/profiles/ + estado do profiling do sync
+@router.get("/admin/profiles")
+def get_profiles(request: Request, commander: Principal = Depends(require_commander)):
+    return JSONResponse(content={"sync": sync_profile_status(), "profiles": list_profiles()})
+
+# GET /admin/profiles/{name} -> download (collapsed stacks: flamegraph.pl / speedscope)
+@router.get("/admin/profiles/{name}")
+def download_profile(request: Request, name: str = Path(...), commander: Principal = Depends(require_commander)):
+    path = profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile não encontrado")
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=name)
@@ -2,108 +2,60 @@
 """
 Auth routes for WOT Clan Dashboard
 - register: requires account_id or nickname (resolved from DB), verifies clan membership via WG API (cached)
-- login / logout: cookie-based for POC
+- login / logout: signed session cookie (see app/utils/session.py)
 
 Notes:
 - We resolve nickname -> account_id from the local Player table (no async calls).
 - Role is forced to 'member' server-side.
 - Passwords: SHA256 -> base64-url -> bcrypt (safe under bcrypt 72-byte limit).
+  Hashing runs in a dedicated process pool (app/utils/passwords.py) so login
+  bursts don't starve the threadpool that serves pages.
 """
 
 import logging
-import hashlib
-import base64
 import os
-import json
-import time
-from pathlib import Path
 from typing import Optional
 from urllib.parse import quote
 
-import httpx
 from fastapi import APIRouter, Request, Form
-from fastapi.responses import RedirectResponse
+from fastapi.responses import RedirectResponse, JSONResponse
+from starlette.concurrency import run_in_threadpool
 from sqlmodel import Session, select
-from passlib.context import CryptContext
 from sqlalchemy.exc import IntegrityError
 
 from app.db import engine
 from app.models import User, Player
+from app.utils.clan_members import CLAN_MEMBERSHIP
+from app.utils.nickname_index import NICKNAME_INDEX
+from app.utils.roster import active_player_clause
+from app.utils.session import issue_token, SESSION_COOKIE, SESSION_TTL
+from app.utils.passwords import (
+    hash_password_async,
+    verify_password_async,
+    needs_rehash,
+    PasswordPoolBusy,
+)
 
 logger = logging.getLogger("wotcs.auth")
 
-# Config / cache
+# Config
 WOT_APP_ID = os.getenv("WOT_APP_ID", "")
-CLAN_ID = os.getenv("CLAN_ID", "")
 # Use realm configured in env; default to the NA API host we used elsewhere
 WOT_REALM = os.getenv("WOT_REALM", "https://api.worldoftanks.com")
 
-MEMBERS_CACHE_PATH = Path("data/members_cache.json")
-MEMBERS_CACHE_TTL = 60 * 10  # 10 minutes
-
-pwdctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
 router = APIRouter()
 
 
 # -------------------------
-# Cache helpers
-# -------------------------
-def load_members_cache():
-    if not MEMBERS_CACHE_PATH.exists():
-        return {"ts": 0, "members": []}
-    try:
-        with open(MEMBERS_CACHE_PATH, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception as exc:
-        logger.exception("Failed to load members cache: %s", exc)
-        return {"ts": 0, "members": []}
-
-
-def save_members_cache(data):
-    try:
-        MEMBERS_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
-        with open(MEMBERS_CACHE_PATH, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as exc:
-        logger.exception("Failed to save members cache: %s", exc)
-
-
-# -------------------------
-# WG API helpers
+# Clan membership (in-memory set shared with fetch_and_sync)
 # -------------------------
 def fetch_clan_members(force_refresh: bool = False):
     """
     Returns a list of account_id integers of clan members.
-    Uses a local cache to avoid excessive API calls.
-    NOTE: we intentionally do a 'light' call (no extra param) because some realms
-    returned INVALID_EXTRA previously. If you want to re-enable extra=members,
-    test against your realm.
+    Backed by CLAN_MEMBERSHIP (app/utils/clan_members.py): in-memory set,
+    single-flight stale-while-revalidate refresh, disk cache written on change.
     """
-    cache = load_members_cache()
-    now = int(time.time())
-    if not force_refresh and cache.get("ts", 0) + MEMBERS_CACHE_TTL > now and cache.get("members"):
-        return cache["members"]
-
-    if not WOT_APP_ID or not CLAN_ID:
-        logger.warning("WOT_APP_ID or CLAN_ID not configured.")
-        return []
-
-    try:
-        # call without `extra=members` to be conservative (works for your realm)
-        url = f"{WOT_REALM}/wot/clans/info/?application_id={WOT_APP_ID}&clan_id={CLAN_ID}"
-        with httpx.Client(timeout=10) as client:
-            r = client.get(url)
-            r.raise_for_status()
-            js = r.json()
-            # sometimes the response includes 'members' under data.<clan_id>
-            members = js.get("data", {}).get(str(CLAN_ID), {}).get("members", []) or []
-            account_ids = [int(m["account_id"]) for m in members if "account_id" in m]
-            save_members_cache({"ts": now, "members": account_ids})
-            return account_ids
-    except Exception as exc:
-        logger.exception("Erro ao buscar membros do WG (fetch_clan_members): %s", exc)
-        # fallback to whatever we have in cache
-        return cache.get("members", [])
+    return list(CLAN_MEMBERSHIP.members(force_refresh=force_refresh))
 
 
 # -------------------------
@@ -111,20 +63,28 @@ def fetch_clan_members(force_refresh: bool = False):
 # -------------------------
 def resolve_account_id_from_db(nickname: str) -> Optional[int]:
     """
-    Try to find the player's account_id in local Player table.
-    First exact (case-insensitive), then substring match as fallback.
+    Try to find the player's account_id among known players.
+    First exact (case-insensitive), then prefix/substring match as fallback.
+    Served from the in-memory NICKNAME_INDEX; SQL is only used when the index
+    is unavailable or on PostgreSQL (where ILIKE hits the pg_trgm GIN index).
     """
     if not nickname:
         return None
+    acc = NICKNAME_INDEX.resolve(nickname)  # constrói o índice na primeira chamada
+    if acc is not None:
+        return acc
+    if NICKNAME_INDEX.built and engine.dialect.name != "postgresql":
+        # índice refletindo a tabela: evitar o full scan do ILIKE no SQLite
+        return None
     try:
         with Session(engine) as s:
             # exact case-insensitive
-            q = select(Player).where(Player.nickname.ilike(nickname))
+            q = select(Player).where(Player.nickname.ilike(nickname), active_player_clause())
             p = s.exec(q).first()
             if p:
                 return int(p.account_id)
             # substring fallback
-            q2 = select(Player).where(Player.nickname.ilike(f"%{nickname}%"))
+            q2 = select(Player).where(Player.nickname.ilike(f"%{nickname}%"), active_player_clause())
             p2 = s.exec(q2).first()
             if p2:
                 return int(p2.account_id)
@@ -133,52 +93,21 @@ def resolve_account_id_from_db(nickname: str) -> Optional[int]:
     return None
 
 
-# -------------------------
-# Password helpers (SHA256 -> base64-url -> bcrypt)
-# -------------------------
-def _prehash_to_b64(password: str) -> str:
-    """
-    SHA256 -> urlsafe base64 (sem '=') — e garante <=72 bytes UTF-8.
-    """
-    digest = hashlib.sha256(password.encode("utf-8")).digest()
-    b64 = base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
-    # garante comprimento máximo em bytes para bcrypt (72)
-    b64_bytes = b64.encode("utf-8")
-    if len(b64_bytes) > 72:
-        # trunca os bytes a 72 e decoda ignorando corrompidos (improvável)
-        b64 = b64_bytes[:72].decode("ascii", errors="ignore")
-    return b64
-
-def hash_password(pw: str) -> str:
-    """
-    Hash seguro para armazenamento: prehash + bcrypt.
-    Trunca novamente como fallback se bcrypt reclamar.
-    """
-    short = _prehash_to_b64(pw)
-    try:
-        return pwdctx.hash(short)
-    except ValueError as e:
-        # fallback defensivo: corta bytes e re-tenta
-        short_bytes = short.encode("utf-8")[:72]
-        short2 = short_bytes.decode("ascii", errors="ignore")
-        return pwdctx.hash(short2)
-
-def verify_password(plain: str, hashed: str) -> bool:
-    short = _prehash_to_b64(plain)
-    try:
-        return pwdctx.verify(short, hashed)
-    except ValueError:
-        # caso o hashed tenha sido gerado com fallback truncado
-        short_bytes = short.encode("utf-8")[:72]
-        short2 = short_bytes.decode("ascii", errors="ignore")
-        return pwdctx.verify(short2, hashed)
+@router.get("/nicknames")
+def nickname_typeahead(q: str = "", limit: int = 10):
+    """Typeahead do formulário de registro: [{account_id, nickname}, ...]."""
+    q = (q or "").strip()
+    if not q:
+        return JSONResponse({"results": []})
+    limit = max(1, min(int(limit), 25))
+    return JSONResponse({"results": NICKNAME_INDEX.search(q, limit)})
 
 
 # -------------------------
 # Register (single consolidated endpoint)
 # -------------------------
 @router.post("/register")
-def register(
+async def register(
     username: str = Form(...),
     password: str = Form(...),
     account_id: Optional[int] = Form(None),
@@ -196,38 +125,27 @@ def register(
         # Resolve account_id: prefer explicit form value
         resolved_id = account_id
         if not resolved_id and nickname:
-            resolved_id = resolve_account_id_from_db(nickname)
+            resolved_id = await run_in_threadpool(resolve_account_id_from_db, nickname)
 
         if not resolved_id:
             return RedirectResponse(url="/auth/register?msg=need_account", status_code=303)
 
-        members = fetch_clan_members()
-        if int(resolved_id) not in members:
+        is_member = await run_in_threadpool(CLAN_MEMBERSHIP.contains, int(resolved_id))
+        if not is_member:
             return RedirectResponse(url="/auth/register?msg=not_member", status_code=303)
 
-        # All good: create user but FORCE role = 'member'
-        with Session(engine) as s:
-            existing = s.exec(select(User).where(User.username == username)).first()
-            if existing:
-                return RedirectResponse(url="/auth/register?msg=exists", status_code=303)
-
-            forced_role = "member"
-            u = User(username=username, password_hash=hash_password(password), role=forced_role)
+        if await run_in_threadpool(_username_exists, username):
+            return RedirectResponse(url="/auth/register?msg=exists", status_code=303)
 
-            # if your User model includes account_id attribute, set it
-            try:
-                if hasattr(u, "account_id"):
-                    setattr(u, "account_id", int(resolved_id))
-            except Exception:
-                # ignore if model differs
-                pass
+        try:
+            password_hash = await hash_password_async(password)
+        except PasswordPoolBusy:
+            logger.warning("Password pool cheio; registro de %s recusado", username)
+            return RedirectResponse(url="/auth/register?msg=busy", status_code=303)
 
-            s.add(u)
-            try:
-                s.commit()
-            except IntegrityError as ie:
-                logger.exception("IntegrityError while committing new user: %s", ie)
-                return RedirectResponse(url="/auth/register?msg=exists", status_code=303)
+        created = await run_in_threadpool(_create_member, username, password_hash, int(resolved_id))
+        if not created:
+            return RedirectResponse(url="/auth/register?msg=exists", status_code=303)
 
         return RedirectResponse(url="/auth/login?msg=registered", status_code=303)
 
@@ -236,22 +154,92 @@ def register(
         return RedirectResponse(url="/auth/register?msg=error", status_code=303)
 
 
+def _username_exists(username: str) -> bool:
+    with Session(engine) as s:
+        return s.exec(select(User.id).where(User.username == username)).first() is not None
+
+
+def _create_member(username: str, password_hash: str, resolved_id: int) -> bool:
+    """Cria o usuário com role forçada 'member'. False se o username já existe."""
+    with Session(engine) as s:
+        existing = s.exec(select(User).where(User.username == username)).first()
+        if existing:
+            return False
+
+        forced_role = "member"
+        u = User(username=username, password_hash=password_hash, role=forced_role)
+
+        # if your User model includes account_id attribute, set it
+        try:
+            if hasattr(u, "account_id"):
+                setattr(u, "account_id", int(resolved_id))
+        except Exception:
+            # ignore if model differs
+            pass
+
+        s.add(u)
+        try:
+            s.commit()
+        except IntegrityError as ie:
+            logger.exception("IntegrityError while committing new user: %s", ie)
+            return False
+    return True
+
+
 # -------------------------
 # Login / Logout
 # -------------------------
-@router.post("/login")
-def login(request: Request, username: str = Form(...), password: str = Form(...)):
+def _load_user(username: str) -> Optional[User]:
+    with Session(engine) as s:
+        return s.exec(select(User).where(User.username == username)).first()
+
+
+def _update_password_hash(user_id: int, password_hash: str) -> None:
     with Session(engine) as s:
-        user = s.exec(select(User).where(User.username == username)).first()
-        if not user or not verify_password(password, user.password_hash):
-            return RedirectResponse(url="/auth/login?msg=invalid", status_code=303)
-        resp = RedirectResponse(url="/dashboard", status_code=303)
-        resp.set_cookie(key="user", value=user.username, httponly=True, secure=False)
-        return resp
+        u = s.get(User, user_id)
+        if u:
+            u.password_hash = password_hash
+            s.add(u)
+            s.commit()
+
+
+@router.post("/login")
+async def login(request: Request, username: str = Form(...), password: str = Form(...)):
+    user = await run_in_threadpool(_load_user, username)
+    try:
+        ok = bool(user) and await verify_password_async(password, user.password_hash)
+    except PasswordPoolBusy:
+        logger.warning("Password pool cheio; login de %s recusado", username)
+        return RedirectResponse(url="/auth/login?msg=busy", status_code=303)
+    if not ok:
+        return RedirectResponse(url="/auth/login?msg=invalid", status_code=303)
+
+    # BCRYPT_ROUNDS mudou desde que o hash foi gerado: regrava com o custo atual
+    if needs_rehash(user.password_hash):
+        try:
+            new_hash = await hash_password_async(password)
+            await run_in_threadpool(_update_password_hash, user.id, new_hash)
+            logger.info("Hash de senha atualizado para o custo atual (user=%s)", user.username)
+        except PasswordPoolBusy:
+            pass  # tenta de novo no próximo login
+        except Exception:
+            logger.exception("Falha ao regravar hash de senha de %s", user.username)
+
+    resp = RedirectResponse(url="/dashboard", status_code=303)
+    resp.set_cookie(
+        key=SESSION_COOKIE,
+        value=issue_token(user),
+        max_age=SESSION_TTL,
+        httponly=True,
+        secure=False,
+        samesite="lax",
+    )
+    return resp
 
 
 @router.post("/logout")
 def logout():
     resp = RedirectResponse(url="/", status_code=303)
-    resp.delete_cookie("user")
+    resp.delete_cookie(SESSION_COOKIE)
+    resp.delete_cookie("user")  # cookie antigo (username em texto puro)
     return resp
\ No newline at end of file
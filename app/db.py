@@ -1,18 +1,152 @@
 # app/db.py
 import os
-from typing import Generator
+import time
+import logging
+import threading
+from typing import Generator, Dict, Any
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
 from sqlmodel import create_engine, SQLModel, Session
 from dotenv import load_dotenv
 
+from app.utils.metrics import REGISTRY
+from app.utils.request_timing import install_sql_timing
+
 load_dotenv()
 
-DATABASE_URL = os.getenv("DATABASE_URL")
+logger = logging.getLogger("wotcs.db")
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/db.sqlite3")
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+
+# -----------------------------
+# Pool config (env)
+# -----------------------------
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))  # seconds; -1 desliga
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1").lower() in ("1", "true", "yes")
+DB_ECHO = os.getenv("DB_ECHO", "0").lower() in ("1", "true", "yes")
+
+# SQLite pragmas (aplicados em cada conexão nova)
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))  # 64 MiB de page cache
+
+
+# -----------------------------
+# Pool metrics
+# -----------------------------
+class PoolMetrics:
+    """Contadores de checkout do pool (tempo de espera e saturação)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+        self.saturated_checkouts = 0  # checkouts que encontraram o pool sem conexão ociosa
+
+    def record(self, waited: float, saturated: bool, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            if waited > self.wait_seconds_max:
+                self.wait_seconds_max = waited
+            if saturated:
+                self.saturated_checkouts += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            avg = self.wait_seconds_total / self.checkouts if self.checkouts else 0.0
+            return {
+                "checkouts": self.checkouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_avg": round(avg, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "timeouts": self.timeouts,
+                "saturated_checkouts": self.saturated_checkouts,
+            }
+
+
+POOL_METRICS = PoolMetrics()
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool que mede quanto tempo cada checkout esperou por uma conexão."""
+
+    def _do_get(self):
+        saturated = self.checkedin() == 0 and self.overflow() >= self._max_overflow
+        t0 = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except Exception:
+            POOL_METRICS.record(time.perf_counter() - t0, saturated, timed_out=True)
+            raise
+        POOL_METRICS.record(time.perf_counter() - t0, saturated)
+        return conn
+
+
+def _build_engine():
+    if IS_SQLITE:
+        # Apenas sqlite usa connect_args
+        connect_args = {"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000.0}
+        kwargs: Dict[str, Any] = {}
+        # sqlite em memória usa SingletonThreadPool; só arquivos usam o pool com fila
+        if ":memory:" not in DATABASE_URL and "mode=memory" not in DATABASE_URL:
+            kwargs.update(
+                poolclass=MeteredQueuePool,
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+            )
+        return create_engine(DATABASE_URL, echo=DB_ECHO, connect_args=connect_args, **kwargs)
+
+    return create_engine(
+        DATABASE_URL,
+        echo=DB_ECHO,
+        poolclass=MeteredQueuePool,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
 
-# Apenas sqlite usa connect_args
-connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
 
 # 🔥 Engine global exportado corretamente
-engine = create_engine(DATABASE_URL, echo=False, connect_args=connect_args)
+engine = _build_engine()
+# tempo de cada statement (Server-Timing) + log de queries lentas
+install_sql_timing(engine)
+
+
+if IS_SQLITE:
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_conn, _record):
+        """
+        WAL deixa leitores do dashboard rodarem durante a escrita do sync;
+        synchronous=NORMAL é seguro com WAL e evita fsync a cada commit.
+        """
+        cur = dbapi_conn.cursor()
+        try:
+            cur.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+            cur.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+            cur.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+            cur.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+            # valor negativo = tamanho em KiB
+            cur.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+            cur.execute("PRAGMA temp_store=MEMORY")
+        except Exception:
+            logger.exception("Falha ao aplicar PRAGMAs do SQLite")
+        finally:
+            cur.close()
 
 
 def get_engine():
@@ -20,6 +154,42 @@ def get_engine():
     return engine
 
 
+def get_pool_stats() -> Dict[str, Any]:
+    """Estado atual do pool + métricas acumuladas de checkout."""
+    pool = engine.pool
+    stats: Dict[str, Any] = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        size = pool.size()
+        checked_out = pool.checkedout()
+        capacity = size + max(0, pool._max_overflow)
+        stats.update({
+            "size": size,
+            "max_overflow": pool._max_overflow,
+            "checked_in": pool.checkedin(),
+            "checked_out": checked_out,
+            "overflow": pool.overflow(),
+            "saturation": round(checked_out / capacity, 4) if capacity else 0.0,
+        })
+    stats.update(POOL_METRICS.snapshot())
+    return stats
+
+
+# /metrics: estado do pool lido na hora do scrape
+_POOL_GAUGE = REGISTRY.gauge("wotcs_db_pool_connections", "Conexões do pool por estado", ("state",))
+# overflow() do QueuePool começa em -pool_size: só conexões extras de fato contam
+_POOL_GAUGE.set_function(lambda: {
+    (k,): max(0, v) for k, v in get_pool_stats().items() if k in ("size", "checked_in", "checked_out", "overflow")
+})
+REGISTRY.gauge("wotcs_db_pool_saturation", "checked_out / (size + max_overflow)").set_function(
+    lambda: get_pool_stats().get("saturation"))
+REGISTRY.counter("wotcs_db_pool_checkouts_total", "Checkouts de conexão do pool").set_function(
+    lambda: POOL_METRICS.snapshot()["checkouts"])
+REGISTRY.counter("wotcs_db_pool_checkout_wait_seconds_total", "Tempo total esperando conexão do pool").set_function(
+    lambda: POOL_METRICS.snapshot()["wait_seconds_total"])
+REGISTRY.counter("wotcs_db_pool_timeouts_total", "Checkouts que estouraram pool_timeout").set_function(
+    lambda: POOL_METRICS.snapshot()["timeouts"])
+
+
 def get_session() -> Generator:
     """Para dependências FastAPI."""
     with Session(engine) as session:
@@ -34,8 +204,70 @@ def init_db() -> None:
     # 🔥 Importa modelos sem importar nada que dependa de 'app.main'
     from app.models import (
         User,
+        Clan,
         Player,
         GarageTank,
+        GarageTankArchive,
+        TankStatsDelta,
+        TankStatsDaily,
+        TankStatsWeekly,
+        TableStats,
+        AccountFreshness,
+        SyncJobRecord,
+        SyncWorkerState,
     )
 
-    SQLModel.metadata.create_all(engine)
\ No newline at end of file
+    SQLModel.metadata.create_all(engine)
+    _ensure_columns()
+    _ensure_search_indexes()
+
+
+def _ensure_columns() -> None:
+    """
+    create_all não altera tabelas existentes: adiciona (ALTER TABLE ADD COLUMN)
+    as colunas anuláveis dos modelos que ainda não existem no banco, e os
+    índices que faltarem.
+    """
+    from sqlalchemy import inspect, text
+
+    insp = inspect(engine)
+    existing_tables = set(insp.get_table_names())
+    quote = engine.dialect.identifier_preparer.quote
+    for table in SQLModel.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        have = {c["name"] for c in insp.get_columns(table.name)}
+        for col in table.columns:
+            if col.name in have or col.primary_key or not col.nullable:
+                continue
+            ddl = col.type.compile(dialect=engine.dialect)
+            try:
+                with engine.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(col.name)} {ddl}"))
+                logger.info("Coluna adicionada: %s.%s (%s)", table.name, col.name, ddl)
+            except Exception:
+                logger.exception("Falha ao adicionar coluna %s.%s", table.name, col.name)
+        # índices declarados nos modelos (ex.: de uma coluna recém-adicionada)
+        for index in table.indexes:
+            try:
+                with engine.begin() as conn:
+                    index.create(conn, checkfirst=True)
+            except Exception:
+                logger.exception("Falha ao criar índice %s", index.name)
+
+
+def _ensure_search_indexes() -> None:
+    """Índice trigram (pg_trgm) para ILIKE em player.nickname — só PostgreSQL."""
+    if engine.dialect.name != "postgresql":
+        return
+    from sqlalchemy import text
+
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_player_nickname_trgm "
+                "ON player USING gin (nickname gin_trgm_ops)"
+            ))
+    except Exception:
+        logger.warning("Não foi possível criar o índice pg_trgm em player.nickname (permissão?)", exc_info=True)
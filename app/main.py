@@ -2,22 +2,22 @@
 import os
 import logging
 import warnings
-import time
 import math
 import json
+import hmac
 import asyncio
-import httpx
+from urllib.parse import urlencode
+from datetime import datetime
 
 from typing import Optional, Dict, Any
-from fastapi import FastAPI, Request, Depends, HTTPException, BackgroundTasks
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse
+from fastapi import FastAPI, Request, Depends, HTTPException
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from jinja2 import FileSystemBytecodeCache
 from dotenv import load_dotenv
-from sqlmodel import select, Session, delete
-from sqlalchemy import func, and_
-from datetime import datetime, timezone
+from sqlmodel import select, Session
+from sqlalchemy import func, and_, case
 
 # Load environment
 load_dotenv()
@@ -26,29 +26,27 @@ load_dotenv()
 # Basic config & constants
 # -----------------------------
 WOT_APP_ID = os.getenv("WOT_APP_ID", "")
-CLAN_ID = os.getenv("CLAN_ID", "")
 WOT_REALM = os.getenv("WOT_REALM", "https://api.worldoftanks.com")
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./data/db.sqlite3")
 SECRET_KEY = os.getenv("SECRET_KEY", "change-me-to-a-strong-secret")
-
-# sync controls & batching
-ENCYCLOPEDIA_BATCH = int(os.getenv("ENCYCLOPEDIA_BATCH", "50"))
-SLEEP_BETWEEN_BATCHES = float(os.getenv("SLEEP_BETWEEN_BATCHES", "0.3"))
-SYNC_RUNNING = False
-LAST_SYNC_TS = 0
-MIN_SYNC_INTERVAL = int(os.getenv("MIN_SYNC_INTERVAL", "45"))  # seconds
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")  # vazio = /metrics aberto (rede interna)
 
 # Logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 logger = logging.getLogger("wotcs")
 warnings.filterwarnings("ignore", message="error reading bcrypt version", module="passlib.handlers.bcrypt")
 
-# Password hashing (passlib)
-from passlib.context import CryptContext
-pwdctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # Templates & static
+# bytecode cache em disco: workers novos / restarts não recompilam os templates
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR", "data/jinja_cache")
+TEMPLATES_AUTO_RELOAD = os.getenv("TEMPLATES_AUTO_RELOAD", "0").lower() in ("1", "true", "yes")
 templates = Jinja2Templates(directory="app/templates")
+try:
+    os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+    templates.env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+except OSError:
+    logger.warning("Sem bytecode cache do Jinja2 (%s não gravável)", JINJA_CACHE_DIR)
+templates.env.auto_reload = TEMPLATES_AUTO_RELOAD
 
 # FastAPI app
 app = FastAPI(title="WOT Clan Dashboard")
@@ -58,32 +56,35 @@ app.mount("/static", StaticFiles(directory="app/static"), name="static")
 # Imports that rely on app package (avoid circular issues)
 # Ensure app.db does not import app.main
 # -----------------------------
-from app.db import engine, init_db
+from app.db import engine, init_db, get_pool_stats
 from app.models import User, Player, GarageTank
 
-# Tank cache utils (assumed present)
-from app.utils.tank_cache import load_tank_cache, save_tank_cache
-
-TANK_CACHE: Dict[str, Any] = load_tank_cache() or {}
-
-# -----------------------------
-# Auth helpers (POC cookie-based)
-# -----------------------------
-def hash_password(pw: str) -> str:
-    return pwdctx.hash(pw)
-
-def verify_password(plain: str, hashed: str) -> bool:
-    return pwdctx.verify(plain, hashed)
-
-def get_current_user_from_cookie(request: Request) -> User:
-    username = request.cookies.get("user")
-    if not username:
-        raise HTTPException(status_code=401, detail="Não autenticado")
-    with Session(engine) as s:
-        user = s.exec(select(User).where(User.username == username)).first()
-        if not user:
-            raise HTTPException(status_code=401, detail="Usuário não existe")
-        return user
+from app.utils.fragments import DASHBOARD_FRAGMENTS
+from app.utils.sync_state import current_generation
+from app.utils.ownership_index import OWNERSHIP_INDEX
+from app.utils.stats_history import activity_last_days
+from app.utils.roster import active_player_clause
+from app.utils.clans import CLAN_IDS, ensure_clans, list_clans
+from app.utils.json_response import json_response, make_etag, etag_matches, not_modified
+# Sessão assinada: autentica sem ir ao banco (ver app/utils/session.py)
+from app.utils.session import get_current_user_from_cookie, principal_from_token, SESSION_COOKIE
+
+# Sync (fila com prioridade + etapas): ver app/sync.py
+from app import sync as sync_runner
+from app.sync import TANK_CACHE, enqueue_full_sync, enqueue_account_sync
+from app.utils.sync_schedule import SYNC_MODE
+from app.utils.job_table import queue_snapshot, read_state
+from app.utils.sync_progress import SYNC_PROGRESS
+from app.utils.table_stats import get_table_stats, freshness_summary
+from app.utils.metrics import REGISTRY, CONTENT_TYPE, DASHBOARD_QUERY_SECONDS
+from app.utils.request_timing import ServerTimingMiddleware, timed
+from app.utils.profiling import profile_block, profile_requested
+
+# Password hashing: pool de processos dedicado (ver app/utils/passwords.py)
+from app.utils.passwords import shutdown_pool
+
+# Server-Timing por fase (auth, facets, count, aggregate, page, render, db) em toda resposta
+app.add_middleware(ServerTimingMiddleware)
 
 # -----------------------------
 # Pages (GET) - templates
@@ -98,61 +99,22 @@ def register_page(request: Request):
 
 @app.get("/", response_class=HTMLResponse)
 def index(request: Request):
-    username = request.cookies.get("user")
-    if username:
+    if principal_from_token(request.cookies.get(SESSION_COOKIE)):
         return RedirectResponse(url="/dashboard")
     return RedirectResponse(url="/auth/login")
 
-# -----------------------------
-# Dashboard route (tolerant parsing)
-# -----------------------------
-# NOTE: tier is Optional[str] to avoid FastAPI int-parsing errors on empty string query params.
-@app.get("/dashboard", response_class=HTMLResponse)
-def dashboard(
-    request: Request,
-    tier: Optional[str] = None,         # receber como string e validar internamente
-    player_id: Optional[str] = None,    # idem
-    nation: Optional[str] = None,
-    tank_type: Optional[str] = None,
-    page: int = 1,
-    per_page: int = 25,
-    current_user = Depends(get_current_user_from_cookie)
-):
-    # --- normalize pagination ---
-    try:
-        page = max(1, int(page))
-    except Exception:
-        page = 1
-    try:
-        per_page = int(per_page)
-    except Exception:
-        per_page = 25
-    per_page = max(1, min(per_page, 200))
-
-    # --- normalize filters ---
-    resolved_player_id = None
-    if player_id:
-        try:
-            resolved_player_id = int(player_id)
-        except Exception:
-            resolved_player_id = None
-
-    # tier: se veio vazio ou '': tratar como None; se for número, converter para int
-    resolved_tier = None
-    if tier is not None and tier != "":
-        try:
-            resolved_tier = int(tier)
-        except Exception:
-            resolved_tier = None
-
-    # --- load dropdowns & distinct nations/types as strings ---
+def _load_filter_options(role: Optional[str], clan_id: Optional[int] = None):
+    """Jogadores (só commander, do clã selecionado) e nations/types distintos para os dropdowns."""
     players = []
     nations = []
     types = []
     try:
         with Session(engine) as s:
-            if getattr(current_user, "role", None) == "commander":
-                players = s.exec(select(Player).order_by(Player.nickname)).all()
+            if role == "commander":
+                players_q = select(Player).where(active_player_clause())
+                if clan_id:
+                    players_q = players_q.where(Player.clan_id == clan_id)
+                players = s.exec(players_q.order_by(Player.nickname)).all()
 
             # try to get distinct nations/types from DB, trimming whitespace
             try:
@@ -196,31 +158,120 @@ def dashboard(
         except Exception:
             logger.exception("Fallback TANK_CACHE failed while building nations/types.")
 
-    # --- build query with filters ---
-    with Session(engine) as s:
-        base_q = select(GarageTank, Player).join(Player, GarageTank.account_id == Player.account_id)
+    return players, nations, types
 
-        filters = []
-        if resolved_tier:
-            filters.append(GarageTank.tier == resolved_tier)
 
-        # player filter allowed only for commanders
-        if getattr(current_user, "role", None) == "commander":
-            if resolved_player_id:
-                filters.append(Player.account_id == resolved_player_id)
-        else:
-            # non-commander: optionally restrict to user's own account
-            try:
-                if getattr(current_user, "account_id", None):
-                    filters.append(Player.account_id == current_user.account_id)
-            except Exception:
-                pass
+# -----------------------------
+# Dashboard route (tolerant parsing)
+# -----------------------------
+def _normalize_clan_param(clan_id) -> Optional[int]:
+    """clan_id só vale se for um dos clãs configurados."""
+    try:
+        cid = int(clan_id) if clan_id not in (None, "") else None
+    except Exception:
+        return None
+    return cid if cid in CLAN_IDS else None
+
 
-        if nation:
-            filters.append(GarageTank.nation == nation)
-        if tank_type:
-            filters.append(GarageTank.type == tank_type)
+def _normalize_dashboard_params(tier, player_id, page, per_page):
+    """Parsing tolerante dos query params (valores inválidos viram default/None)."""
+    # --- normalize pagination ---
+    try:
+        page = max(1, int(page))
+    except Exception:
+        page = 1
+    try:
+        per_page = int(per_page)
+    except Exception:
+        per_page = 25
+    per_page = max(1, min(per_page, 200))
 
+    # --- normalize filters ---
+    resolved_player_id = None
+    if player_id:
+        try:
+            resolved_player_id = int(player_id)
+        except Exception:
+            resolved_player_id = None
+
+    # tier: se veio vazio ou '': tratar como None; se for número, converter para int
+    resolved_tier = None
+    if tier is not None and tier != "":
+        try:
+            resolved_tier = int(tier)
+        except Exception:
+            resolved_tier = None
+
+    return page, per_page, resolved_tier, resolved_player_id
+
+
+DASHBOARD_SORTS = {
+    "": lambda: (Player.nickname, GarageTank.tier.desc()),
+    "wn8": lambda: (GarageTank.wn8.is_(None), GarageTank.wn8.desc(), Player.nickname),
+    "player_wn8": lambda: (Player.wn8.is_(None), Player.wn8.desc(), Player.nickname, GarageTank.tier.desc()),
+}
+
+
+def _normalize_wn8_params(sort, min_wn8):
+    sort = sort if sort in DASHBOARD_SORTS else ""
+    resolved_min_wn8 = None
+    if min_wn8 is not None and min_wn8 != "":
+        try:
+            resolved_min_wn8 = float(min_wn8)
+        except Exception:
+            resolved_min_wn8 = None
+    return sort, resolved_min_wn8
+
+
+def _dashboard_filters(current_user, resolved_tier, resolved_player_id, nation, tank_type, min_wn8=None, clan_id=None):
+    filters = []
+    if clan_id:
+        filters.append(GarageTank.clan_id == clan_id)
+    if resolved_tier:
+        filters.append(GarageTank.tier == resolved_tier)
+
+    # player filter allowed only for commanders
+    if getattr(current_user, "role", None) == "commander":
+        if resolved_player_id:
+            filters.append(Player.account_id == resolved_player_id)
+    else:
+        # non-commander: optionally restrict to user's own account
+        try:
+            if getattr(current_user, "account_id", None):
+                filters.append(Player.account_id == current_user.account_id)
+        except Exception:
+            pass
+
+    if nation:
+        filters.append(GarageTank.nation == nation)
+    if tank_type:
+        filters.append(GarageTank.type == tank_type)
+    if min_wn8 is not None:
+        filters.append(GarageTank.wn8 >= min_wn8)
+    return filters
+
+
+def _dashboard_shape(current_user, resolved_tier, resolved_player_id, nation, tank_type, min_wn8, clan_id=None) -> str:
+    """Forma da query (quais filtros estão ativos) — label das métricas, sem valores."""
+    if getattr(current_user, "role", None) == "commander":
+        player = "player" if resolved_player_id else ""
+    else:
+        player = "own" if getattr(current_user, "account_id", None) else ""
+    active = (
+        ("tier", resolved_tier), (player, player), ("nation", nation),
+        ("type", tank_type), ("min_wn8", min_wn8 is not None), ("clan", clan_id),
+    )
+    return "+".join(sorted(name for name, on in active if name and on)) or "none"
+
+
+def _query_dashboard(current_user, resolved_tier, resolved_player_id, nation, tank_type, page, per_page,
+                     sort: str = "", min_wn8: Optional[float] = None, clan_id: Optional[int] = None) -> Dict[str, Any]:
+    """Contagem, agregados e página de (GarageTank, Player) — usado pelo HTML e pela API JSON."""
+    filters = _dashboard_filters(current_user, resolved_tier, resolved_player_id, nation, tank_type, min_wn8, clan_id)
+    shape = _dashboard_shape(current_user, resolved_tier, resolved_player_id, nation, tank_type, min_wn8, clan_id)
+
+    with Session(engine) as s:
+        base_q = select(GarageTank, Player).join(Player, GarageTank.account_id == Player.account_id)
         if filters:
             base_q = base_q.where(and_(*filters))
 
@@ -229,7 +280,8 @@ def dashboard(
         if filters:
             count_q = count_q.where(and_(*filters))
         try:
-            total_count = int(s.exec(count_q).one())
+            with timed("count"), DASHBOARD_QUERY_SECONDS.time(shape=shape, query="count"):
+                total_count = int(s.exec(count_q).one())
         except Exception:
             # fallback
             try:
@@ -242,49 +294,327 @@ def dashboard(
             func.coalesce(func.sum(GarageTank.battles), 0),
             func.coalesce(func.sum(GarageTank.wins), 0),
             func.coalesce(func.sum(GarageTank.mark_of_mastery), 0),
+            func.coalesce(func.sum(GarageTank.damage_dealt), 0),
+            # batalhas só dos tanks com dano conhecido (denominador do dano médio)
+            func.coalesce(func.sum(case((GarageTank.damage_dealt.is_not(None), GarageTank.battles), else_=0)), 0),
         ).select_from(GarageTank).join(Player, GarageTank.account_id == Player.account_id)
         if filters:
             agg_q = agg_q.where(and_(*filters))
-        agg_res = s.exec(agg_q).one()
+        with timed("aggregate"), DASHBOARD_QUERY_SECONDS.time(shape=shape, query="aggregate"):
+            agg_res = s.exec(agg_q).one()
         total_battles = int(agg_res[0] or 0)
         total_wins = int(agg_res[1] or 0)
         total_marks = int(agg_res[2] or 0)
+        total_damage = int(agg_res[3] or 0)
+        damage_battles = int(agg_res[4] or 0)
+        avg_damage = round(total_damage / damage_battles, 1) if damage_battles > 0 else None
 
         avg_battles = round(total_battles / total_count, 2) if total_count > 0 else 0.0
         win_pct = round((total_wins / total_battles) * 100.0, 2) if total_battles > 0 else 0.0
 
         # pagination and ordering
         offset = (page - 1) * per_page
-        page_q = base_q.order_by(Player.nickname, GarageTank.tier.desc()).limit(per_page).offset(offset)
-        rows = s.exec(page_q).all()
+        page_q = base_q.order_by(*DASHBOARD_SORTS[sort]()).limit(per_page).offset(offset)
+        with timed("page"), DASHBOARD_QUERY_SECONDS.time(shape=shape, query=f"page:{sort or 'default'}"):
+            rows = s.exec(page_q).all()
 
     total_pages = max(1, math.ceil(total_count / per_page)) if per_page else 1
 
-    return templates.TemplateResponse("dashboard.html", {
-        "request": request,
-        "title": "Dashboard do Clã",
+    return {
         "rows": rows,
-        "user": current_user,
-        "players": players,
-        "nations": nations,
-        "types": types,
-        "selected_tier": resolved_tier,
-        "selected_player": resolved_player_id,
-        "selected_nation": nation or "",
-        "selected_type": tank_type or "",
-        "page": page,
-        "per_page": per_page,
         "total_count": total_count,
         "total_pages": total_pages,
         "stats": {
             "avg_battles": avg_battles,
             "win_pct": win_pct,
             "total_marks": total_marks,
+            "avg_damage": avg_damage,
             "total_battles": total_battles,
             "total_wins": total_wins
-        }
-    })
-    
+        },
+    }
+
+
+def _foreground_sync_job() -> Optional[str]:
+    """Job de sync que a página deve acompanhar (fatias do sync contínuo não contam)."""
+    # progresso local ou espelhado do worker (SYNC_IN_PROCESS=0): sem consulta ao banco
+    st = SYNC_PROGRESS.snapshot()
+    if st["running"] and st["job"] and st["job"] != "rolling":
+        return st["job"]
+    return None
+
+
+def _sync_queue_snapshot() -> Dict[str, Any]:
+    """Fila do processo ou, com o worker separado, a de sync_job."""
+    if sync_runner.SYNC_IN_PROCESS:
+        return sync_runner.SYNC_QUEUE.snapshot()
+    try:
+        return queue_snapshot(engine)
+    except Exception:
+        logger.exception("Falha ao ler sync_job")
+        return {"running": [], "queued": []}
+
+
+# NOTE: tier is Optional[str] to avoid FastAPI int-parsing errors on empty string query params.
+@app.get("/dashboard", response_class=HTMLResponse)
+def dashboard(
+    request: Request,
+    tier: Optional[str] = None,         # receber como string e validar internamente
+    player_id: Optional[str] = None,    # idem
+    nation: Optional[str] = None,
+    tank_type: Optional[str] = None,
+    sort: Optional[str] = None,
+    min_wn8: Optional[str] = None,
+    clan_id: Optional[str] = None,
+    page: int = 1,
+    per_page: int = 25,
+    current_user = Depends(get_current_user_from_cookie)
+):
+    args = (request, tier, player_id, nation, tank_type, sort, min_wn8, clan_id, page, per_page, current_user)
+    if not profile_requested(request, current_user):
+        return _dashboard_page(*args)
+    # X-Profile: 1 / ?profile=1 (commander): amostra esta requisição -> data/profiles/
+    with profile_block("dashboard") as prof:
+        response = _dashboard_page(*args)
+    if prof.path is not None:
+        response.headers["X-Profile-File"] = prof.path.name
+    return response
+
+
+def _dashboard_page(request, tier, player_id, nation, tank_type, sort, min_wn8, clan_id, page, per_page, current_user):
+    page, per_page, resolved_tier, resolved_player_id = _normalize_dashboard_params(tier, player_id, page, per_page)
+    sort, resolved_min_wn8 = _normalize_wn8_params(sort, min_wn8)
+    resolved_clan_id = _normalize_clan_param(clan_id)
+
+    # --- dropdowns: fragmento cacheado por geração do sync + role + seleção ---
+    role = getattr(current_user, "role", None)
+    fragment_key = ("filters", current_generation(), role, resolved_player_id, resolved_tier, nation or "", tank_type or "",
+                    sort, resolved_min_wn8, resolved_clan_id)
+
+    def _render_filters() -> str:
+        players, nations, types = _load_filter_options(role, resolved_clan_id)
+        return templates.get_template("partials/dashboard_filters.html").render({
+            "user": current_user,
+            # dropdown de clã só quando há mais de um
+            "clans": list_clans(engine) if len(CLAN_IDS) > 1 else [],
+            "selected_clan": resolved_clan_id,
+            "players": players,
+            "nations": nations,
+            "types": types,
+            "selected_tier": resolved_tier,
+            "selected_player": resolved_player_id,
+            "selected_nation": nation or "",
+            "selected_type": tank_type or "",
+            "selected_sort": sort,
+            "selected_min_wn8": resolved_min_wn8,
+        })
+
+    with timed("facets"):
+        filters_html = DASHBOARD_FRAGMENTS.get_or_render(fragment_key, _render_filters)
+
+    # --- build query with filters ---
+    result = _query_dashboard(current_user, resolved_tier, resolved_player_id, nation, tank_type, page, per_page,
+                              sort, resolved_min_wn8, resolved_clan_id)
+
+    # query string da paginação montada uma vez aqui (não no template)
+    page_params = {"per_page": per_page}
+    if resolved_clan_id:
+        page_params["clan_id"] = resolved_clan_id
+    if resolved_player_id:
+        page_params["player_id"] = resolved_player_id
+    if resolved_tier:
+        page_params["tier"] = resolved_tier
+    if nation:
+        page_params["nation"] = nation
+    if tank_type:
+        page_params["tank_type"] = tank_type
+    if sort:
+        page_params["sort"] = sort
+    if resolved_min_wn8 is not None:
+        page_params["min_wn8"] = resolved_min_wn8
+
+    with timed("render"):
+        response = templates.TemplateResponse("dashboard.html", {
+            "request": request,
+            "title": "Dashboard do Clã",
+            "rows": result["rows"],
+            "user": current_user,
+            "filters_html": filters_html,
+            "sync_job": _foreground_sync_job(),
+            "refresh_account_id": resolved_player_id if role == "commander" else getattr(current_user, "account_id", None),
+            "page_qs": urlencode(page_params),
+            "selected_tier": resolved_tier,
+            "selected_player": resolved_player_id,
+            "selected_nation": nation or "",
+            "selected_type": tank_type or "",
+            "page": page,
+            "per_page": per_page,
+            "total_count": result["total_count"],
+            "total_pages": result["total_pages"],
+            "stats": result["stats"],
+        })
+    return response
+
+
+# -----------------------------
+# JSON dashboard API (ETag/304 + gzip/brotli)
+# -----------------------------
+def _row_to_dict(gt: GarageTank, ply: Player) -> Dict[str, Any]:
+    battles = gt.battles or 0
+    wins = gt.wins or 0
+
+    def per_battle(value):
+        return round(value / battles, 2) if value is not None and battles > 0 else None
+
+    return {
+        "account_id": ply.account_id,
+        "nickname": ply.nickname,
+        "clan_id": gt.clan_id,
+        "tank_id": gt.tank_id,
+        "tank_name": gt.tank_name,
+        "tier": gt.tier,
+        "battles": battles,
+        "wins": wins,
+        "win_pct": round(wins / battles * 100.0, 2) if battles > 0 else 0.0,
+        "mark_of_mastery": gt.mark_of_mastery or 0,
+        "nation": gt.nation,
+        "type": gt.type,
+        "is_premium": bool(gt.is_premium),
+        "image_url": gt.image_url,
+        "avg_damage": per_battle(gt.damage_dealt),
+        "avg_frags": per_battle(gt.frags),
+        "avg_spotted": per_battle(gt.spotted),
+        "survival_pct": round(gt.survived_battles / battles * 100.0, 2) if gt.survived_battles is not None and battles > 0 else None,
+        "wn8": gt.wn8,
+        "player_wn8": ply.wn8,
+    }
+
+
+@app.get("/api/dashboard")
+def api_dashboard(
+    request: Request,
+    tier: Optional[str] = None,
+    player_id: Optional[str] = None,
+    nation: Optional[str] = None,
+    tank_type: Optional[str] = None,
+    sort: Optional[str] = None,
+    min_wn8: Optional[str] = None,
+    clan_id: Optional[str] = None,
+    page: int = 1,
+    per_page: int = 25,
+    current_user = Depends(get_current_user_from_cookie)
+):
+    """
+    Mesmos filtros/semântica do /dashboard, em JSON.
+    ETag = geração do sync + usuário + filtros: enquanto nenhum sync gravar
+    dados novos, If-None-Match responde 304 sem tocar no banco.
+    """
+    page, per_page, resolved_tier, resolved_player_id = _normalize_dashboard_params(tier, player_id, page, per_page)
+    sort, resolved_min_wn8 = _normalize_wn8_params(sort, min_wn8)
+    resolved_clan_id = _normalize_clan_param(clan_id)
+    etag = make_etag(
+        current_generation(),
+        getattr(current_user, "role", None),
+        getattr(current_user, "account_id", None),
+        resolved_tier, resolved_player_id, nation or "", tank_type or "", page, per_page,
+        sort, resolved_min_wn8, resolved_clan_id,
+    )
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
+    result = _query_dashboard(current_user, resolved_tier, resolved_player_id, nation, tank_type, page, per_page,
+                              sort, resolved_min_wn8, resolved_clan_id)
+    payload = {
+        "filters": {
+            "clan_id": resolved_clan_id,
+            "tier": resolved_tier,
+            "player_id": resolved_player_id,
+            "nation": nation or None,
+            "tank_type": tank_type or None,
+            "sort": sort or None,
+            "min_wn8": resolved_min_wn8,
+        },
+        "page": page,
+        "per_page": per_page,
+        "total_count": result["total_count"],
+        "total_pages": result["total_pages"],
+        "stats": result["stats"],
+        "rows": [_row_to_dict(gt, ply) for gt, ply in result["rows"]],
+    }
+    return json_response(request, payload, etag=etag)
+
+
+# -----------------------------
+# Stats history API (rollups diário/semanal)
+# -----------------------------
+@app.get("/api/history")
+def api_history(
+    request: Request,
+    days: int = 7,
+    player_id: Optional[str] = None,
+    tank_id: Optional[int] = None,
+    group_by: str = "account",
+    current_user = Depends(get_current_user_from_cookie)
+):
+    """Batalhas/vitórias nos últimos N dias por jogador (group_by=account) ou por tank."""
+    days = max(1, min(int(days), 3650))
+    group_by = "tank" if group_by == "tank" else "account"
+    _page, _per_page, _tier, resolved_player_id = _normalize_dashboard_params(None, player_id, 1, 1)
+
+    if getattr(current_user, "role", None) == "commander":
+        account_ids = [resolved_player_id] if resolved_player_id else None
+    else:
+        own = getattr(current_user, "account_id", None)
+        if not own:
+            return json_response(request, {"days": days, "group_by": group_by, "rows": []})
+        account_ids = [own]
+
+    etag = make_etag("history", current_generation(), getattr(current_user, "role", None),
+                     account_ids, tank_id, days, group_by)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    rows = activity_last_days(engine, days, account_ids=account_ids, tank_id=tank_id, group_by=group_by)
+    return json_response(request, {"days": days, "group_by": group_by, "rows": rows}, etag=etag)
+
+
+# -----------------------------
+# Lineup: quem tem estes tanks (índice de posse em memória)
+# -----------------------------
+LINEUP_MAX_TANKS = 100
+
+
+@app.get("/api/lineup")
+def api_lineup(
+    request: Request,
+    tanks: str = "",
+    mode: str = "all",
+    min_battles: int = 0,
+    clan_id: Optional[str] = None,
+    current_user = Depends(get_current_user_from_cookie)
+):
+    """Membros que têm todos (mode=all) ou algum (mode=any) dos tanks, com >= min_battles em cada."""
+    if getattr(current_user, "role", None) != "commander":
+        raise HTTPException(status_code=403, detail="Apenas commanders")
+    try:
+        tank_ids = [int(t) for t in tanks.replace(";", ",").split(",") if t.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="tanks: lista de tank_id separada por vírgula")
+    if not tank_ids or len(tank_ids) > LINEUP_MAX_TANKS:
+        raise HTTPException(status_code=400, detail=f"tanks: de 1 a {LINEUP_MAX_TANKS} tank_id")
+    if mode not in ("all", "any"):
+        raise HTTPException(status_code=400, detail="mode: all ou any")
+    min_battles = max(0, int(min_battles))
+    resolved_clan = _normalize_clan_param(clan_id)
+
+    etag = make_etag("lineup", current_generation(), tank_ids, mode, min_battles, resolved_clan)
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    OWNERSHIP_INDEX.ensure_fresh(engine)
+    result = OWNERSHIP_INDEX.lineup(tank_ids, mode=mode, min_battles=min_battles, clan_id=resolved_clan)
+    result.update(mode=mode, min_battles=min_battles, clan_id=resolved_clan, index=OWNERSHIP_INDEX.stats())
+    return json_response(request, result, etag=etag)
+
+
 # -----------------------------
 # Health & debug endpoints
 # -----------------------------
@@ -298,10 +628,10 @@ def health_db():
         with engine.connect() as conn:
             # lightweight check
             conn.execute(select(1))
-        return JSONResponse({"status": "ok", "db": "reachable"})
+        return JSONResponse({"status": "ok", "db": "reachable", "pool": get_pool_stats()})
     except Exception as exc:
         logger.exception("Health DB failed: %s", exc)
-        return JSONResponse({"status": "error", "db": "unreachable"}, status_code=500)
+        return JSONResponse({"status": "error", "db": "unreachable", "pool": get_pool_stats()}, status_code=500)
 
 @app.get("/debug/users")
 def debug_users():
@@ -309,252 +639,14 @@ def debug_users():
         users = s.exec(select(User)).all()
         return [{"id": u.id, "username": u.username, "role": u.role} for u in users]
 
-# -----------------------------
-# SYNC: fetch_and_sync with batching, cache, debounce/lock
-# -----------------------------
-async def fetch_and_sync():
-    """
-    Sync optimized to use /wot/account/tanks and /wot/encyclopedia/vehicles (batch).
-    Persists Player and GarageTank (only tiers 6,8,10). Uses TANK_CACHE and save_tank_cache().
-    """
-    global SYNC_RUNNING, LAST_SYNC_TS, TANK_CACHE
-
-    now_ts = int(time.time())
-    if SYNC_RUNNING:
-        logger.info("Sync ignored: already running.")
-        return
-    if now_ts - LAST_SYNC_TS < MIN_SYNC_INTERVAL:
-        logger.info(f"Sync ignored: last sync was {now_ts - LAST_SYNC_TS}s (<{MIN_SYNC_INTERVAL}s).")
-        return
-
-    SYNC_RUNNING = True
-    logger.info(f"Iniciando sync para clã {CLAN_ID} no realm {WOT_REALM}")
-
-    try:
-        async with httpx.AsyncClient(timeout=30) as client:
-            # 1) fetch clan members (no extra param)
-            members = []
-            try:
-                members_url = f"{WOT_REALM}/wot/clans/info/?application_id={WOT_APP_ID}&clan_id={CLAN_ID}"
-                r = await client.get(members_url)
-                r.raise_for_status()
-                js = r.json()
-                members = js.get("data", {}).get(str(CLAN_ID), {}).get("members", []) or []
-            except Exception as exc:
-                logger.exception("Erro ao obter membros do clã: %s", exc)
-                members = []
-
-            if not members:
-                logger.warning("Nenhum membro obtido; abortando sync.")
-                return
-
-            # persist/update players
-            account_ids = []
-            with Session(engine) as s:
-                for m in members:
-                    try:
-                        acc_id = int(m.get("account_id"))
-                    except Exception:
-                        continue
-                    account_ids.append(acc_id)
-                    nickname = m.get("account_name") or m.get("nickname") or f"player_{acc_id}"
-                    p = s.get(Player, acc_id)
-                    if not p:
-                        p = Player(account_id=acc_id, nickname=nickname)
-                        s.add(p)
-                    else:
-                        if p.nickname != nickname:
-                            p.nickname = nickname
-                            s.add(p)
-                s.commit()
-
-            # 2) gather tanks per player via account/tanks
-            account_tanks_map = {}
-            unique_tank_ids = set()
-
-            for acc in account_ids:
-                try:
-                    tanks_url = f"{WOT_REALM}/wot/account/tanks/?application_id={WOT_APP_ID}&account_id={acc}"
-                    rr = await client.get(tanks_url)
-                    rr.raise_for_status()
-                    j = rr.json()
-                    items = j.get("data", {}).get(str(acc), []) or []
-                except Exception as exc:
-                    logger.warning("Falha account/tanks para %s: %s", acc, exc)
-                    items = []
-
-                account_tanks_map[acc] = items
-                for it in items:
-                    tid = it.get("tank_id") or it.get("tankId")
-                    if tid:
-                        try:
-                            unique_tank_ids.add(int(tid))
-                        except Exception:
-                            pass
-
-            logger.info("Coletados %d tank_ids únicos de %d jogadores", len(unique_tank_ids), len(account_ids))
-
-            # 3) fetch vehicles metadata in batches (preferred endpoint)
-            missing = [tid for tid in unique_tank_ids if str(tid) not in TANK_CACHE]
-            logger.info("Tank IDs faltando no cache: %d", len(missing))
-
-            if missing:
-                for i in range(0, len(missing), ENCYCLOPEDIA_BATCH):
-                    batch = missing[i:i + ENCYCLOPEDIA_BATCH]
-                    ids_param = ",".join(str(x) for x in batch)
-                    try:
-                        meta_url = f"{WOT_REALM}/wot/encyclopedia/vehicles/?application_id={WOT_APP_ID}&tank_id={ids_param}"
-                        rmeta = await client.get(meta_url)
-                        rmeta.raise_for_status()
-                        meta_js = rmeta.json()
-                        data = meta_js.get("data", {}) or {}
-                        returned = 0
-                        for k, v in data.items():
-                            if v:
-                                TANK_CACHE[str(k)] = v
-                                returned += 1
-                        logger.info("Batch encyclopedia fetched: requested %d, returned %d", len(batch), returned)
-                        try:
-                            save_tank_cache(TANK_CACHE)
-                        except Exception:
-                            logger.exception("Falha ao salvar tank cache incremental.")
-                    except Exception as exc:
-                        logger.exception("Erro batch encyclopedia (vehicles): %s", exc)
-                    await asyncio.sleep(SLEEP_BETWEEN_BATCHES)
-
-                missing_after = [tid for tid in unique_tank_ids if str(tid) not in TANK_CACHE]
-                logger.info("Missing after batch fetch: %d", len(missing_after))
-
-                if len(missing_after) > 0 and len(missing_after) > 0.25 * max(1, len(unique_tank_ids)):
-                    try:
-                        logger.info("Fazendo fallback: baixando lista completa de vehicles para popular cache (apenas uma vez).")
-                        full_url = f"{WOT_REALM}/wot/encyclopedia/vehicles/?application_id={WOT_APP_ID}"
-                        rf = await client.get(full_url, timeout=60)
-                        rf.raise_for_status()
-                        fj = rf.json()
-                        all_data = fj.get("data", {}) or {}
-                        for k, v in all_data.items():
-                            TANK_CACHE[str(k)] = v
-                        try:
-                            save_tank_cache(TANK_CACHE)
-                        except Exception:
-                            logger.exception("Falha ao salvar tank cache após full dump.")
-                        logger.info("Full vehicles dump populou cache com %d entries (aprox).", len(TANK_CACHE))
-                    except Exception as exc:
-                        logger.exception("Falha no fallback full vehicles list: %s", exc)
-
-            logger.info("Tank cache size após fetch: %d", len(TANK_CACHE))
-
-            INSERT_BATCH = int(os.getenv("INSERT_BATCH", "100"))  # commit a cada N inserts
-
-            # 4) persist GarageTank: remove old tanks para cada account e insere relevantes (tiers 6/8/10)
-            saved_tanks = 0
-            with Session(engine) as s:
-                for acc, items in account_tanks_map.items():
-                    # remove antigos e commit imediato para liberar o trabalho
-                    try:
-                        s.exec(delete(GarageTank).where(GarageTank.account_id == acc))
-                        s.commit()
-                    except Exception:
-                        s.rollback()
-
-                    to_add = []
-                    for it in items:
-                        try:
-                            tid = int(it.get("tank_id") or it.get("tankId") or 0)
-                        except Exception:
-                            continue
-                        if not tid:
-                            continue
-
-                        meta = TANK_CACHE.get(str(tid), {}) or {}
-                        tier = meta.get("tier") or meta.get("level") or None
-                        try:
-                            tier = int(tier) if tier is not None else None
-                        except Exception:
-                            tier = None
-
-                        if tier not in (6, 8, 10):
-                            continue
-
-                        name = meta.get("name") or meta.get("localized_name") or f"Tank {tid}"
-                        stats = it.get("statistics") or {}
-                        mark = it.get("mark_of_mastery") if "mark_of_mastery" in it else it.get("mark_of_mastery", None)
-                        battles = stats.get("battles") or 0
-                        wins = stats.get("wins") or 0
-
-                        gt = GarageTank(
-                            account_id=acc,
-                            tank_id=tid,
-                            tank_name=name,
-                            tier=tier,
-                        )
-
-                        # set optional fields if model contains them
-                        try:
-                            if hasattr(gt, "battles"):
-                                gt.battles = int(battles)
-                            if hasattr(gt, "wins"):
-                                gt.wins = int(wins)
-                            if hasattr(gt, "mark_of_mastery") and mark is not None:
-                                gt.mark_of_mastery = int(mark)
-                            if hasattr(gt, "raw_stats"):
-                                gt.raw_stats = json.dumps(it)
-                            if hasattr(gt, "is_premium"):
-                                gt.is_premium = bool(meta.get("is_premium", False))
-                            if hasattr(gt, "nation"):
-                                gt.nation = meta.get("nation")
-                            if hasattr(gt, "type"):
-                                gt.type = meta.get("type")
-                            if hasattr(gt, "image_url"):
-                                images = meta.get("images") or {}
-                                gt.image_url = images.get("big_icon") or images.get("small_icon") or None
-                            if hasattr(gt, "last_updated"):
-                                gt.last_updated = datetime.fromtimestamp(int(time.time()), tz=timezone.utc)
-                        except Exception:
-                            # não falhar por causa de campos opcionais
-                            pass
-
-                        to_add.append(gt)
-
-                    # inserir em batches controlados para evitar muitos parâmetros num só INSERT
-                    try:
-                        if to_add:
-                            batch_buf = []
-                            for idx, obj in enumerate(to_add, start=1):
-                                batch_buf.append(obj)
-                                saved_tanks += 1
-                                if len(batch_buf) >= INSERT_BATCH:
-                                    s.add_all(batch_buf)
-                                    s.commit()
-                                    s.expunge_all()  # limpa estado da sessão
-                                    batch_buf = []
-                            # leftover
-                            if batch_buf:
-                                s.add_all(batch_buf)
-                                s.commit()
-                                s.expunge_all()
-                    except Exception:
-                        logger.exception("Erro ao persistir garages para account %s; rollback.", acc)
-                        s.rollback()
-
-            logger.info("Sync concluído! Tanks gravados: %d", saved_tanks)
-
-    except Exception as exc:
-        logger.exception("Erro inesperado no sync: %s", exc)
-    finally:
-        LAST_SYNC_TS = int(time.time())
-        SYNC_RUNNING = False
-
 # -----------------------------
 # /sync/check endpoint (triggers background sync if DB empty)
 # -----------------------------
 @app.get("/sync/check")
-def sync_check(background_tasks: BackgroundTasks, current_user = Depends(get_current_user_from_cookie)):
+def sync_check(current_user = Depends(get_current_user_from_cookie)):
     try:
-        with Session(engine) as s:
-            cnt_res = s.exec(select(GarageTank)).all()
-            total = len(cnt_res)
+        # contagem mantida pelo sync em table_stats (sem varrer garagetank)
+        total = get_table_stats(engine).get("garagetank", {}).get("row_count", 0)
     except Exception as exc:
         logger.exception("Erro ao contar GarageTank: %s", exc)
         return JSONResponse({"status": "error", "msg": "Erro ao verificar DB"}, status_code=500)
@@ -562,27 +654,161 @@ def sync_check(background_tasks: BackgroundTasks, current_user = Depends(get_cur
     if total > 0:
         return JSONResponse({"status": "ok", "found": total})
 
-    # wrapper to run async fetch in background thread (safe)
-    def _run_sync_task():
-        try:
-            asyncio.run(fetch_and_sync())
-        except Exception as e:
-            logger.exception("fetch_and_sync background task failed: %s", e)
+    # sync completo entra na fila do worker (duplicado/cooldown não dispara outro)
+    job = enqueue_full_sync()
+    return JSONResponse({"status": "started", "job": job["job"], "msg": "Sync em background iniciado. Aguarde alguns instantes."})
 
-    background_tasks.add_task(_run_sync_task)
-    return JSONResponse({"status": "started", "msg": "Sync em background iniciado. Aguarde alguns instantes."})
+
+# -----------------------------
+# Refresh de uma conta (fura a fila do sync completo)
+# -----------------------------
+@app.post("/sync/account/{account_id}")
+def sync_account_refresh(account_id: int, current_user = Depends(get_current_user_from_cookie)):
+    # comandante atualiza qualquer jogador; membro só a própria conta
+    if getattr(current_user, "role", None) != "commander" and getattr(current_user, "account_id", None) != account_id:
+        raise HTTPException(status_code=403, detail="Sem permissão para atualizar esta conta")
+    with Session(engine) as s:
+        player = s.get(Player, account_id)
+        if not player:
+            raise HTTPException(status_code=404, detail="Jogador não encontrado (aguarde o sync completo)")
+        if player.active is False:
+            raise HTTPException(status_code=404, detail="Jogador saiu do clã")
+
+    result = enqueue_account_sync(account_id)
+    if result["status"] == "cooldown":
+        return JSONResponse(result, status_code=429, headers={"Retry-After": str(result["retry_after"])})
+    return JSONResponse(result, status_code=202)
 
 # -----------------------------
 # Optional status endpoint
 # -----------------------------
 @app.get("/sync/status")
 def sync_status(current_user = Depends(get_current_user_from_cookie)):
+    try:
+        tables = get_table_stats(engine)
+        freshness = freshness_summary(engine)
+    except Exception:
+        logger.exception("Falha ao ler table_stats")
+        tables, freshness = {}, {}
+    try:
+        clans = [
+            {"clan_id": c.clan_id, "tag": c.tag, "name": c.name, "members_count": c.members_count,
+             "last_sync_at": c.last_sync_at.isoformat() if c.last_sync_at else None, "last_error": c.last_error}
+            for c in list_clans(engine)
+        ]
+    except Exception:
+        logger.exception("Falha ao ler clãs")
+        clans = []
+    last_sync_ts = sync_runner.LAST_SYNC_TS
+    last_sync_at = (tables.get("garagetank") or {}).get("last_sync_at")
+    if not last_sync_ts and last_sync_at:
+        # processo reiniciado: o último sync gravado no banco vale
+        last_sync_ts = int(datetime.fromisoformat(last_sync_at).timestamp())
+    worker = None
+    queue = _sync_queue_snapshot()
+    if not sync_runner.SYNC_IN_PROCESS:
+        try:
+            worker = read_state(engine)
+        except Exception:
+            logger.exception("Falha ao ler sync_worker_state")
     return JSONResponse({
-        "status": "running" if SYNC_RUNNING else "idle",
-        "last_sync_ts": LAST_SYNC_TS,
+        "status": "running" if queue["running"] else "idle",
+        "last_sync_ts": last_sync_ts,
+        "tables": tables,
+        "freshness": freshness,
         "tank_cache_size": len(TANK_CACHE),
+        "clans": clans,
+        "mode": SYNC_MODE,
+        "rolling": {
+            "last_roster_ts": sync_runner.LAST_ROSTER_TS,
+            "last_activity_ts": sync_runner.LAST_ACTIVITY_TS,
+            "last_slice": sync_runner.LAST_SLICE,
+        } if SYNC_MODE == "rolling" and sync_runner.SYNC_IN_PROCESS else None,
+        "worker": {k: v for k, v in worker.items() if k != "progress"} if worker else None,
+        "queue": queue,
+        "progress": SYNC_PROGRESS.snapshot(),
     })
 
+
+# -----------------------------
+# Progresso do sync ao vivo (Server-Sent Events)
+# -----------------------------
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", "15"))  # segundos entre comentários keep-alive
+
+
+@app.get("/sync/events")
+async def sync_events(request: Request, current_user = Depends(get_current_user_from_cookie)):
+    """
+    Stream text/event-stream: um evento `progress` a cada mudança de fase /
+    lote do sync e `done` ao terminar. Autenticado uma vez, na abertura.
+    """
+    async def _stream():
+        ev = SYNC_PROGRESS.subscribe()
+        last_version = -1
+        try:
+            while True:
+                # clear antes do snapshot: mudança publicada depois dele re-arma o evento
+                ev.clear()
+                snap = SYNC_PROGRESS.snapshot()
+                if snap["version"] != last_version:
+                    last_version = snap["version"]
+                    kind = "progress" if snap["running"] else ("done" if snap["phase"] in ("done", "error") else "idle")
+                    yield f"event: {kind}\ndata: {json.dumps(snap)}\n\n"
+                try:
+                    await asyncio.wait_for(ev.wait(), timeout=SSE_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        break
+                    yield ": keep-alive\n\n"
+        finally:
+            SYNC_PROGRESS.unsubscribe(ev)
+
+    return StreamingResponse(
+        _stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+# -----------------------------
+# Métricas (formato texto do Prometheus)
+# -----------------------------
+REGISTRY.gauge("wotcs_tank_cache_entries", "Veículos no TANK_CACHE").set_function(lambda: len(TANK_CACHE))
+
+
+def _queue_depth() -> Dict[tuple, int]:
+    # todos os tipos conhecidos pela fila (full, slice, clan, account), zerados se vazios;
+    # com o worker separado: pedidos pendentes em sync_job
+    depth = {(kind,): 0 for kind in sync_runner.SYNC_QUEUE.cooldowns}
+    for job in _sync_queue_snapshot()["queued"]:
+        depth[(job["kind"],)] = depth.get((job["kind"],), 0) + 1
+    return depth
+
+
+def _sync_running() -> int:
+    if sync_runner.SYNC_IN_PROCESS:
+        return int(sync_runner.SYNC_QUEUE.busy)
+    # fatias do scheduler do worker não passam por sync_job: o progresso espelhado cobre
+    return int(bool(_sync_queue_snapshot()["running"]) or SYNC_PROGRESS.snapshot()["running"])
+
+
+REGISTRY.gauge("wotcs_sync_queue_depth", "Jobs de sync na fila por tipo", ("kind",)).set_function(_queue_depth)
+REGISTRY.gauge("wotcs_sync_running", "1 enquanto um job de sync executa").set_function(_sync_running)
+REGISTRY.gauge("wotcs_sse_subscribers", "Conexões abertas em /sync/events").set_function(
+    lambda: SYNC_PROGRESS.subscribers)
+REGISTRY.counter("wotcs_fragment_cache_lookups_total", "Consultas ao cache de fragmentos HTML", ("result",)).set_function(
+    lambda: {("hit",): DASHBOARD_FRAGMENTS.hits, ("miss",): DASHBOARD_FRAGMENTS.misses})
+
+
+@app.get("/metrics")
+def metrics(request: Request):
+    """Scrape do Prometheus. Com METRICS_TOKEN: `Authorization: Bearer <token>` ou `?token=`."""
+    if METRICS_TOKEN:
+        auth = request.headers.get("authorization", "")
+        token = auth[7:] if auth.lower().startswith("bearer ") else request.query_params.get("token", "")
+        if not hmac.compare_digest(token, METRICS_TOKEN):
+            raise HTTPException(status_code=401, detail="Token de métricas inválido")
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
 # -----------------------------
 # Startup: DB init, include routers, scheduler
 # -----------------------------
@@ -591,6 +817,7 @@ async def on_startup():
     logger.info("Startup: inicializando DB e scheduler")
     # create tables
     init_db()
+    ensure_clans(engine)
 
     # include routers late to avoid circular import issues
     try:
@@ -614,9 +841,17 @@ async def on_startup():
     except Exception:
         pass
 
-    # schedule periodic job (every 20 minutes)
-    scheduler = AsyncIOScheduler()
-    # APScheduler accepts coroutine functions with AsyncIOScheduler in recent versions.
-    scheduler.add_job(fetch_and_sync, "interval", minutes=20)
-    scheduler.start()
-    logger.info("Scheduler iniciado (fetch_and_sync a cada 20 minutos).")
\ No newline at end of file
+    if sync_runner.SYNC_IN_PROCESS:
+        # worker da fila de sync (refresh de conta tem prioridade sobre o sync completo)
+        sync_runner.start_sync_worker()
+        sync_runner.start_scheduler()
+    else:
+        # sync no worker separado (python -m app.sync_worker): só acompanha o estado dele
+        sync_runner.start_worker_follower()
+        logger.info("SYNC_IN_PROCESS=0: sem scheduler no web; pedidos de sync vão para sync_job.")
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await sync_runner.stop_sync_worker()
+    await sync_runner.stop_worker_follower()
+    shutdown_pool()
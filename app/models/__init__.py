@@ -1,4 +1,30 @@
 # app/models/__init__.py
-from .models import User, Player, GarageTank
+from .models import (
+    User,
+    Clan,
+    Player,
+    GarageTank,
+    GarageTankArchive,
+    TankStatsDelta,
+    TankStatsDaily,
+    TankStatsWeekly,
+    TableStats,
+    AccountFreshness,
+    SyncJobRecord,
+    SyncWorkerState,
+)
 
-__all__ = ["User", "Player", "GarageTank"]
+__all__ = [
+    "User",
+    "Clan",
+    "Player",
+    "GarageTank",
+    "GarageTankArchive",
+    "TankStatsDelta",
+    "TankStatsDaily",
+    "TankStatsWeekly",
+    "TableStats",
+    "AccountFreshness",
+    "SyncJobRecord",
+    "SyncWorkerState",
+]
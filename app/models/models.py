@@ -1,8 +1,8 @@
 # app/models/models.py
 from sqlmodel import SQLModel, Field
 from typing import Optional
-from datetime import datetime
-from sqlalchemy import Boolean, JSON, Column, TIMESTAMP, String, Integer, DateTime
+from datetime import datetime, date
+from sqlalchemy import Boolean, JSON, Column, TIMESTAMP, String, Integer, DateTime, Index
 
 class User(SQLModel, table=True):
     id: Optional[int] = Field(default=None, primary_key=True)
@@ -12,9 +12,27 @@ class User(SQLModel, table=True):
     # novo campo:
     account_id: Optional[int] = Field(default=None, index=True)
     
+class Clan(SQLModel, table=True):
+    """Clãs acompanhados (CLAN_IDS); tag/nome e estado do último sync de cada um."""
+    clan_id: int = Field(primary_key=True)
+    tag: Optional[str] = Field(default=None, sa_column=Column("tag", String(10)))
+    name: Optional[str] = Field(default=None, sa_column=Column("name", String(100)))
+    members_count: int = 0
+    last_sync_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime(timezone=True), nullable=True))
+    last_error: Optional[str] = Field(default=None, sa_column=Column("last_error", String(255)))
+
 class Player(SQLModel, table=True):
     account_id: int = Field(primary_key=True)
     nickname: str
+    clan_id: Optional[int] = Field(default=None, index=True)
+    wn8: Optional[float] = Field(default=None)  # WN8 da conta (estágio de análise do sync)
+    # saiu do clã: garagem movida para garagetank_archive; NULL (coluna recém-criada) = ativo
+    active: Optional[bool] = Field(default=True, sa_column=Column("active", Boolean, nullable=True))
+    left_at: Optional[datetime] = Field(default=None, sa_column=Column("left_at", DateTime(timezone=True), nullable=True))
+    # last_battle_time de /wot/account/info/ (frequência do sync contínuo)
+    last_battle_at: Optional[datetime] = Field(
+        default=None, sa_column=Column("last_battle_at", DateTime(timezone=True), nullable=True)
+    )
 
 
 class GarageTank(SQLModel, table=True):
@@ -22,12 +40,22 @@ class GarageTank(SQLModel, table=True):
 
     id: Optional[int] = Field(default=None, primary_key=True)
     account_id: int = Field(index=True)
+    clan_id: Optional[int] = Field(default=None, index=True)  # denormalizado de Player (filtro sem join)
     tank_id: int
     tank_name: Optional[str] = Field(default=None, sa_column=Column("tank_name", String(150)))
     tier: Optional[int] = Field(default=None)
     battles: Optional[int] = Field(default=0)
     wins: Optional[int] = Field(default=0)
     mark_of_mastery: Optional[int] = Field(default=None)
+    # stats detalhadas (/wot/tanks/stats/, entrada do WN8); NULL quando o sync não as recebeu
+    damage_dealt: Optional[int] = Field(default=None)
+    frags: Optional[int] = Field(default=None)
+    spotted: Optional[int] = Field(default=None)
+    dropped_capture_points: Optional[int] = Field(default=None)
+    damage_received: Optional[int] = Field(default=None)
+    survived_battles: Optional[int] = Field(default=None)
+    xp: Optional[int] = Field(default=None)
+    wn8: Optional[float] = Field(default=None)
     is_premium: Optional[bool] = Field(default=False, sa_column=Column("is_premium", Boolean))
     nation: Optional[str] = Field(default=None, sa_column=Column("nation", String(50)))
     type: Optional[str] = Field(default=None, sa_column=Column("type", String(50)))
@@ -36,4 +64,128 @@ class GarageTank(SQLModel, table=True):
     last_updated: Optional[datetime] = Field(
     default=None,
     sa_column=Column(DateTime(timezone=True), nullable=True)
-    )
\ No newline at end of file
+    )
+
+class GarageTankArchive(SQLModel, table=True):
+    """
+    Garagem de quem saiu do clã (cópia das linhas de garagetank no momento da
+    saída). Fora das consultas do dashboard; apagada após ROSTER_RETENTION_DAYS.
+    """
+    __tablename__ = "garagetank_archive"
+    __table_args__ = (Index("ix_garagetank_archive_archived_at", "archived_at"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    account_id: int = Field(index=True)
+    clan_id: Optional[int] = Field(default=None)
+    tank_id: int
+    tank_name: Optional[str] = Field(default=None, sa_column=Column("tank_name", String(150)))
+    tier: Optional[int] = Field(default=None)
+    battles: Optional[int] = Field(default=0)
+    wins: Optional[int] = Field(default=0)
+    mark_of_mastery: Optional[int] = Field(default=None)
+    damage_dealt: Optional[int] = Field(default=None)
+    frags: Optional[int] = Field(default=None)
+    spotted: Optional[int] = Field(default=None)
+    dropped_capture_points: Optional[int] = Field(default=None)
+    damage_received: Optional[int] = Field(default=None)
+    survived_battles: Optional[int] = Field(default=None)
+    xp: Optional[int] = Field(default=None)
+    wn8: Optional[float] = Field(default=None)
+    is_premium: Optional[bool] = Field(default=False, sa_column=Column("is_premium", Boolean))
+    nation: Optional[str] = Field(default=None, sa_column=Column("nation", String(50)))
+    type: Optional[str] = Field(default=None, sa_column=Column("type", String(50)))
+    image_url: Optional[str] = Field(default=None, sa_column=Column("image_url", String(255)))
+    raw_json: Optional[dict] = Field(default=None, sa_column=Column("raw_json", JSON))
+    last_updated: Optional[datetime] = Field(default=None, sa_column=Column("last_updated", DateTime(timezone=True), nullable=True))
+    archived_at: datetime = Field(sa_column=Column("archived_at", DateTime(timezone=True), nullable=False))
+
+# -----------------------------
+# Histórico de estatísticas (deltas + rollups)
+# -----------------------------
+class TankStatsDelta(SQLModel, table=True):
+    """
+    Linha gravada só quando battles/wins/marca de um tank mudam entre syncs.
+    `month` (YYYYMM) é a chave de partição lógica: consultas e a poda de
+    retenção filtram por ela via índice.
+    """
+    __tablename__ = "tankstats_delta"
+    __table_args__ = (Index("ix_tankstats_delta_month_account", "month", "account_id"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    month: int
+    account_id: int
+    tank_id: int
+    ts: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False))
+    battles: int = 0            # contador absoluto após a mudança
+    wins: int = 0
+    d_battles: int = 0          # variação desde o último sync
+    d_wins: int = 0
+    mark_of_mastery: Optional[int] = None
+
+
+class TankStatsDaily(SQLModel, table=True):
+    __tablename__ = "tankstats_daily"
+
+    day: date = Field(primary_key=True)
+    account_id: int = Field(primary_key=True)
+    tank_id: int = Field(primary_key=True)
+    battles: int = 0
+    wins: int = 0
+
+
+class TankStatsWeekly(SQLModel, table=True):
+    __tablename__ = "tankstats_weekly"
+
+    week_start: date = Field(primary_key=True)  # segunda-feira
+    account_id: int = Field(primary_key=True)
+    tank_id: int = Field(primary_key=True)
+    battles: int = 0
+    wins: int = 0
+
+
+# -----------------------------
+# Metadados mantidos pelo sync (respostas baratas para /sync/check e /sync/status)
+# -----------------------------
+class TableStats(SQLModel, table=True):
+    __tablename__ = "table_stats"
+
+    table_name: str = Field(primary_key=True)
+    row_count: int = 0
+    last_sync_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime(timezone=True), nullable=True))
+    updated_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime(timezone=True), nullable=True))
+
+
+class AccountFreshness(SQLModel, table=True):
+    __tablename__ = "account_freshness"
+
+    account_id: int = Field(primary_key=True)
+    synced_at: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False))
+    tank_rows: int = 0
+
+
+class SyncJobRecord(SQLModel, table=True):
+    """Pedido de sync do web para o worker separado (SYNC_IN_PROCESS=0, app/sync_worker.py)."""
+    __tablename__ = "sync_job"
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    kind: str = Field(sa_column=Column("kind", String(16), nullable=False))  # full | clan | account | slice
+    account_id: Optional[int] = Field(default=None)
+    clan_id: Optional[int] = Field(default=None)
+    # pending -> running -> done | error | skipped (sync ignorado sem rodar); rejected = cooldown no worker
+    status: str = Field(default="pending", sa_column=Column("status", String(16), nullable=False, index=True))
+    profile_by: Optional[str] = Field(default=None, sa_column=Column("profile_by", String(50)))  # arma o profiler
+    created_at: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False))
+    started_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime(timezone=True), nullable=True))
+    finished_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime(timezone=True), nullable=True))
+    error: Optional[str] = Field(default=None, sa_column=Column("error", String(255)))
+
+
+class SyncWorkerState(SQLModel, table=True):
+    """Uma linha: geração do sync, progresso e heartbeat publicados pelo worker para o web."""
+    __tablename__ = "sync_worker_state"
+
+    id: int = Field(default=1, primary_key=True)
+    generation: int = 0
+    progress: Optional[str] = Field(default=None, sa_column=Column("progress", String))  # JSON do SYNC_PROGRESS
+    heartbeat_at: Optional[datetime] = Field(default=None, sa_column=Column(DateTime(timezone=True), nullable=True))
+    pid: Optional[int] = Field(default=None)
@@ -0,0 +1,868 @@
+# app/sync.py
+"""
+Sync com a API da Wargaming.
+
+Etapas (compartilhadas pelo sync completo e pelo refresh de uma conta):
+  1) membros do clã -> Player (só no sync completo)
+  1b) reconciliação do roster: quem saiu é arquivado (app/utils/roster.py)
+  2) /wot/account/tanks/ por conta
+  3) metadados dos veículos (/wot/encyclopedia/vehicles/, em lote, TANK_CACHE)
+  3b) stats detalhadas (/wot/tanks/stats/ com fields=)
+  4) persistência de GarageTank (tiers 6/8/10) + histórico de deltas
+  5) análise (WN8)
+
+Os jobs passam pela fila com prioridade (app/utils/sync_queue.py): o refresh
+de uma conta fura a fila e é atendido entre os lotes do sync completo.
+
+Vários clãs (CLAN_IDS): os membros vêm numa chamada só e as etapas 2..5 de
+cada clã rodam em paralelo, com o TANK_CACHE compartilhado e o limite
+global de requisições do wg_api.
+
+SYNC_MODE=rolling (padrão): em vez do sync completo periódico, o job
+"slice" sincroniza poucas contas por vez, escolhidas pelo last_battle_time
+(app/utils/sync_schedule.py); membros/reconciliação e o last_battle_time
+são renovados nos próprios intervalos.
+
+SYNC_IN_PROCESS=0: o web não agenda nem executa sync; os enqueue_* gravam
+em `sync_job` e o worker separado (python -m app.sync_worker) executa.
+O web segue a geração/progresso publicados pelo worker (follow_worker).
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import httpx
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from sqlmodel import Session, delete, select
+
+from app.db import engine
+from app.models import Player, GarageTank
+from app.utils.tank_cache import load_tank_cache, save_tank_cache
+from app.utils.clan_members import CLAN_MEMBERSHIP
+from app.utils.clans import CLAN_IDS, record_clan_sync
+from app.utils.nickname_index import NICKNAME_INDEX
+from app.utils.ownership_index import OWNERSHIP_INDEX
+from app.utils.sync_state import bump_generation, current_generation, set_generation
+from app.utils.stats_history import load_previous_counters, record_account_deltas, prune_history
+from app.utils.roster import reconcile_membership, purge_archived, active_player_clause
+from app.utils.wn8 import update_wn8
+from app.utils.wg_api import wg_get, fetch_tank_stats, WG_CONCURRENCY
+from app.utils.sync_progress import SYNC_PROGRESS
+from app.utils.table_stats import record_account_sync, recount
+from app.utils.sync_queue import SyncQueue, SyncJob, JobOutcome
+from app.utils.job_table import submit_job, read_state, SYNC_JOB_POLL_SECONDS
+from app.utils.sync_schedule import (
+    SYNC_MODE,
+    SYNC_FULL_INTERVAL,
+    ROLLING_TICK_SECONDS,
+    ROLLING_SLICE_SIZE,
+    ROLLING_ROSTER_INTERVAL,
+    ROLLING_ROSTER_RETRY,
+    ROLLING_ACTIVITY_INTERVAL,
+    ROLLING_PUBLISH_INTERVAL,
+    pick_due,
+    record_activity,
+)
+from app.utils.metrics import SYNC_PHASE_SECONDS, SYNC_SECONDS, SYNC_ROWS, SYNC_DUE_ACCOUNTS, TANK_CACHE_LOOKUPS
+from app.utils.profiling import start_sync_profile, finish_sync_profile
+
+logger = logging.getLogger("wotcs")
+
+WOT_REALM = os.getenv("WOT_REALM", "https://api.worldoftanks.com")
+
+# sync controls & batching
+ENCYCLOPEDIA_BATCH = int(os.getenv("ENCYCLOPEDIA_BATCH", "50"))
+SLEEP_BETWEEN_BATCHES = float(os.getenv("SLEEP_BETWEEN_BATCHES", "0.3"))
+MIN_SYNC_INTERVAL = int(os.getenv("MIN_SYNC_INTERVAL", "45"))  # seconds
+ACCOUNT_SYNC_COOLDOWN = int(os.getenv("ACCOUNT_SYNC_COOLDOWN", "120"))  # seconds, por conta
+SYNC_CHUNK_SIZE = int(os.getenv("SYNC_CHUNK_SIZE", "25"))  # contas por lote do sync completo
+INSERT_BATCH = int(os.getenv("INSERT_BATCH", "100"))  # commit a cada N inserts
+FETCH_TANK_STATS = os.getenv("FETCH_TANK_STATS", "1").lower() in ("1", "true", "yes")
+# 0: sync roda no worker separado (app/sync_worker.py); o web só grava pedidos em sync_job
+SYNC_IN_PROCESS = os.getenv("SYNC_IN_PROCESS", "1").lower() in ("1", "true", "yes")
+# índice de posse (lineup) é do processo que atende o web; o worker separado desliga
+OWNERSHIP_IN_PROCESS = True
+
+# colunas tipadas de GarageTank preenchidas a partir de item["statistics"]
+TANK_STAT_COLUMNS = (
+    "damage_dealt", "damage_received", "frags", "spotted",
+    "dropped_capture_points", "survived_battles", "xp",
+)
+
+SYNC_RUNNING = False
+LAST_SYNC_TS = 0
+# sync contínuo: última renovação de membros / last_battle_time e a última fatia
+LAST_ROSTER_TS = 0
+LAST_ACTIVITY_TS = 0
+LAST_SLICE: Dict[str, Any] = {}
+# fatias gravadas que ainda não avançaram a geração (ver ROLLING_PUBLISH_INTERVAL)
+ROLLING_UNPUBLISHED = False
+LAST_PUBLISH_TS = 0
+TANK_CACHE: Dict[str, Any] = load_tank_cache() or {}
+
+SYNC_QUEUE = SyncQueue(full_cooldown=MIN_SYNC_INTERVAL, account_cooldown=ACCOUNT_SYNC_COOLDOWN)
+
+# clãs em paralelo: um só fetch da enciclopédia por vez (o segundo acha tudo no cache)
+_VEHICLE_META_LOCK = asyncio.Lock()
+
+
+def _item_tank_id(it: Dict[str, Any]) -> Optional[int]:
+    try:
+        return int(it.get("tank_id") or it.get("tankId") or 0) or None
+    except Exception:
+        return None
+
+
+def _cached_tier(tid: int) -> Optional[int]:
+    meta = TANK_CACHE.get(str(tid), {}) or {}
+    tier = meta.get("tier") or meta.get("level") or None
+    try:
+        return int(tier) if tier is not None else None
+    except Exception:
+        return None
+
+
+@contextmanager
+def _phase(name: str):
+    """Publica a etapa no progresso (SSE) e mede sua duração (/metrics)."""
+    SYNC_PROGRESS.update(phase=name)
+    with SYNC_PHASE_SECONDS.time(phase=name):
+        yield
+
+
+# -----------------------------
+# Etapas
+# -----------------------------
+async def _fetch_members(client: httpx.AsyncClient, clan_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """1) membros dos clãs (no extra param); uma chamada para até 100 clãs."""
+    out: Dict[int, Dict[str, Any]] = {}
+    for i in range(0, len(clan_ids), 100):
+        batch = clan_ids[i:i + 100]
+        try:
+            data = await wg_get(client, "/wot/clans/info/", clan_id=batch)
+        except Exception as exc:
+            logger.exception("Erro ao obter membros dos clãs %s: %s", batch, exc)
+            continue
+        for cid in batch:
+            info = data.get(str(cid)) or {}
+            if info.get("members"):
+                out[cid] = info
+    return out
+
+
+def _persist_players(members: List[Dict[str, Any]], clan_id: Optional[int] = None) -> List[int]:
+    account_ids = []
+    with Session(engine) as s:
+        for m in members:
+            try:
+                acc_id = int(m.get("account_id"))
+            except Exception:
+                continue
+            account_ids.append(acc_id)
+            nickname = m.get("account_name") or m.get("nickname") or f"player_{acc_id}"
+            p = s.get(Player, acc_id)
+            if not p:
+                p = Player(account_id=acc_id, nickname=nickname, clan_id=clan_id)
+                s.add(p)
+            elif p.nickname != nickname or p.clan_id != clan_id:
+                # troca de clã entre os clãs acompanhados: a garagem acompanha no próximo persist
+                p.nickname = nickname
+                p.clan_id = clan_id
+                s.add(p)
+        s.commit()
+    SYNC_ROWS.inc(len(account_ids), table="player")
+    return account_ids
+
+
+async def _fetch_last_battle(client: httpx.AsyncClient, account_ids: List[int]) -> Dict[int, int]:
+    """last_battle_time (epoch) por conta via /wot/account/info/, 100 contas por chamada."""
+    out: Dict[int, int] = {}
+    for i in range(0, len(account_ids), 100):
+        batch = account_ids[i:i + 100]
+        try:
+            data = await wg_get(client, "/wot/account/info/", account_id=batch, fields="last_battle_time")
+        except Exception as exc:
+            logger.warning("Falha account/info para %d contas: %s", len(batch), exc)
+            continue
+        for k, v in (data or {}).items():
+            if v and v.get("last_battle_time"):
+                out[int(k)] = int(v["last_battle_time"])
+    return out
+
+
+async def _fetch_account_tanks(client: httpx.AsyncClient, account_ids: Iterable[int]) -> Tuple[Dict[int, list], Set[int]]:
+    """2) gather tanks per player via account/tanks."""
+    account_tanks_map: Dict[int, list] = {}
+    unique_tank_ids: Set[int] = set()
+
+    for acc in account_ids:
+        try:
+            data = await wg_get(client, "/wot/account/tanks/", account_id=acc)
+            items = data.get(str(acc), []) or []
+        except Exception as exc:
+            logger.warning("Falha account/tanks para %s: %s", acc, exc)
+            items = []
+
+        account_tanks_map[acc] = items
+        for it in items:
+            tid = it.get("tank_id") or it.get("tankId")
+            if tid:
+                try:
+                    unique_tank_ids.add(int(tid))
+                except Exception:
+                    pass
+    return account_tanks_map, unique_tank_ids
+
+
+async def _ensure_vehicle_meta(client: httpx.AsyncClient, unique_tank_ids: Set[int]) -> None:
+    """3) fetch vehicles metadata in batches (preferred endpoint)."""
+    async with _VEHICLE_META_LOCK:
+        await _fetch_vehicle_meta(client, unique_tank_ids)
+
+
+async def _fetch_vehicle_meta(client: httpx.AsyncClient, unique_tank_ids: Set[int]) -> None:
+    missing = [tid for tid in unique_tank_ids if str(tid) not in TANK_CACHE]
+    logger.info("Tank IDs faltando no cache: %d", len(missing))
+    TANK_CACHE_LOOKUPS.inc(len(unique_tank_ids) - len(missing), result="hit")
+    TANK_CACHE_LOOKUPS.inc(len(missing), result="miss")
+    if not missing:
+        return
+
+    for i in range(0, len(missing), ENCYCLOPEDIA_BATCH):
+        batch = missing[i:i + ENCYCLOPEDIA_BATCH]
+        try:
+            data = await wg_get(client, "/wot/encyclopedia/vehicles/", tank_id=batch)
+            returned = 0
+            for k, v in data.items():
+                if v:
+                    TANK_CACHE[str(k)] = v
+                    returned += 1
+            logger.info("Batch encyclopedia fetched: requested %d, returned %d", len(batch), returned)
+            try:
+                save_tank_cache(TANK_CACHE)
+            except Exception:
+                logger.exception("Falha ao salvar tank cache incremental.")
+        except Exception as exc:
+            logger.exception("Erro batch encyclopedia (vehicles): %s", exc)
+        await asyncio.sleep(SLEEP_BETWEEN_BATCHES)
+
+    missing_after = [tid for tid in unique_tank_ids if str(tid) not in TANK_CACHE]
+    logger.info("Missing after batch fetch: %d", len(missing_after))
+
+    if len(missing_after) > 0 and len(missing_after) > 0.25 * max(1, len(unique_tank_ids)):
+        try:
+            logger.info("Fazendo fallback: baixando lista completa de vehicles para popular cache (apenas uma vez).")
+            all_data = await wg_get(client, "/wot/encyclopedia/vehicles/", timeout=60)
+            for k, v in all_data.items():
+                TANK_CACHE[str(k)] = v
+            try:
+                save_tank_cache(TANK_CACHE)
+            except Exception:
+                logger.exception("Falha ao salvar tank cache após full dump.")
+            logger.info("Full vehicles dump populou cache com %d entries (aprox).", len(TANK_CACHE))
+        except Exception as exc:
+            logger.exception("Falha no fallback full vehicles list: %s", exc)
+
+
+async def _fetch_detailed_stats(client: httpx.AsyncClient, account_tanks_map: Dict[int, list]) -> None:
+    """3b) stats detalhadas (dano, frags, spot, sobrevivência) só dos tanks que serão gravados."""
+    sem = asyncio.Semaphore(WG_CONCURRENCY)
+    wanted = {
+        acc: [tid for tid in (_item_tank_id(it) for it in items) if tid and _cached_tier(tid) in (6, 8, 10)]
+        for acc, items in account_tanks_map.items()
+    }
+    accs = [acc for acc, tids in wanted.items() if tids]
+    results = await asyncio.gather(
+        *(fetch_tank_stats(client, acc, wanted[acc], sem) for acc in accs),
+        return_exceptions=True,
+    )
+    merged = 0
+    for acc, res in zip(accs, results):
+        if isinstance(res, Exception):
+            logger.warning("Falha tanks/stats para %s: %s", acc, res)
+            continue
+        for it in account_tanks_map[acc]:
+            extra = res.get(_item_tank_id(it))
+            if not extra:
+                continue
+            mark = extra.pop("mark_of_mastery", None)
+            if mark is not None:
+                it["mark_of_mastery"] = mark
+            it.setdefault("statistics", {}).update(extra)
+            merged += 1
+    logger.info("tanks/stats: %d tanks enriquecidos em %d contas", merged, len(accs))
+
+
+def _build_garage_rows(acc: int, items: list, clan_id: Optional[int] = None) -> Tuple[List[GarageTank], Dict[int, tuple]]:
+    to_add = []
+    current_counters = {}
+    for it in items:
+        try:
+            tid = int(it.get("tank_id") or it.get("tankId") or 0)
+        except Exception:
+            continue
+        if not tid:
+            continue
+
+        meta = TANK_CACHE.get(str(tid), {}) or {}
+        tier = meta.get("tier") or meta.get("level") or None
+        try:
+            tier = int(tier) if tier is not None else None
+        except Exception:
+            tier = None
+
+        if tier not in (6, 8, 10):
+            continue
+
+        name = meta.get("name") or meta.get("localized_name") or f"Tank {tid}"
+        stats = it.get("statistics") or {}
+        mark = it.get("mark_of_mastery") if "mark_of_mastery" in it else it.get("mark_of_mastery", None)
+        battles = stats.get("battles") or 0
+        wins = stats.get("wins") or 0
+
+        gt = GarageTank(
+            account_id=acc,
+            clan_id=clan_id,
+            tank_id=tid,
+            tank_name=name,
+            tier=tier,
+        )
+
+        # set optional fields if model contains them
+        try:
+            if hasattr(gt, "battles"):
+                gt.battles = int(battles)
+            if hasattr(gt, "wins"):
+                gt.wins = int(wins)
+            if hasattr(gt, "mark_of_mastery") and mark is not None:
+                gt.mark_of_mastery = int(mark)
+            for col in TANK_STAT_COLUMNS:
+                if stats.get(col) is not None and hasattr(gt, col):
+                    setattr(gt, col, int(stats[col]))
+            if hasattr(gt, "raw_stats"):
+                gt.raw_stats = json.dumps(it)
+            if hasattr(gt, "is_premium"):
+                gt.is_premium = bool(meta.get("is_premium", False))
+            if hasattr(gt, "nation"):
+                gt.nation = meta.get("nation")
+            if hasattr(gt, "type"):
+                gt.type = meta.get("type")
+            if hasattr(gt, "image_url"):
+                images = meta.get("images") or {}
+                gt.image_url = images.get("big_icon") or images.get("small_icon") or None
+            if hasattr(gt, "last_updated"):
+                gt.last_updated = datetime.fromtimestamp(int(time.time()), tz=timezone.utc)
+        except Exception:
+            # não falhar por causa de campos opcionais
+            pass
+
+        to_add.append(gt)
+        current_counters[tid] = (
+            int(battles),
+            int(wins),
+            int(mark) if mark is not None else None,
+        )
+    return to_add, current_counters
+
+
+def _persist_garages(account_tanks_map: Dict[int, list], clan_id: Optional[int] = None) -> Tuple[int, int]:
+    """4) persist GarageTank: remove old tanks para cada account e insere relevantes (tiers 6/8/10)."""
+    saved_tanks = 0
+    history_rows = 0
+    with Session(engine) as s:
+        for acc, items in account_tanks_map.items():
+            # contadores anteriores (para o histórico de deltas)
+            try:
+                previous_counters = load_previous_counters(s, acc)
+            except Exception:
+                logger.exception("Falha ao ler contadores anteriores de %s", acc)
+                previous_counters = {}
+
+            # remove antigos e commit imediato para liberar o trabalho
+            deleted = 0
+            try:
+                res = s.exec(delete(GarageTank).where(GarageTank.account_id == acc))
+                deleted = max(0, res.rowcount or 0)
+                s.commit()
+            except Exception:
+                s.rollback()
+
+            to_add, current_counters = _build_garage_rows(acc, items, clan_id)
+
+            # inserir em batches controlados para evitar muitos parâmetros num só INSERT
+            try:
+                if to_add:
+                    batch_buf = []
+                    for idx, obj in enumerate(to_add, start=1):
+                        batch_buf.append(obj)
+                        saved_tanks += 1
+                        if len(batch_buf) >= INSERT_BATCH:
+                            s.add_all(batch_buf)
+                            s.commit()
+                            s.expunge_all()  # limpa estado da sessão
+                            batch_buf = []
+                    # leftover
+                    if batch_buf:
+                        s.add_all(batch_buf)
+                        s.commit()
+                        s.expunge_all()
+            except Exception:
+                logger.exception("Erro ao persistir garages para account %s; rollback.", acc)
+                s.rollback()
+                try:
+                    # os antigos já foram removidos: a contagem precisa refletir isso
+                    record_account_sync(s, acc, deleted, 0)
+                    s.commit()
+                except Exception:
+                    s.rollback()
+                continue
+
+            # histórico + metadados (contagem de linhas, frescor da conta) no mesmo commit
+            try:
+                history_rows += record_account_deltas(s, acc, previous_counters, current_counters)
+                record_account_sync(s, acc, deleted, len(to_add))
+                s.commit()
+                s.expunge_all()
+            except Exception:
+                logger.exception("Erro ao gravar histórico de stats para account %s; rollback.", acc)
+                s.rollback()
+    return saved_tanks, history_rows
+
+
+async def sync_accounts(
+    client: httpx.AsyncClient,
+    account_ids: List[int],
+    clan_id: Optional[int] = None,
+    publish: bool = True,
+    progress: bool = True,
+) -> int:
+    """
+    Etapas 2..5 para um conjunto de contas (do mesmo clã) — mesmo caminho
+    para o sync completo (em lotes) e para o refresh de uma conta.
+    publish=False: não avança a geração (a fatia do sync contínuo decide quando).
+    progress=False: não conta no progresso (refresh atendido dentro do sync completo).
+    Retorna tanks gravados.
+    """
+    with _phase("account_tanks"):
+        account_tanks_map, unique_tank_ids = await _fetch_account_tanks(client, account_ids)
+    logger.info("Coletados %d tank_ids únicos de %d jogadores", len(unique_tank_ids), len(account_ids))
+
+    with _phase("vehicles"):
+        await _ensure_vehicle_meta(client, unique_tank_ids)
+    logger.info("Tank cache size após fetch: %d", len(TANK_CACHE))
+
+    if FETCH_TANK_STATS:
+        with _phase("tank_stats"):
+            await _fetch_detailed_stats(client, account_tanks_map)
+
+    with _phase("persist"):
+        saved_tanks, history_rows = _persist_garages(account_tanks_map, clan_id)
+    SYNC_ROWS.inc(saved_tanks, table="garagetank")
+    SYNC_ROWS.inc(history_rows, table="tankstats_delta")
+    logger.info("Histórico: %d deltas gravados", history_rows)
+
+    # 5) análise: WN8 por tank/conta (vetorizado) sobre o que acabou de ser gravado
+    with _phase("analytics"):
+        try:
+            update_wn8(engine, list(account_tanks_map.keys()))
+        except Exception:
+            logger.exception("Falha no cálculo de WN8.")
+
+    # invalida fragmentos/caches derivados do banco
+    if publish:
+        bump_generation()
+    if progress:
+        SYNC_PROGRESS.advance(accounts=len(account_ids), rows=saved_tanks + history_rows)
+    return saved_tanks
+
+
+# -----------------------------
+# Jobs
+# -----------------------------
+async def _serve_priority_jobs() -> None:
+    """Atende refreshes de conta pendentes (chamado entre lotes do sync completo)."""
+    while True:
+        job = SYNC_QUEUE.pop_priority()
+        if job is None:
+            return
+        await SYNC_QUEUE.run_job(job, run_sync_job)
+
+
+async def _sync_clan_accounts(client: httpx.AsyncClient, clan_id: int, account_ids: List[int]) -> int:
+    """Etapas 2..5 de um clã, em lotes; clãs diferentes rodam em paralelo."""
+    saved_tanks = 0
+    error = None
+    try:
+        for i in range(0, len(account_ids), SYNC_CHUNK_SIZE):
+            saved_tanks += await sync_accounts(client, account_ids[i:i + SYNC_CHUNK_SIZE], clan_id)
+            # refresh de conta pedido durante o sync completo não espera a volta inteira
+            await _serve_priority_jobs()
+    except Exception as exc:
+        logger.exception("Erro no sync do clã %s: %s", clan_id, exc)
+        error = str(exc)
+    record_clan_sync(engine, clan_id, None, error)
+    logger.info("Clã %s: %d contas, %d tanks gravados", clan_id, len(account_ids), saved_tanks)
+    return saved_tanks
+
+
+async def _refresh_roster(client: httpx.AsyncClient, clan_ids: List[int], full: bool) -> Optional[Dict[int, List[int]]]:
+    """
+    Etapas 1 e 1b: membros -> Player, conjunto de membros do registro,
+    reconciliação e índice de nicknames. Retorna {clan_id: [account_id]}
+    ou None se a API não devolveu membro nenhum.
+    """
+    global LAST_ROSTER_TS
+    with _phase("members"):
+        clans = await _fetch_members(client, clan_ids)
+    if not clans:
+        logger.warning("Nenhum membro obtido; abortando sync.")
+        return None
+    for cid in clan_ids:
+        if cid not in clans:
+            logger.warning("Clã %s sem membros na resposta; fica fora deste sync.", cid)
+            record_clan_sync(engine, cid, None, "Nenhum membro obtido")
+
+    # mesmos conjuntos usados pelo /auth/register (evita outra chamada ao WG)
+    try:
+        CLAN_MEMBERSHIP.update_all(
+            {cid: [int(m["account_id"]) for m in info["members"] if m.get("account_id")]
+             for cid, info in clans.items()},
+            replace=full and len(clans) == len(clan_ids),
+        )
+    except Exception:
+        logger.exception("Falha ao atualizar conjunto de membros do clã.")
+
+    roster_ids: Dict[int, List[int]] = {}
+    for cid, info in clans.items():
+        roster_ids[cid] = _persist_players(info["members"], cid)
+        record_clan_sync(engine, cid, info)
+    all_ids = [acc for ids in roster_ids.values() for acc in ids]
+
+    # quem saiu do clã sai de garagetank antes das etapas por conta
+    with _phase("reconcile"):
+        try:
+            # só com todos os clãs na resposta dá para achar garagem órfã
+            scope = None if full and len(clans) == len(clan_ids) else list(clans)
+            roster = reconcile_membership(engine, all_ids, clan_ids=scope)
+            SYNC_ROWS.inc(roster["archived_rows"], table="garagetank_archive")
+        except Exception:
+            logger.exception("Falha na reconciliação do roster; seguindo com o sync.")
+
+    # índice de nicknames (registro / typeahead) acompanha a tabela Player
+    try:
+        NICKNAME_INDEX.refresh_from_db()
+    except Exception:
+        logger.exception("Falha ao atualizar índice de nicknames.")
+    if full:
+        LAST_ROSTER_TS = int(time.time())
+    return roster_ids
+
+
+def _rebuild_ownership() -> None:
+    """Índice de posse (GET /api/lineup) reflete o que o sync acabou de gravar."""
+    if not OWNERSHIP_IN_PROCESS:
+        return
+    try:
+        OWNERSHIP_INDEX.rebuild(engine)
+    except Exception:
+        logger.exception("Falha ao reconstruir índice de posse.")
+
+
+def _update_ownership(account_ids: List[int], base_generation: int) -> None:
+    """Fatia do sync contínuo: só as contas gravadas mudam no índice de posse."""
+    if not OWNERSHIP_IN_PROCESS:
+        return
+    try:
+        OWNERSHIP_INDEX.update_accounts(engine, account_ids, base_generation)
+    except Exception:
+        logger.exception("Falha ao atualizar índice de posse.")
+
+
+def _maintenance() -> None:
+    """Poda de histórico/arquivo e recontagem (uma vez por sync completo ou por volta do roster)."""
+    prune_history(engine)
+    purge_archived(engine)
+    # corrige eventual deriva da contagem incremental (uma vez por sync, não por request)
+    try:
+        recount(engine, mark_sync=True)
+    except Exception:
+        logger.exception("Falha ao recontar table_stats.")
+
+
+async def rolling_slice() -> JobOutcome:
+    """
+    Um passo do sync contínuo: renova membros e last_battle_time quando os
+    intervalos vencem e sincroniza até ROLLING_SLICE_SIZE contas vencidas
+    (as mais atrasadas primeiro). Tanks gravados ficam em LAST_SLICE.
+    """
+    global LAST_ACTIVITY_TS, LAST_ROSTER_TS, LAST_SLICE, ROLLING_UNPUBLISHED, LAST_PUBLISH_TS
+    if not CLAN_IDS:
+        return "skipped", "Nenhum clã configurado"
+    now = time.time()
+    generation = current_generation()
+    saved_tanks = 0
+    error = None
+    begun = False
+    roster = False
+    try:
+        async with httpx.AsyncClient(timeout=30) as client:
+            if now - LAST_ROSTER_TS >= ROLLING_ROSTER_INTERVAL:
+                SYNC_PROGRESS.begin("rolling")
+                begun = True
+                if await _refresh_roster(client, list(CLAN_IDS), True) is not None:
+                    roster = True
+                    _maintenance()
+                else:
+                    # WG fora do ar / clans/info vazio: nova tentativa em ROLLING_ROSTER_RETRY,
+                    # não a cada passo (nem bump de geração / rebuild do índice por passo)
+                    LAST_ROSTER_TS = int(now) - ROLLING_ROSTER_INTERVAL + ROLLING_ROSTER_RETRY
+                    error = "Nenhum membro obtido"
+
+            if now - LAST_ACTIVITY_TS >= ROLLING_ACTIVITY_INTERVAL:
+                LAST_ACTIVITY_TS = int(now)
+                if not begun:
+                    SYNC_PROGRESS.begin("rolling")
+                    begun = True
+                with Session(engine) as s:
+                    ids = list(s.exec(select(Player.account_id).where(active_player_clause())).all())
+                with _phase("activity"):
+                    activity = await _fetch_last_battle(client, ids)
+                    record_activity(engine, activity)
+                logger.info("last_battle_time renovado para %d de %d contas", len(activity), len(ids))
+
+            due, backlog = pick_due(engine, ROLLING_SLICE_SIZE, now)
+            SYNC_DUE_ACCOUNTS.set(max(0, backlog - len(due)))
+            if due:
+                if not begun:
+                    SYNC_PROGRESS.begin("rolling")
+                    begun = True
+                SYNC_PROGRESS.update(accounts_total=len(due))
+                by_clan: Dict[Optional[int], List[int]] = {}
+                for acc, clan_id in due:
+                    by_clan.setdefault(clan_id, []).append(acc)
+                for clan_id, ids in by_clan.items():
+                    saved_tanks += await sync_accounts(client, ids, clan_id, publish=False)
+                ROLLING_UNPUBLISHED = True
+            # um bump por volta do roster ou por ROLLING_PUBLISH_INTERVAL, não por fatia
+            if roster or (ROLLING_UNPUBLISHED and now - LAST_PUBLISH_TS >= ROLLING_PUBLISH_INTERVAL):
+                bump_generation()
+                ROLLING_UNPUBLISHED = False
+                LAST_PUBLISH_TS = int(now)
+            # índice de posse: rebuild só quando o roster mudou; senão troca as contas da fatia
+            if roster:
+                _rebuild_ownership()
+            elif due:
+                _update_ownership([acc for acc, _clan in due], generation)
+            LAST_SLICE = {"at": int(time.time()), "accounts": len(due), "due": backlog, "tanks": saved_tanks}
+            if due:
+                logger.info("Fatia do sync contínuo: %d contas (%d vencidas), %d tanks", len(due), backlog, saved_tanks)
+    except Exception as exc:
+        logger.exception("Erro na fatia do sync contínuo: %s", exc)
+        error = str(exc)
+    finally:
+        if begun:
+            SYNC_PROGRESS.finish(error)
+    return ("error", error) if error else ("ran", None)
+
+
+async def fetch_and_sync(clan_ids: Optional[List[int]] = None) -> JobOutcome:
+    """
+    Sync optimized to use /wot/account/tanks and /wot/encyclopedia/vehicles (batch).
+    Persists Player and GarageTank (only tiers 6,8,10). Uses TANK_CACHE and save_tank_cache().
+    clan_ids: subconjunto de CLAN_IDS (job "clan:<id>"); None = todos os clãs.
+    Retorna (status, detalhe): ran, skipped (ignorado sem rodar) ou error —
+    erros não propagam, então quem marca o job usa este resultado.
+    """
+    global SYNC_RUNNING, LAST_SYNC_TS
+
+    now_ts = int(time.time())
+    if SYNC_RUNNING:
+        logger.info("Sync ignored: already running.")
+        return "skipped", "Sync já em execução"
+    if now_ts - LAST_SYNC_TS < MIN_SYNC_INTERVAL:
+        logger.info(f"Sync ignored: last sync was {now_ts - LAST_SYNC_TS}s (<{MIN_SYNC_INTERVAL}s).")
+        return "skipped", f"Último sync há {now_ts - LAST_SYNC_TS}s (< {MIN_SYNC_INTERVAL}s)"
+    full = clan_ids is None
+    clan_ids = list(CLAN_IDS) if full else [int(c) for c in clan_ids]
+    if not clan_ids:
+        logger.warning("Nenhum clã configurado (CLAN_IDS / CLAN_ID); sync ignorado.")
+        return "skipped", "Nenhum clã configurado"
+
+    SYNC_RUNNING = True
+    logger.info(f"Iniciando sync para clãs {clan_ids} no realm {WOT_REALM}")
+    SYNC_PROGRESS.begin("full" if full else f"clan:{','.join(map(str, clan_ids))}")
+    # armado por POST /admin/profile/sync; None (sem custo) no caso normal
+    profiler = start_sync_profile("sync-full")
+    error = None
+
+    try:
+        async with httpx.AsyncClient(timeout=30) as client:
+            roster_ids = await _refresh_roster(client, clan_ids, full)
+            if roster_ids is None:
+                error = "Nenhum membro obtido"
+                return "error", error
+            SYNC_PROGRESS.update(accounts_total=sum(len(ids) for ids in roster_ids.values()))
+
+            results = await asyncio.gather(
+                *(_sync_clan_accounts(client, cid, ids) for cid, ids in roster_ids.items())
+            )
+            saved_tanks = sum(results)
+
+            _maintenance()
+            _rebuild_ownership()
+            logger.info("Sync concluído! Tanks gravados: %d", saved_tanks)
+
+    except Exception as exc:
+        logger.exception("Erro inesperado no sync: %s", exc)
+        error = str(exc)
+    finally:
+        LAST_SYNC_TS = int(time.time())
+        SYNC_RUNNING = False
+        SYNC_PROGRESS.finish(error)
+        finish_sync_profile(profiler)
+    return ("error", error) if error else ("ran", None)
+
+
+async def sync_account(account_id: int) -> int:
+    """Refresh de uma única conta pelo mesmo caminho de fetch/persistência."""
+    logger.info("Refresh da conta %s", account_id)
+    # atendido dentro do sync completo: não reinicia nem avança o progresso dele
+    # (accounts_done passaria de accounts_total) e a geração avança com o próximo lote
+    standalone = not SYNC_RUNNING
+    if standalone:
+        SYNC_PROGRESS.begin(f"account:{account_id}", accounts_total=1)
+    error = None
+    try:
+        with Session(engine) as s:
+            player = s.get(Player, int(account_id))
+            clan_id = player.clan_id if player else None
+        async with httpx.AsyncClient(timeout=30) as client:
+            saved = await sync_accounts(client, [int(account_id)], clan_id, publish=standalone, progress=standalone)
+    except Exception as exc:
+        error = str(exc)
+        raise
+    finally:
+        if standalone:
+            SYNC_PROGRESS.finish(error)
+    logger.info("Refresh da conta %s concluído: %d tanks", account_id, saved)
+    return saved
+
+
+async def run_sync_job(job: SyncJob) -> Optional[JobOutcome]:
+    with SYNC_SECONDS.time(kind=job.kind):
+        if job.kind == "full":
+            return await fetch_and_sync()
+        if job.kind == "slice":
+            return await rolling_slice()
+        if job.kind == "clan":
+            return await fetch_and_sync([job.clan_id])
+        await sync_account(job.account_id)  # erro propaga: run_job marca "error"
+        return None
+
+
+def _submit(kind: str, account_id: Optional[int] = None, clan_id: Optional[int] = None,
+            profile_by: Optional[str] = None) -> Dict:
+    if SYNC_IN_PROCESS:
+        return SYNC_QUEUE.submit(kind, account_id, clan_id)
+    return submit_job(engine, kind, account_id, clan_id, SYNC_QUEUE.cooldowns, profile_by)
+
+
+def enqueue_full_sync(profile_by: Optional[str] = None) -> Dict:
+    """profile_by: só com worker separado — o worker arma o profiler para este sync."""
+    return _submit("full", profile_by=profile_by)
+
+
+def enqueue_rolling_slice() -> Dict:
+    return _submit("slice")
+
+
+def enqueue_clan_sync(clan_id: int) -> Dict:
+    return _submit("clan", clan_id=int(clan_id))
+
+
+def enqueue_account_sync(account_id: int) -> Dict:
+    return _submit("account", int(account_id))
+
+
+def start_sync_worker() -> None:
+    SYNC_QUEUE.start(run_sync_job)
+
+
+async def stop_sync_worker() -> None:
+    await SYNC_QUEUE.stop()
+
+
+def start_scheduler() -> AsyncIOScheduler:
+    """rolling: fatias pequenas e frequentes (taxa plana); full: sync completo periódico."""
+    scheduler = AsyncIOScheduler()
+    if SYNC_MODE == "rolling":
+        scheduler.add_job(enqueue_rolling_slice, "interval", seconds=ROLLING_TICK_SECONDS)
+        scheduler.start()
+        logger.info("Scheduler iniciado (sync contínuo, uma fatia a cada %ss).", ROLLING_TICK_SECONDS)
+    else:
+        scheduler.add_job(enqueue_full_sync, "interval", seconds=SYNC_FULL_INTERVAL)
+        scheduler.start()
+        logger.info("Scheduler iniciado (fetch_and_sync a cada %ss).", SYNC_FULL_INTERVAL)
+    return scheduler
+
+
+# -----------------------------
+# Web com worker separado
+# -----------------------------
+_FOLLOW_TASK: Optional[asyncio.Task] = None
+
+
+def _apply_worker_state(state: Dict[str, Any], last_version: Optional[int]) -> Optional[int]:
+    """Adota geração e progresso do worker; recarrega o que o sync mudou fora deste processo."""
+    gen = int(state.get("generation") or 0)
+    if gen and gen != current_generation():
+        set_generation(gen)
+        try:
+            NICKNAME_INDEX.refresh_from_db()
+        except Exception:
+            logger.exception("Falha ao atualizar índice de nicknames.")
+        TANK_CACHE.update(load_tank_cache() or {})
+        # índice de posse: ensure_fresh reconstrói na próxima consulta a /api/lineup,
+        # não a cada geração em todo processo web
+    progress = state.get("progress") or {}
+    version = progress.get("version")
+    if progress and version != last_version:
+        SYNC_PROGRESS.mirror(progress)
+    return version
+
+
+async def follow_worker() -> None:
+    """Lê sync_worker_state a cada SYNC_JOB_POLL_SECONDS (uma linha)."""
+    last_version: Optional[int] = None
+    while True:
+        try:
+            state = await asyncio.to_thread(read_state, engine)
+            if state:
+                # nicknames / TANK_CACHE fora do event loop
+                last_version = await asyncio.to_thread(_apply_worker_state, state, last_version)
+        except Exception:
+            logger.exception("Falha ao ler estado do worker de sync")
+        await asyncio.sleep(SYNC_JOB_POLL_SECONDS)
+
+
+def start_worker_follower() -> None:
+    global _FOLLOW_TASK
+    if _FOLLOW_TASK is None or _FOLLOW_TASK.done():
+        _FOLLOW_TASK = asyncio.get_running_loop().create_task(follow_worker())
+
+
+async def stop_worker_follower() -> None:
+    global _FOLLOW_TASK
+    task, _FOLLOW_TASK = _FOLLOW_TASK, None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, Exception):
+            pass
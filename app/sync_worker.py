@@ -0,0 +1,149 @@
+# app/sync_worker.py
+"""
+Worker de sync fora do processo web.
+
+Uso:
+    python -m app.sync_worker
+
+Roda sozinho o scheduler (SYNC_MODE) e a fila de sync; o web com
+SYNC_IN_PROCESS=0 não agenda nem executa sync e não disputa CPU/GIL/pool
+de conexões com ele. Os dois conversam só pelo banco:
+
+- sync_job: pedidos do web (refresh de conta, clã, sync completo) são
+  reivindicados aqui a cada SYNC_JOB_POLL_SECONDS, entram na SyncQueue
+  local e são marcados done/error/skipped (rejected: cooldown) ao terminar;
+- sync_worker_state: geração do sync (o web invalida caches), snapshot do
+  progresso (SSE do web) e heartbeat.
+
+Com METRICS_PORT o worker serve o próprio registro de métricas (latência
+da WG, etapas do sync, linhas gravadas) em http://<host>:METRICS_PORT/metrics;
+o /metrics do web não vê nada disso.
+
+WG_RATE_LIMIT vale por processo: o worker e o web têm baldes separados,
+então o orçamento do application_id é dividido entre eles pelo ambiente.
+
+Uma réplica só: o scheduler não é coordenado entre workers.
+"""
+
+import os
+import time
+import signal
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from app.db import engine, init_db
+from app import sync
+from app.utils.clans import ensure_clans
+from app.utils.job_table import (
+    SYNC_JOB_POLL_SECONDS,
+    WORKER_HEARTBEAT_SECONDS,
+    claim_pending,
+    finish_jobs,
+    prune_jobs,
+    publish_state,
+    requeue_running,
+)
+from app.utils.metrics import start_http_server
+from app.utils.profiling import arm_sync_profile
+from app.utils.sync_progress import SYNC_PROGRESS
+from app.utils.sync_queue import SyncJob
+from app.utils.sync_state import current_generation
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+logger = logging.getLogger("wotcs.worker")
+
+PRUNE_EVERY = 3600  # segundos entre podas de sync_job
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))  # 0 = sem endpoint de métricas
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# chave do job na fila local -> ids de sync_job atendidos por ele
+_claimed: Dict[str, List[int]] = {}
+
+
+# resultado do job (SyncQueue.run_job) -> status em sync_job
+_FINAL_STATUS = {"ran": "done", "skipped": "skipped", "error": "error"}
+
+
+def _on_done(job: SyncJob, status: str, detail: Optional[str]) -> None:
+    ids = _claimed.pop(job.key, [])
+    if not ids:
+        return
+    # skipped: fetch_and_sync voltou sem rodar (outro sync em curso, MIN_SYNC_INTERVAL)
+    finish_jobs(engine, ids, _FINAL_STATUS.get(status, "error"), detail)
+
+
+def _dispatch(rows: List[Dict[str, Any]]) -> None:
+    for row in rows:
+        if row["profile_by"]:
+            arm_sync_profile(row["profile_by"])
+        res = sync.SYNC_QUEUE.submit(row["kind"], row["account_id"], row["clan_id"])
+        if res["status"] == "cooldown":
+            finish_jobs(engine, [row["id"]], "rejected", f"cooldown ({res['retry_after']}s)")
+        else:
+            # duplicate: o job igual na fila/rodando cobre este pedido
+            _claimed.setdefault(res["job"], []).append(row["id"])
+
+
+async def run() -> None:
+    logger.info("Worker de sync: inicializando DB")
+    init_db()
+    ensure_clans(engine)
+
+    # os enqueue_* do scheduler deste processo vão para a fila local
+    sync.SYNC_IN_PROCESS = True
+    sync.OWNERSHIP_IN_PROCESS = False  # quem consulta o índice é o web
+    requeued = requeue_running(engine)
+    if requeued:
+        logger.info("%d pedidos interrompidos voltaram para a fila", requeued)
+    sync.SYNC_QUEUE.on_done = _on_done
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT, METRICS_TOKEN)
+    sync.start_sync_worker()
+    scheduler = sync.start_scheduler()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # Windows
+
+    published = None
+    last_beat = 0.0
+    last_prune = 0.0
+    while not stop.is_set():
+        try:
+            _dispatch(await asyncio.to_thread(claim_pending, engine))
+            now = time.time()
+            snap = SYNC_PROGRESS.snapshot()
+            state = (current_generation(), snap["version"])
+            if state != published or now - last_beat >= WORKER_HEARTBEAT_SECONDS:
+                await asyncio.to_thread(publish_state, engine, state[0], snap)
+                published, last_beat = state, now
+            if now - last_prune >= PRUNE_EVERY:
+                last_prune = now
+                await asyncio.to_thread(prune_jobs, engine)
+        except Exception:
+            logger.exception("Falha no loop do worker de sync")
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=SYNC_JOB_POLL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+
+    logger.info("Worker de sync: encerrando")
+    scheduler.shutdown(wait=False)
+    await sync.stop_sync_worker()
+
+
+def main() -> None:
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,23 @@ Evite lógica pesada aqui — apenas importações limpíssimas.
 """
 
 from .tank_cache import load_tank_cache, save_tank_cache
+from .session import (
+    Principal,
+    issue_token,
+    invalidate_principal,
+    get_current_user_from_cookie,
+)
+from .passwords import hash_password, verify_password, PasswordPoolBusy
 # from .time_helpers import parse_iso, format_dt   # exemplo
 
-__all__ = ["load_tank_cache", "save_tank_cache"]
+__all__ = [
+    "load_tank_cache",
+    "save_tank_cache",
+    "Principal",
+    "issue_token",
+    "invalidate_principal",
+    "get_current_user_from_cookie",
+    "hash_password",
+    "verify_password",
+    "PasswordPoolBusy",
+]
@@ -0,0 +1,158 @@
+# app/utils/cassette.py
+"""
+Gravação / reprodução ("cassete") das respostas da API da Wargaming.
+
+    WG_CASSETTE_MODE=record  -> toda chamada de wg_get/wg_get_sync é gravada
+    WG_CASSETTE_MODE=replay  -> as respostas vêm do cassete, sem rede
+    WG_CASSETTE_TIMING=original | fast  (replay: latência gravada ou nenhuma)
+
+Arquivo: JSONL comprimido com gzip (WG_CASSETTE_PATH), uma linha por
+requisição: {"seq", "t", "elapsed", "path", "params", "status_code", "body"}.
+O application_id nunca é gravado.
+
+No replay a chave é (path, params); a mesma requisição repetida devolve as
+respostas na ordem gravada (a última se repete quando acabam). Requisição
+que não está no cassete -> CassetteMiss (tratada como erro de chamada).
+"""
+
+import os
+import gzip
+import json
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Optional, Tuple
+
+import httpx
+
+logger = logging.getLogger("wotcs.cassette")
+
+WG_CASSETTE_MODE = os.getenv("WG_CASSETTE_MODE", "off").lower()  # off | record | replay
+WG_CASSETTE_PATH = os.getenv("WG_CASSETTE_PATH", "data/cassettes/wg.jsonl.gz")
+WG_CASSETTE_TIMING = os.getenv("WG_CASSETTE_TIMING", "original").lower()  # original | fast
+
+_SECRET_PARAMS = ("application_id", "access_token")
+
+Key = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+
+class CassetteMiss(LookupError):
+    """Requisição sem resposta gravada no cassete."""
+
+
+def _key(path: str, params: Dict[str, str]) -> Key:
+    return path, tuple(sorted((k, str(v)) for k, v in params.items() if k not in _SECRET_PARAMS))
+
+
+class Cassette:
+    def __init__(self, mode: str = "off", path: str = WG_CASSETTE_PATH, timing: str = "original"):
+        if mode not in ("off", "record", "replay"):
+            logger.warning("WG_CASSETTE_MODE inválido (%s); usando off", mode)
+            mode = "off"
+        self.mode = mode
+        self.path = Path(path)
+        self.timing = timing
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._t0: Optional[float] = None
+        self._started = False
+        self._tracks: Dict[Key, Deque[Dict[str, Any]]] = {}
+        self._last: Dict[Key, Dict[str, Any]] = {}
+        self.misses = 0
+        if mode == "replay":
+            self._load()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    # -------------------------
+    # gravação
+    # -------------------------
+    def record(self, path: str, params: Dict[str, str], response: httpx.Response, elapsed: float) -> None:
+        try:
+            body: Any = response.json()
+        except ValueError:
+            body = response.text
+        now = time.monotonic()
+        with self._lock:
+            if not self._started:
+                # um cassete por execução: começa do zero
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self.path.unlink(missing_ok=True)
+                self._t0 = now - elapsed
+                self._started = True
+                logger.info("Gravando respostas da WG em %s", self.path)
+            self._seq += 1
+            entry = {
+                "seq": self._seq,
+                "t": round(now - elapsed - self._t0, 4),
+                "elapsed": round(elapsed, 4),
+                "path": path,
+                "params": {k: v for k, v in params.items() if k not in _SECRET_PARAMS},
+                "status_code": response.status_code,
+                "body": body,
+            }
+            # cada append vira um membro gzip; gzip.open lê a concatenação
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    # -------------------------
+    # reprodução
+    # -------------------------
+    def _load(self) -> None:
+        if not self.path.exists():
+            logger.error("Cassete %s não encontrado: toda chamada à WG vai falhar", self.path)
+            return
+        n = 0
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                self._tracks.setdefault(_key(entry["path"], entry["params"]), deque()).append(entry)
+                n += 1
+        logger.info("Cassete %s carregado: %d respostas, %d requisições distintas", self.path, n, len(self._tracks))
+
+    def _next(self, path: str, params: Dict[str, str]) -> Dict[str, Any]:
+        key = _key(path, params)
+        with self._lock:
+            track = self._tracks.get(key)
+            if track:
+                entry = track.popleft()
+                self._last[key] = entry
+                return entry
+            if key in self._last:
+                return self._last[key]
+            self.misses += 1
+        raise CassetteMiss(f"{path} {dict(key[1])} não está no cassete {self.path}")
+
+    @staticmethod
+    def _response(path: str, entry: Dict[str, Any]) -> httpx.Response:
+        request = httpx.Request("GET", f"cassette://{path}")
+        body = entry.get("body")
+        if isinstance(body, str):
+            return httpx.Response(entry["status_code"], text=body, request=request)
+        return httpx.Response(entry["status_code"], json=body, request=request)
+
+    def replay(self, path: str, params: Dict[str, str]) -> httpx.Response:
+        entry = self._next(path, params)
+        if self.timing == "original" and entry.get("elapsed"):
+            time.sleep(entry["elapsed"])
+        return self._response(path, entry)
+
+    async def replay_async(self, path: str, params: Dict[str, str]) -> httpx.Response:
+        entry = self._next(path, params)
+        if self.timing == "original" and entry.get("elapsed"):
+            await asyncio.sleep(entry["elapsed"])
+        return self._response(path, entry)
+
+
+CASSETTE = Cassette(WG_CASSETTE_MODE, WG_CASSETTE_PATH, WG_CASSETTE_TIMING)
@@ -0,0 +1,198 @@
+# app/utils/clan_members.py
+"""
+Conjunto de membros dos clãs (CLAN_IDS) em memória, compartilhado entre o
+registro (/auth/register) e o sync (fetch_and_sync).
+
+- consulta O(1) num frozenset (nada de ler JSON do disco a cada registro);
+  um conjunto por clã, e a união para o registro;
+- TTL expirado -> stale-while-revalidate: responde com o conjunto atual e
+  dispara UM refresh em background (single-flight);
+- só bloqueia no cold start (nenhum membro conhecido), esperando o mesmo refresh;
+- refresh que falhou (WG fora do ar) segura novas tentativas por
+  MEMBERS_RETRY_SECONDS e o conjunto antigo continua valendo;
+- data/members_cache.json só é regravado quando o conjunto muda.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, FrozenSet, List
+
+import httpx
+
+from app.utils.wg_api import wg_get_sync
+from app.utils.cassette import CASSETTE
+from app.utils.clans import CLAN_IDS
+
+logger = logging.getLogger("wotcs.members")
+
+WOT_APP_ID = os.getenv("WOT_APP_ID", "")
+
+MEMBERS_CACHE_PATH = Path("data/members_cache.json")
+MEMBERS_CACHE_TTL = int(os.getenv("MEMBERS_CACHE_TTL", str(60 * 10)))  # 10 minutes
+MEMBERS_COLD_WAIT = float(os.getenv("MEMBERS_COLD_WAIT", "15"))  # segundos de espera no cold start
+MEMBERS_RETRY_SECONDS = int(os.getenv("MEMBERS_RETRY_SECONDS", "60"))  # espera após um refresh que falhou
+
+
+def fetch_members_from_wg() -> Optional[Dict[int, List[int]]]:
+    """
+    Chamada 'leve' a /wot/clans/info/ para todos os clãs de uma vez (sem
+    extra=members: alguns realms respondiam INVALID_EXTRA).
+    Retorna {clan_id: [account_id, ...]} ou None em caso de erro. Clã
+    ausente ou sem membros na resposta fica de fora (não zera o conjunto dele).
+    """
+    # replay do cassete não precisa de application_id
+    if not CLAN_IDS or not (WOT_APP_ID or CASSETTE.replaying):
+        logger.warning("WOT_APP_ID or CLAN_IDS not configured.")
+        return None
+    try:
+        with httpx.Client(timeout=10) as client:
+            data = wg_get_sync(client, "/wot/clans/info/", clan_id=CLAN_IDS)
+        out = {}
+        for cid in CLAN_IDS:
+            members = (data.get(str(cid)) or {}).get("members", []) or []
+            ids = [int(m["account_id"]) for m in members if "account_id" in m]
+            if ids:
+                out[cid] = ids
+            else:
+                logger.warning("Clã %s sem membros na resposta; mantém o conjunto anterior.", cid)
+        return out or None
+    except Exception as exc:
+        logger.exception("Erro ao buscar membros do WG: %s", exc)
+        return None
+
+
+class ClanMembership:
+    def __init__(
+        self,
+        path: Path = MEMBERS_CACHE_PATH,
+        ttl: int = MEMBERS_CACHE_TTL,
+        fetcher: Callable[[], Optional[Dict[int, List[int]]]] = fetch_members_from_wg,
+    ):
+        self.path = path
+        self.ttl = ttl
+        self._fetcher = fetcher
+        self._lock = threading.Lock()
+        self._clans: Dict[int, FrozenSet[int]] = {}
+        self._members: FrozenSet[int] = frozenset()  # união dos clãs
+        self._ts = 0
+        self._retry_at = 0.0  # refresh falhou: nenhuma chamada à WG antes disso
+        self._loaded = False
+        self._inflight: Optional[threading.Event] = None
+
+    # -------------------------
+    # disco
+    # -------------------------
+    def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not self.path.exists():
+                return
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                self._clans = {int(k): frozenset(int(x) for x in v) for k, v in (data.get("clans") or {}).items()}
+                self._members = frozenset(int(x) for x in data.get("members") or [])
+                self._ts = int(data.get("ts", 0))
+            except Exception as exc:
+                logger.exception("Failed to load members cache: %s", exc)
+
+    def _save(self, clans: Dict[int, FrozenSet[int]], members: FrozenSet[int], ts: int) -> None:
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({
+                    "ts": ts,
+                    "members": sorted(members),
+                    "clans": {str(cid): sorted(ids) for cid, ids in clans.items()},
+                }, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+        except Exception as exc:
+            logger.exception("Failed to save members cache: %s", exc)
+
+    # -------------------------
+    # API
+    # -------------------------
+    def update(self, account_ids: Iterable[int], clan_id: Optional[int] = None, ts: Optional[int] = None) -> bool:
+        """
+        Substitui o conjunto de um clã (ex.: pelo fetch_and_sync). Sem clan_id,
+        com um só clã configurado, vale para ele. Retorna True se mudou.
+        """
+        if clan_id is None:
+            clan_id = CLAN_IDS[0] if CLAN_IDS else 0
+        return self.update_all({int(clan_id): account_ids}, ts=ts, replace=False)
+
+    def update_all(self, by_clan: Dict[int, Iterable[int]], ts: Optional[int] = None, replace: bool = True) -> bool:
+        """Conjuntos de vários clãs de uma vez; replace=True descarta clãs que não vieram."""
+        self._ensure_loaded()
+        now = int(ts or time.time())
+        with self._lock:
+            clans = {} if replace else dict(self._clans)
+            for cid, ids in by_clan.items():
+                clans[int(cid)] = frozenset(int(a) for a in ids)
+            union = frozenset().union(*clans.values()) if clans else frozenset()
+            changed = union != self._members or clans != self._clans
+            self._clans = clans
+            self._members = union
+            self._ts = now
+        if changed:
+            self._save(clans, union, now)
+            logger.info("Membros dos clãs atualizados: %d (%d clãs)", len(union), len(clans))
+        return changed
+
+    def is_stale(self) -> bool:
+        now = time.time()
+        return self._ts + self.ttl <= now and now >= self._retry_at
+
+    def refresh_async(self) -> threading.Event:
+        """Dispara (ou reaproveita) o refresh em andamento; retorna o Event de conclusão."""
+        with self._lock:
+            if self._inflight is None:
+                ev = threading.Event()
+                self._inflight = ev
+                threading.Thread(target=self._do_refresh, args=(ev,), name="clan-members-refresh", daemon=True).start()
+            return self._inflight
+
+    def _do_refresh(self, ev: threading.Event) -> None:
+        ok = False
+        try:
+            by_clan = self._fetcher()
+            if by_clan is not None:
+                # mesma regra do _refresh_roster: só substitui tudo com todos os clãs na resposta
+                self.update_all(by_clan, replace=set(CLAN_IDS) <= set(by_clan))
+                ok = True
+        except Exception:
+            logger.exception("Refresh de membros falhou")
+        finally:
+            if not ok:
+                # sem isso cada members()/contains() com o conjunto vencido chamaria a WG de novo
+                self._retry_at = time.time() + MEMBERS_RETRY_SECONDS
+                logger.warning("Refresh de membros falhou; nova tentativa em %ss", MEMBERS_RETRY_SECONDS)
+            with self._lock:
+                self._inflight = None
+            ev.set()
+
+    def members(self, force_refresh: bool = False) -> FrozenSet[int]:
+        self._ensure_loaded()
+        if force_refresh:
+            self.refresh_async().wait(MEMBERS_COLD_WAIT)
+        elif self.is_stale():
+            ev = self.refresh_async()
+            if not self._members:
+                # cold start: sem resposta antiga para servir, espera o refresh único
+                ev.wait(MEMBERS_COLD_WAIT)
+        return self._members
+
+    def contains(self, account_id: int) -> bool:
+        return int(account_id) in self.members()
+
+
+CLAN_MEMBERSHIP = ClanMembership()
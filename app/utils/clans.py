@@ -0,0 +1,84 @@
+# app/utils/clans.py
+"""
+Clãs acompanhados por esta instalação.
+
+CLAN_IDS (lista separada por vírgula) define os clãs; sem ela vale o CLAN_ID
+antigo. A tabela `clan` guarda tag/nome e o estado do último sync de cada
+um; Player e GarageTank levam o clan_id (GarageTank denormalizado, para o
+filtro do dashboard não precisar do join).
+
+Instalação antiga com um só clã: linhas sem clan_id recebem o clã
+configurado no startup (ensure_clans).
+"""
+
+import os
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from app.models import Clan, Player, GarageTank
+
+logger = logging.getLogger("wotcs.clans")
+
+
+def _parse_clan_ids(raw: str) -> List[int]:
+    out: List[int] = []
+    for part in (raw or "").replace(";", ",").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            cid = int(part)
+        except ValueError:
+            logger.warning("CLAN_IDS: valor inválido ignorado: %r", part)
+            continue
+        if cid not in out:
+            out.append(cid)
+    return out
+
+
+CLAN_IDS: List[int] = _parse_clan_ids(os.getenv("CLAN_IDS") or os.getenv("CLAN_ID", ""))
+
+
+def ensure_clans(engine) -> None:
+    """Cria as linhas de `clan` dos clãs configurados e preenche clan_id legado (um só clã)."""
+    if not CLAN_IDS:
+        logger.warning("Nenhum clã configurado (CLAN_IDS / CLAN_ID).")
+        return
+    with Session(engine) as s:
+        for cid in CLAN_IDS:
+            if s.get(Clan, cid) is None:
+                s.add(Clan(clan_id=cid))
+        if len(CLAN_IDS) == 1:
+            cid = CLAN_IDS[0]
+            s.exec(update(Player).where(Player.clan_id.is_(None)).values(clan_id=cid))
+            s.exec(update(GarageTank).where(GarageTank.clan_id.is_(None)).values(clan_id=cid))
+        s.commit()
+
+
+def record_clan_sync(engine, clan_id: int, info: Optional[Dict[str, Any]], error: Optional[str] = None) -> None:
+    """Tag/nome/contagem vindos de /wot/clans/info/ e o resultado do sync do clã."""
+    try:
+        with Session(engine) as s:
+            clan = s.get(Clan, clan_id) or Clan(clan_id=clan_id)
+            if info:
+                clan.tag = info.get("tag") or clan.tag
+                clan.name = info.get("name") or clan.name
+                clan.members_count = len(info.get("members") or []) or clan.members_count
+            clan.last_sync_at = datetime.now(timezone.utc)
+            clan.last_error = error[:255] if error else None
+            s.add(clan)
+            s.commit()
+    except Exception:
+        logger.exception("Falha ao gravar estado do clã %s", clan_id)
+
+
+def list_clans(engine) -> List[Clan]:
+    """Clãs configurados, na ordem de CLAN_IDS (para dropdowns e /sync/status)."""
+    with Session(engine) as s:
+        rows = {c.clan_id: c for c in s.exec(select(Clan).where(Clan.clan_id.in_(CLAN_IDS))).all()} if CLAN_IDS else {}
+    return [rows[cid] for cid in CLAN_IDS if cid in rows]
+
@@ -0,0 +1,54 @@
+# app/utils/fragments.py
+"""
+Cache LRU de fragmentos HTML já renderizados (ex.: dropdowns do dashboard).
+
+A chave deve incluir a geração do sync (app.utils.sync_state) e tudo que
+muda o HTML (role, valores selecionados); entradas antigas saem por LRU.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Hashable
+
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "256"))
+
+
+class FragmentCache:
+    def __init__(self, maxsize: int = FRAGMENT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[Hashable, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable):
+        with self._lock:
+            html = self._data.get(key)
+            if html is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return html
+
+    def put(self, key: Hashable, html: str) -> None:
+        with self._lock:
+            self._data[key] = html
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_render(self, key: Hashable, render: Callable[[], str]) -> str:
+        html = self.get(key)
+        if html is None:
+            html = render()
+            self.put(key, html)
+        return html
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+
+DASHBOARD_FRAGMENTS = FragmentCache()
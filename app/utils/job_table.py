@@ -0,0 +1,221 @@
+# app/utils/job_table.py
+"""
+Fila de sync no banco, para o worker separado (SYNC_IN_PROCESS=0).
+
+- web: `submit_job()` grava o pedido em `sync_job` com as mesmas regras da
+  SyncQueue em memória (mesma chave pendente/rodando = duplicate; cooldown
+  por chave depois de terminar) e devolve o mesmo formato de resposta;
+- worker: `claim_pending()` reivindica os pendentes (UPDATE ... WHERE
+  status='pending', então um pedido nunca é pego duas vezes) e
+  `finish_jobs()` marca done/error/skipped/rejected;
+- `sync_worker_state` (uma linha): geração do sync, snapshot do progresso e
+  heartbeat, publicados pelo worker e lidos pelo web.
+"""
+
+import os
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import case, delete, func, update
+from sqlmodel import Session, select
+
+from app.models import SyncJobRecord, SyncWorkerState
+
+logger = logging.getLogger("wotcs.jobtable")
+
+SYNC_JOB_POLL_SECONDS = float(os.getenv("SYNC_JOB_POLL_SECONDS", "2"))
+SYNC_JOB_RETENTION_HOURS = int(os.getenv("SYNC_JOB_RETENTION_HOURS", "72"))
+WORKER_HEARTBEAT_SECONDS = 15
+WORKER_STALE_SECONDS = 60  # sem heartbeat há mais que isso: worker fora do ar
+
+_ACTIVE = ("pending", "running")
+
+
+def job_key(kind: str, account_id: Optional[int] = None, clan_id: Optional[int] = None) -> str:
+    """Mesma chave da SyncJob em memória."""
+    if kind == "clan":
+        return f"clan:{clan_id}"
+    if kind == "account":
+        return f"account:{account_id}"
+    return kind
+
+
+def _aware(dt: Optional[datetime]) -> Optional[datetime]:
+    if dt is not None and dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)  # SQLite devolve datetime sem tz
+    return dt
+
+
+def _same_key(kind: str, account_id: Optional[int], clan_id: Optional[int]) -> list:
+    where = [SyncJobRecord.kind == kind]
+    if kind == "account":
+        where.append(SyncJobRecord.account_id == account_id)
+    elif kind == "clan":
+        where.append(SyncJobRecord.clan_id == clan_id)
+    return where
+
+
+def _priority_order():
+    # refresh de conta antes do resto, como na SyncQueue
+    return case((SyncJobRecord.kind == "account", 0), else_=10)
+
+
+def submit_job(
+    engine,
+    kind: str,
+    account_id: Optional[int] = None,
+    clan_id: Optional[int] = None,
+    cooldowns: Optional[Dict[str, float]] = None,
+    profile_by: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Enfileira no banco. Retorna {"status": queued|duplicate|cooldown, ...} como SyncQueue.submit."""
+    key = job_key(kind, account_id, clan_id)
+    now = datetime.now(timezone.utc)
+    where = _same_key(kind, account_id, clan_id)
+    with Session(engine) as s:
+        existing = s.exec(select(SyncJobRecord).where(*where, SyncJobRecord.status.in_(_ACTIVE))).first()
+        if existing is not None:
+            if profile_by and existing.status == "pending" and not existing.profile_by:
+                existing.profile_by = profile_by
+                s.add(existing)
+                s.commit()
+            return {"status": "duplicate", "job": key, "id": existing.id}
+
+        cooldown = (cooldowns or {}).get(kind, 0)
+        if cooldown > 0:
+            last_done = _aware(s.exec(
+                select(func.max(SyncJobRecord.finished_at)).where(*where, SyncJobRecord.status.in_(("done", "error")))
+            ).one())
+            if last_done is not None:
+                retry_after = (last_done + timedelta(seconds=cooldown) - now).total_seconds()
+                if retry_after > 0:
+                    return {"status": "cooldown", "job": key, "retry_after": int(retry_after) + 1}
+
+        row = SyncJobRecord(
+            kind=kind, account_id=account_id, clan_id=clan_id,
+            status="pending", profile_by=profile_by, created_at=now,
+        )
+        s.add(row)
+        s.commit()
+        position = s.exec(select(func.count()).select_from(SyncJobRecord).where(SyncJobRecord.status.in_(_ACTIVE))).one()
+        job_id = row.id
+    logger.info("Job de sync gravado para o worker: %s (id %s)", key, job_id)
+    return {"status": "queued", "job": key, "id": job_id, "position": int(position)}
+
+
+def claim_pending(engine, limit: int = 50) -> List[Dict[str, Any]]:
+    """Worker: reivindica os pedidos pendentes (prioridade, depois ordem de chegada)."""
+    now = datetime.now(timezone.utc)
+    claimed: List[Dict[str, Any]] = []
+    with Session(engine) as s:
+        rows = s.exec(
+            select(SyncJobRecord)
+            .where(SyncJobRecord.status == "pending")
+            .order_by(_priority_order(), SyncJobRecord.id)
+            .limit(limit)
+        ).all()
+        for row in rows:
+            res = s.exec(
+                update(SyncJobRecord)
+                .where(SyncJobRecord.id == row.id, SyncJobRecord.status == "pending")
+                .values(status="running", started_at=now)
+            )
+            if res.rowcount == 1:
+                claimed.append({
+                    "id": row.id, "kind": row.kind, "account_id": row.account_id,
+                    "clan_id": row.clan_id, "profile_by": row.profile_by,
+                })
+        s.commit()
+    return claimed
+
+
+def finish_jobs(engine, ids: Iterable[int], status: str = "done", error: Optional[str] = None) -> None:
+    ids = list(ids)
+    if not ids:
+        return
+    with Session(engine) as s:
+        s.exec(
+            update(SyncJobRecord)
+            .where(SyncJobRecord.id.in_(ids))
+            .values(status=status, finished_at=datetime.now(timezone.utc), error=error[:255] if error else None)
+        )
+        s.commit()
+
+
+def requeue_running(engine) -> int:
+    """Worker reiniciado: o que estava rodando volta para pendente."""
+    with Session(engine) as s:
+        res = s.exec(
+            update(SyncJobRecord).where(SyncJobRecord.status == "running").values(status="pending", started_at=None)
+        )
+        s.commit()
+    return max(0, res.rowcount or 0)
+
+
+def prune_jobs(engine) -> int:
+    cutoff = datetime.now(timezone.utc) - timedelta(hours=SYNC_JOB_RETENTION_HOURS)
+    with Session(engine) as s:
+        res = s.exec(
+            delete(SyncJobRecord).where(SyncJobRecord.status.notin_(_ACTIVE), SyncJobRecord.created_at < cutoff)
+        )
+        s.commit()
+    return max(0, res.rowcount or 0)
+
+
+def queue_snapshot(engine) -> Dict[str, List[Dict[str, Any]]]:
+    """Mesmo formato de SyncQueue.snapshot(), a partir de sync_job."""
+    with Session(engine) as s:
+        rows = s.exec(
+            select(SyncJobRecord)
+            .where(SyncJobRecord.status.in_(_ACTIVE))
+            .order_by(_priority_order(), SyncJobRecord.id)
+        ).all()
+    out: Dict[str, List[Dict[str, Any]]] = {"running": [], "queued": []}
+    for r in rows:
+        started = _aware(r.started_at)
+        out["running" if r.status == "running" else "queued"].append({
+            "key": job_key(r.kind, r.account_id, r.clan_id),
+            "kind": r.kind,
+            "account_id": r.account_id,
+            "clan_id": r.clan_id,
+            "priority": 0 if r.kind == "account" else 10,
+            "created_at": int(_aware(r.created_at).timestamp()),
+            "started_at": int(started.timestamp()) if started else None,
+        })
+    return out
+
+
+# -----------------------------
+# estado do worker
+# -----------------------------
+def publish_state(engine, generation: int, progress: Optional[Dict[str, Any]] = None) -> None:
+    with Session(engine) as s:
+        st = s.get(SyncWorkerState, 1) or SyncWorkerState(id=1)
+        st.generation = int(generation)
+        if progress is not None:
+            st.progress = json.dumps(progress)
+        st.heartbeat_at = datetime.now(timezone.utc)
+        st.pid = os.getpid()
+        s.add(st)
+        s.commit()
+
+
+def read_state(engine) -> Optional[Dict[str, Any]]:
+    with Session(engine) as s:
+        st = s.get(SyncWorkerState, 1)
+    if st is None:
+        return None
+    heartbeat = _aware(st.heartbeat_at)
+    try:
+        progress = json.loads(st.progress) if st.progress else None
+    except ValueError:
+        progress = None
+    return {
+        "generation": st.generation,
+        "progress": progress,
+        "heartbeat_at": heartbeat.isoformat() if heartbeat else None,
+        "alive": bool(heartbeat and (datetime.now(timezone.utc) - heartbeat).total_seconds() < WORKER_STALE_SECONDS),
+        "pid": st.pid,
+    }
@@ -0,0 +1,102 @@
+# app/utils/json_response.py
+"""
+Respostas JSON para a API: serialização rápida (orjson, se instalado),
+ETag fraco + 304 para requisições condicionais e compressão gzip/brotli
+negociada pelo Accept-Encoding.
+"""
+
+import json
+import gzip
+import hashlib
+from typing import Any, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - fallback para json da stdlib
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional
+    brotli = None
+
+COMPRESS_MIN_SIZE = 1024  # abaixo disso o cabeçalho custa mais que a economia
+DEFAULT_CACHE_CONTROL = "private, no-cache"  # sempre revalida; o 304 é barato
+
+
+def dumps(obj: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def make_etag(*parts: Any) -> str:
+    raw = "|".join("" if p is None else str(p) for p in parts)
+    return 'W/"%s"' % hashlib.sha1(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # comparação fraca: ignora o prefixo W/
+    wanted = etag[2:] if etag.startswith("W/") else etag
+    for candidate in header.split(","):
+        c = candidate.strip()
+        if c.startswith("W/"):
+            c = c[2:]
+        if c == wanted:
+            return True
+    return False
+
+
+def _base_headers(etag: Optional[str], cache_control: str) -> dict:
+    headers = {"Cache-Control": cache_control, "Vary": "Accept-Encoding, Cookie"}
+    if etag:
+        headers["ETag"] = etag
+    return headers
+
+
+def not_modified(etag: str, cache_control: str = DEFAULT_CACHE_CONTROL) -> Response:
+    return Response(status_code=304, headers=_base_headers(etag, cache_control))
+
+
+def _accepts(request: Request, coding: str) -> bool:
+    for part in request.headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name.strip().lower() != coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        return q > 0
+    return False
+
+
+def json_response(
+    request: Request,
+    payload: Any,
+    etag: Optional[str] = None,
+    status_code: int = 200,
+    cache_control: str = DEFAULT_CACHE_CONTROL,
+) -> Response:
+    body = dumps(payload)
+    headers = _base_headers(etag, cache_control)
+    if len(body) >= COMPRESS_MIN_SIZE:
+        if brotli is not None and _accepts(request, "br"):
+            body = brotli.compress(body, quality=5)
+            headers["Content-Encoding"] = "br"
+        elif _accepts(request, "gzip"):
+            body = gzip.compress(body, compresslevel=6)
+            headers["Content-Encoding"] = "gzip"
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
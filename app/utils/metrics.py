@@ -0,0 +1,269 @@
+# app/utils/metrics.py
+"""
+Métricas no formato texto do Prometheus (exposition format 0.0.4), sem
+dependência externa.
+
+    WG_LATENCY.observe(0.12, endpoint="/wot/account/tanks/")
+    with SYNC_PHASE_SECONDS.time(phase="persist"):
+        ...
+    REGISTRY.render()  -> texto servido em GET /metrics
+
+Gauges podem ter uma função (set_function) avaliada na hora do scrape —
+usado para o pool do banco, tamanho de caches e fila de sync.
+
+Processo sem FastAPI (worker de sync): `start_http_server(port, token)`
+serve o mesmo REGISTRY em GET /metrics numa thread.
+"""
+
+import hmac
+import math
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger("wotcs.metrics")
+
+LabelValues = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    if float(v).is_integer():
+        return str(int(v))
+    return repr(float(v))
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._fn: Optional[Callable[[], object]] = None
+
+    def set_function(self, fn: Callable[[], object]) -> None:
+        """Valor lido na hora do scrape: fn() -> número (sem labels) ou {tupla de label values: número}."""
+        self._fn = fn
+
+    def _fn_items(self) -> List[Tuple[LabelValues, float]]:
+        try:
+            res = self._fn()  # type: ignore[misc]
+        except Exception:
+            return []
+        return sorted(res.items()) if isinstance(res, dict) else [((), res)]
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: labels esperados {self.labelnames}, recebidos {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *a, **k):
+        super().__init__(*a, **k)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        if self._fn is not None:
+            items = self._fn_items()
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, tuple(k))} {_fmt(v)}" for k, v in items if v is not None]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *a, **k):
+        super().__init__(*a, **k)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def samples(self) -> List[str]:
+        if self._fn is not None:
+            items = self._fn_items()
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, tuple(k))} {_fmt(v)}" for k, v in items if v is not None]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._data: Dict[LabelValues, Tuple[List[int], List[float]]] = {}  # (contagens por bucket, [soma, count])
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, totals = self._data.setdefault(key, ([0] * len(self.buckets), [0.0, 0]))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            totals[0] += value
+            totals[1] += 1
+
+    @contextmanager
+    def time(self, **labels: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def samples(self) -> List[str]:
+        out = []
+        with self._lock:
+            items = sorted((k, (list(c), list(t))) for k, (c, t) in self._data.items())
+        for key, (counts, (total, n)) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, ('le', _fmt(bound)))} {cumulative}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return out
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"métrica duplicada: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))  # type: ignore[return-value]
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))  # type: ignore[return-value]
+
+    def render(self) -> str:
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for m in metrics:
+            samples = m.samples()
+            lines.extend(m.header())
+            lines.extend(samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def start_http_server(port: int, token: str = "", host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """GET /metrics com REGISTRY.render(); com token, mesma regra do /metrics do web (Bearer ou ?token=)."""
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlsplit(self.path)
+            if url.path != "/metrics":
+                self.send_error(404)
+                return
+            if token:
+                auth = self.headers.get("Authorization", "")
+                given = auth[7:] if auth.lower().startswith("bearer ") else parse_qs(url.query).get("token", [""])[0]
+                if not hmac.compare_digest(given, token):
+                    self.send_error(401, "Token de métricas inválido")
+                    return
+            body = REGISTRY.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # um scrape a cada poucos segundos não vai para o log
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info("Métricas em http://%s:%d/metrics", host, port)
+    return server
+
+# -----------------------------
+# Métricas da aplicação
+# -----------------------------
+WG_LATENCY = REGISTRY.histogram(
+    "wotcs_wg_request_duration_seconds", "Latência das chamadas à API da Wargaming", ("endpoint",))
+WG_REQUESTS = REGISTRY.counter(
+    "wotcs_wg_requests_total", "Chamadas à API da Wargaming por resultado", ("endpoint", "result"))
+WG_RATE_WAIT_SECONDS = REGISTRY.counter(
+    "wotcs_wg_ratelimit_wait_seconds_total", "Tempo esperando o limite global de requisições à WG")
+
+SYNC_PHASE_SECONDS = REGISTRY.histogram(
+    "wotcs_sync_phase_duration_seconds", "Duração de cada etapa do sync", ("phase",), buckets=SLOW_BUCKETS)
+SYNC_SECONDS = REGISTRY.histogram(
+    "wotcs_sync_duration_seconds", "Duração total de um job de sync", ("kind",), buckets=SLOW_BUCKETS)
+SYNC_ROWS = REGISTRY.counter(
+    "wotcs_sync_rows_written_total", "Linhas gravadas pelo sync", ("table",))
+SYNC_DUE_ACCOUNTS = REGISTRY.gauge(
+    "wotcs_sync_due_accounts", "Contas vencidas esperando uma fatia do sync contínuo (SYNC_MODE=rolling)")
+
+TANK_CACHE_LOOKUPS = REGISTRY.counter(
+    "wotcs_tank_cache_lookups_total", "Consultas ao TANK_CACHE (metadados de veículos) no sync", ("result",))
+TANK_CACHE_HIT_RATIO = REGISTRY.gauge(
+    "wotcs_tank_cache_hit_ratio", "Fração de acertos do TANK_CACHE desde o boot")
+TANK_CACHE_HIT_RATIO.set_function(
+    lambda: (TANK_CACHE_LOOKUPS.value(result="hit")
+             / max(1.0, TANK_CACHE_LOOKUPS.value(result="hit") + TANK_CACHE_LOOKUPS.value(result="miss"))))
+
+DASHBOARD_QUERY_SECONDS = REGISTRY.histogram(
+    "wotcs_dashboard_query_duration_seconds", "Tempo das queries do dashboard por forma de filtro", ("shape", "query"))
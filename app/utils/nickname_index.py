@@ -0,0 +1,155 @@
+# app/utils/nickname_index.py
+"""
+Índice de nicknames em memória (exato / prefixo / substring).
+
+- exato: dict lower(nickname) -> entrada
+- prefixo: lista ordenada + bisect
+- substring: postings de bigramas/trigramas; interseção dos postings e
+  verificação final com `in` só nos candidatos
+
+Reconstruído pelo sync depois de gravar os Players (refresh_from_db) e,
+de forma preguiçosa, na primeira consulta. No PostgreSQL o fallback em SQL
+usa o índice GIN pg_trgm criado em init_db().
+"""
+
+import bisect
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+logger = logging.getLogger("wotcs.nickindex")
+
+Entry = Tuple[str, int, str]  # (lower, account_id, nickname)
+
+
+def _grams(text: str, n: int) -> Set[str]:
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class NicknameIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._built = False
+        # snapshot imutável trocado de uma vez no rebuild:
+        # (entries ordenadas por lower, keys paralelas p/ bisect, exato, gram -> posições)
+        self._state: Tuple[List[Entry], List[str], Dict[str, Entry], Dict[str, Set[int]]] = ([], [], {}, {})
+
+    @property
+    def built(self) -> bool:
+        return self._built
+
+    def __len__(self) -> int:
+        return len(self._state[0])
+
+    def build(self, rows: Iterable[Tuple[int, str]]) -> None:
+        entries = sorted(
+            {(str(nick).lower(), int(acc), str(nick)) for acc, nick in rows if nick}
+        )
+        exact: Dict[str, Entry] = {}
+        postings: Dict[str, Set[int]] = {}
+        for pos, entry in enumerate(entries):
+            low = entry[0]
+            exact.setdefault(low, entry)
+            for n in (2, 3):
+                for g in _grams(low, n):
+                    postings.setdefault(g, set()).add(pos)
+        with self._lock:
+            self._state = (entries, [e[0] for e in entries], exact, postings)
+            self._built = True
+        logger.info("Índice de nicknames reconstruído: %d entradas", len(entries))
+
+    def refresh_from_db(self) -> None:
+        from sqlmodel import Session, select
+        from app.db import engine
+        from app.models import Player
+        from app.utils.roster import active_player_clause
+
+        with Session(engine) as s:
+            # só o roster ativo (quem saiu do clã não se registra)
+            rows = s.exec(select(Player.account_id, Player.nickname).where(active_player_clause())).all()
+        self.build(rows)
+
+    def _ensure_built(self) -> None:
+        if not self._built:
+            try:
+                self.refresh_from_db()
+            except Exception:
+                logger.exception("Falha ao construir índice de nicknames")
+
+    # -------------------------
+    # Consultas
+    # -------------------------
+    def exact(self, q: str) -> Optional[int]:
+        self._ensure_built()
+        entry = self._state[2].get(q.strip().lower())
+        return entry[1] if entry else None
+
+    def prefix(self, q: str, limit: int = 10) -> List[Entry]:
+        self._ensure_built()
+        low = q.strip().lower()
+        if not low:
+            return []
+        entries, keys, _exact, _postings = self._state
+        out = []
+        i = bisect.bisect_left(keys, low)
+        while i < len(keys) and keys[i].startswith(low) and len(out) < limit:
+            out.append(entries[i])
+            i += 1
+        return out
+
+    def substring(self, q: str, limit: int = 10) -> List[Entry]:
+        self._ensure_built()
+        low = q.strip().lower()
+        if not low:
+            return []
+        entries, _keys, _exact, postings = self._state
+        if len(low) == 1:
+            # sem gramas para 1 caractere: varredura com parada antecipada
+            out = []
+            for e in entries:
+                if low in e[0]:
+                    out.append(e)
+                    if len(out) >= limit:
+                        break
+            return out
+        grams = _grams(low, 3) or _grams(low, 2)
+        lists = sorted((postings.get(g, set()) for g in grams), key=len)
+        if not lists or not lists[0]:
+            return []
+        candidates = set(lists[0])
+        for other in lists[1:]:
+            candidates &= other
+            if not candidates:
+                return []
+        hits = [entries[p] for p in sorted(candidates) if low in entries[p][0]]
+        return hits[:limit]
+
+    def search(self, q: str, limit: int = 10) -> List[Dict]:
+        """Typeahead: exato, depois prefixo, depois substring (sem repetir)."""
+        seen: Set[int] = set()
+        out: List[Dict] = []
+        low = q.strip().lower()
+        self._ensure_built()
+        ex = self._state[2].get(low)
+        if ex is not None:
+            seen.add(ex[1])
+            out.append({"account_id": ex[1], "nickname": ex[2]})
+        for group in (self.prefix(low, limit), self.substring(low, limit)):
+            for _low, acc, nick in group:
+                if len(out) >= limit:
+                    return out
+                if acc not in seen:
+                    seen.add(acc)
+                    out.append({"account_id": acc, "nickname": nick})
+        return out
+
+    def resolve(self, q: str) -> Optional[int]:
+        """Mesma semântica do lookup em SQL: exato (case-insensitive), senão substring."""
+        acc = self.exact(q)
+        if acc is not None:
+            return acc
+        hits = self.prefix(q, 1) or self.substring(q, 1)
+        return hits[0][1] if hits else None
+
+
+NICKNAME_INDEX = NicknameIndex()
@@ -0,0 +1,260 @@
+# app/utils/ownership_index.py
+"""
+Índice de posse em memória para montar lineup ("quem tem o tank X").
+
+Cada membro ativo ganha um bit (posição na lista ordenada de account_id);
+cada tank_id guarda os donos ordenados por batalhas (desc) e os bitsets
+acumulados: donos com >= N batalhas = prefixo[bisect(N)]. Uma consulta
+"todos / qualquer um destes tanks" vira AND/OR de ints do Python —
+microssegundos, sem tocar o banco.
+
+Reconstruído ao fim do sync completo e da volta do roster (rebuild); a
+fatia do sync contínuo só troca as linhas das contas que ela gravou
+(update_accounts). Na consulta, ensure_fresh reconstrói se a geração do
+sync mudou (refresh de conta, web com o worker separado).
+"""
+
+import time
+import bisect
+import logging
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlmodel import Session, select
+
+from app.models import Player, GarageTank
+from app.utils.roster import active_player_clause
+from app.utils.sync_state import current_generation
+
+logger = logging.getLogger("wotcs.ownership")
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """Posições dos bits ligados, do menor para o maior."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class _TankOwners:
+    __slots__ = ("neg_battles", "prefix", "name", "tier")
+
+    def __init__(self, owners: List[Tuple[int, int]], name: Optional[str], tier: Optional[int]):
+        # owners: (batalhas, bit) — ordenado por batalhas desc
+        owners.sort(key=lambda o: -o[0])
+        self.neg_battles = [-b for b, _bit in owners]
+        self.prefix = [0]
+        acc = 0
+        for _b, bit in owners:
+            acc |= 1 << bit
+            self.prefix.append(acc)
+        self.name = name
+        self.tier = tier
+
+    def owners(self) -> List[Tuple[int, int]]:
+        """(batalhas, bit) de volta a partir do prefixo (bit i = prefix[i+1] ^ prefix[i])."""
+        return [
+            (-nb, (self.prefix[i + 1] ^ self.prefix[i]).bit_length() - 1)
+            for i, nb in enumerate(self.neg_battles)
+        ]
+
+    def mask(self, min_battles: int = 0) -> int:
+        """Bitset dos donos com pelo menos min_battles batalhas."""
+        if min_battles <= 0:
+            return self.prefix[-1]
+        return self.prefix[bisect.bisect_right(self.neg_battles, -min_battles)]
+
+
+class OwnershipIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()  # single-flight do rebuild
+        self._accounts: List[int] = []
+        self._players: Dict[int, Tuple[str, Optional[int]]] = {}  # account_id -> (nickname, clan_id)
+        self._clan_masks: Dict[int, int] = {}
+        self._tanks: Dict[int, _TankOwners] = {}
+        self._generation: Optional[int] = None
+        self.built_at: Optional[float] = None
+        self.build_seconds = 0.0
+        self.rows = 0
+
+    def rebuild(self, engine) -> None:
+        """Lê Player ativos e garagetank (só account_id, tank_id, battles) e troca o índice inteiro."""
+        with self._build_lock:
+            self._rebuild(engine)
+
+    def _rebuild(self, engine) -> None:
+        generation = current_generation()
+        t0 = time.perf_counter()
+        with Session(engine) as s:
+            players = s.exec(
+                select(Player.account_id, Player.nickname, Player.clan_id)
+                .where(active_player_clause())
+                .order_by(Player.account_id)
+            ).all()
+            bit_of = {acc: i for i, (acc, _n, _c) in enumerate(players)}
+            owners: Dict[int, List[Tuple[int, int]]] = {}
+            meta: Dict[int, Tuple[Optional[str], Optional[int]]] = {}
+            rows = 0
+            result = s.exec(
+                select(GarageTank.account_id, GarageTank.tank_id, GarageTank.battles, GarageTank.tank_name, GarageTank.tier)
+                .execution_options(yield_per=5000)
+            )
+            for acc, tid, battles, name, tier in result:
+                bit = bit_of.get(acc)
+                if bit is None:
+                    continue
+                owners.setdefault(tid, []).append((int(battles or 0), bit))
+                if tid not in meta:
+                    meta[tid] = (name, tier)
+                rows += 1
+
+        clan_masks: Dict[int, int] = {}
+        for acc, _nick, clan_id in players:
+            if clan_id is not None:
+                clan_masks[clan_id] = clan_masks.get(clan_id, 0) | (1 << bit_of[acc])
+        tanks = {tid: _TankOwners(lst, *meta[tid]) for tid, lst in owners.items()}
+
+        with self._lock:
+            self._accounts = [acc for acc, _n, _c in players]
+            self._players = {acc: (nick, clan_id) for acc, nick, clan_id in players}
+            self._clan_masks = clan_masks
+            self._tanks = tanks
+            self._generation = generation
+            self.built_at = time.time()
+            self.build_seconds = time.perf_counter() - t0
+            self.rows = rows
+        logger.info(
+            "Índice de posse: %d membros, %d tanks, %d linhas em %.3fs",
+            len(players), len(tanks), rows, self.build_seconds,
+        )
+
+    def update_accounts(self, engine, account_ids: Iterable[int], base_generation: Optional[int] = None) -> None:
+        """
+        Troca só as linhas destas contas (fatia do sync contínuo): lê o
+        garagetank delas e refaz os tanks que tinham ou passaram a ter.
+
+        base_generation: geração antes da fatia. Índice já desatualizado
+        antes dela, ou conta sem bit (roster mudou): rebuild completo.
+        """
+        account_ids = list(dict.fromkeys(int(a) for a in account_ids))
+        if not account_ids:
+            return
+        with self._build_lock:
+            bit_of = {acc: i for i, acc in enumerate(self._accounts)}
+            stale = self._generation is None or (base_generation is not None and self._generation != base_generation)
+            if stale or any(acc not in bit_of for acc in account_ids):
+                self._rebuild(engine)
+                return
+
+            t0 = time.perf_counter()
+            with Session(engine) as s:
+                rows = s.exec(
+                    select(GarageTank.account_id, GarageTank.tank_id, GarageTank.battles, GarageTank.tank_name, GarageTank.tier)
+                    .where(GarageTank.account_id.in_(account_ids))
+                ).all()
+            changed = 0
+            for acc in account_ids:
+                changed |= 1 << bit_of[acc]
+            fresh: Dict[int, List[Tuple[int, int]]] = {}
+            meta: Dict[int, Tuple[Optional[str], Optional[int]]] = {}
+            for acc, tid, battles, name, tier in rows:
+                fresh.setdefault(tid, []).append((int(battles or 0), bit_of[acc]))
+                meta.setdefault(tid, (name, tier))
+
+            # _TankOwners nunca é alterado no lugar: consultas em curso seguem com o dict antigo
+            tanks = dict(self._tanks)
+            removed = 0
+            touched = [tid for tid, owners in tanks.items() if owners.prefix[-1] & changed]
+            for tid in dict.fromkeys(touched + list(fresh)):
+                current = tanks.get(tid)
+                kept = [o for o in current.owners() if not changed >> o[1] & 1] if current else []
+                if current is not None:
+                    removed += len(current.neg_battles) - len(kept)
+                owners = kept + fresh.get(tid, [])
+                if owners:
+                    tanks[tid] = _TankOwners(owners, *(meta.get(tid) or (current.name, current.tier)))
+                else:
+                    del tanks[tid]
+
+            with self._lock:
+                self._tanks = tanks
+                self._generation = current_generation()
+                self.rows += len(rows) - removed
+        logger.debug(
+            "Índice de posse: %d contas atualizadas (%d linhas) em %.3fs",
+            len(account_ids), len(rows), time.perf_counter() - t0,
+        )
+
+    def ensure_fresh(self, engine) -> None:
+        if self._generation == current_generation():
+            return
+        with self._build_lock:
+            # outra requisição pode ter reconstruído enquanto esta esperava
+            if self._generation != current_generation():
+                self._rebuild(engine)
+
+    def lineup(
+        self,
+        tank_ids: Iterable[int],
+        mode: str = "all",
+        min_battles: int = 0,
+        clan_id: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """Membros que têm todos (mode=all) ou algum (mode=any) dos tanks, com >= min_battles em cada."""
+        tank_ids = list(dict.fromkeys(int(t) for t in tank_ids))
+        t0 = time.perf_counter()
+        with self._lock:
+            tanks, accounts, players = self._tanks, self._accounts, self._players
+            scope = self._clan_masks.get(clan_id, 0) if clan_id is not None else (1 << len(accounts)) - 1
+        masks = {tid: (tanks[tid].mask(min_battles) if tid in tanks else 0) for tid in tank_ids}
+        if mode == "all":
+            result = scope
+            for m in masks.values():
+                result &= m
+        else:
+            result = 0
+            for m in masks.values():
+                result |= m
+            result &= scope
+        query_us = (time.perf_counter() - t0) * 1e6
+
+        members = []
+        for bit in iter_bits(result):
+            acc = accounts[bit]
+            nickname, member_clan = players[acc]
+            members.append({
+                "account_id": acc,
+                "nickname": nickname,
+                "clan_id": member_clan,
+                "tanks": [tid for tid, m in masks.items() if m >> bit & 1],
+            })
+        # quem cobre mais tanks primeiro (mode=any), depois nickname
+        members.sort(key=lambda m: (-len(m["tanks"]), (m["nickname"] or "").lower()))
+        return {
+            "tanks": [
+                {
+                    "tank_id": tid,
+                    "name": tanks[tid].name if tid in tanks else None,
+                    "tier": tanks[tid].tier if tid in tanks else None,
+                    "owners": bin(masks[tid] & scope).count("1"),
+                }
+                for tid in tank_ids
+            ],
+            "count": len(members),
+            "members": members,
+            "query_us": round(query_us, 1),
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "members": len(self._accounts),
+            "tanks": len(self._tanks),
+            "rows": self.rows,
+            "built_at": int(self.built_at) if self.built_at else None,
+            "build_seconds": round(self.build_seconds, 3),
+        }
+
+
+OWNERSHIP_INDEX = OwnershipIndex()
@@ -0,0 +1,152 @@
+# app/utils/passwords.py
+"""
+Hash de senhas (SHA256 -> base64-url -> bcrypt) e pool de processos dedicado.
+
+bcrypt é caro de propósito; rodar no threadpool do Starlette faz um pico de
+logins travar o dashboard. Aqui o trabalho vai para um ProcessPoolExecutor
+próprio, com limite de fila: acima de PASSWORD_POOL_MAX_PENDING a chamada
+falha na hora com PasswordPoolBusy em vez de enfileirar indefinidamente.
+"""
+
+import os
+import asyncio
+import base64
+import hashlib
+import logging
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from passlib.context import CryptContext
+
+logger = logging.getLogger("wotcs.passwords")
+
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_POOL_WORKERS = int(os.getenv("PASSWORD_POOL_WORKERS", "2"))
+PASSWORD_POOL_MAX_PENDING = int(os.getenv("PASSWORD_POOL_MAX_PENDING", "32"))
+
+pwdctx = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+
+class PasswordPoolBusy(RuntimeError):
+    """Fila do pool de hash cheia; o chamador deve responder 'tente novamente'."""
+
+
+# -------------------------
+# Primitivas síncronas (também usadas dentro dos workers)
+# -------------------------
+def _prehash_to_b64(password: str) -> str:
+    """
+    SHA256 -> urlsafe base64 (sem '=') — e garante <=72 bytes UTF-8.
+    """
+    digest = hashlib.sha256(password.encode("utf-8")).digest()
+    b64 = base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
+    # garante comprimento máximo em bytes para bcrypt (72)
+    b64_bytes = b64.encode("utf-8")
+    if len(b64_bytes) > 72:
+        # trunca os bytes a 72 e decoda ignorando corrompidos (improvável)
+        b64 = b64_bytes[:72].decode("ascii", errors="ignore")
+    return b64
+
+
+def hash_password(pw: str) -> str:
+    """
+    Hash seguro para armazenamento: prehash + bcrypt.
+    Trunca novamente como fallback se bcrypt reclamar.
+    """
+    short = _prehash_to_b64(pw)
+    try:
+        return pwdctx.hash(short)
+    except ValueError:
+        # fallback defensivo: corta bytes e re-tenta
+        short2 = short.encode("utf-8")[:72].decode("ascii", errors="ignore")
+        return pwdctx.hash(short2)
+
+
+def verify_password(plain: str, hashed: str) -> bool:
+    short = _prehash_to_b64(plain)
+    try:
+        return pwdctx.verify(short, hashed)
+    except ValueError:
+        # caso o hashed tenha sido gerado com fallback truncado
+        short2 = short.encode("utf-8")[:72].decode("ascii", errors="ignore")
+        return pwdctx.verify(short2, hashed)
+
+
+def hash_rounds(hashed: str) -> Optional[int]:
+    """Custo embutido num hash bcrypt ($2b$<rounds>$...)."""
+    try:
+        return int(hashed.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+def needs_rehash(hashed: str) -> bool:
+    """True quando o hash foi gerado com custo diferente de BCRYPT_ROUNDS."""
+    return hash_rounds(hashed) != BCRYPT_ROUNDS
+
+
+# -------------------------
+# Pool dedicado
+# -------------------------
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ProcessPoolExecutor(max_workers=PASSWORD_POOL_WORKERS)
+                logger.info("Password pool iniciado (%d workers, fila máx %d, rounds=%d)",
+                            PASSWORD_POOL_WORKERS, PASSWORD_POOL_MAX_PENDING, BCRYPT_ROUNDS)
+    return _executor
+
+
+def _release(_fut=None):
+    global _pending
+    with _pending_lock:
+        _pending -= 1
+
+
+async def _submit(fn, *args):
+    global _pending
+    with _pending_lock:
+        if _pending >= PASSWORD_POOL_MAX_PENDING:
+            raise PasswordPoolBusy(f"{_pending} operações de senha pendentes")
+        _pending += 1
+    try:
+        fut = _get_executor().submit(fn, *args)
+    except Exception:
+        _release()
+        raise
+    fut.add_done_callback(_release)
+    return await asyncio.wrap_future(fut)
+
+
+async def hash_password_async(pw: str) -> str:
+    return await _submit(hash_password, pw)
+
+
+async def verify_password_async(plain: str, hashed: str) -> bool:
+    return await _submit(verify_password, plain, hashed)
+
+
+def pool_stats() -> dict:
+    return {
+        "workers": PASSWORD_POOL_WORKERS,
+        "pending": _pending,
+        "max_pending": PASSWORD_POOL_MAX_PENDING,
+        "bcrypt_rounds": BCRYPT_ROUNDS,
+    }
+
+
+def shutdown_pool() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
@@ -0,0 +1,198 @@
+# app/utils/profiling.py
+"""
+Profiler estatístico sob demanda (sem redeploy).
+
+Uma thread amostra a pilha da thread alvo a cada PROFILE_INTERVAL_MS via
+sys._current_frames() e conta pilhas idênticas. O resultado vai para
+data/profiles/ no formato "collapsed stacks" (uma linha `a;b;c N` por
+pilha) — entrada direta do flamegraph.pl, speedscope e inferno.
+
+- por requisição: commander manda `X-Profile: 1` ou `?profile=1` no /dashboard;
+- por sync: POST /admin/profile/sync arma o próximo fetch_and_sync
+  (amostra a thread do event loop, então outras corrotinas que rodarem
+  no meio também aparecem).
+
+Desligado não custa nada: nenhuma thread, nenhum hook — só o teste da flag.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger("wotcs.profiling")
+
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", "data/profiles"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "600"))  # trava de segurança
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))  # arquivos mantidos em PROFILE_DIR
+
+_PROJECT_ROOT = str(Path(__file__).resolve().parents[2])
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = code.co_filename
+    if filename.startswith(_PROJECT_ROOT):
+        filename = filename[len(_PROJECT_ROOT) + 1:]
+    else:
+        filename = os.path.basename(filename)
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self, thread_id: int, label: str, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.thread_id = thread_id
+        self.label = label
+        self.interval = max(0.001, interval_ms / 1000.0)
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.path: Optional[Path] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+        self.duration = 0.0
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        deadline = self._started + PROFILE_MAX_SECONDS
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None or self.thread_id == me:
+                continue
+            stack: List[str] = []
+            while frame is not None:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.reverse()
+            self.stacks[";".join(stack)] += 1
+            self.samples += 1
+            if time.monotonic() > deadline:
+                logger.warning("Profile %s passou de PROFILE_MAX_SECONDS; amostragem encerrada", self.label)
+                return
+
+    def start(self) -> "SamplingProfiler":
+        self._started = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f"profiler-{self.label}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Optional[Path]:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+        self.duration = time.monotonic() - self._started
+        return self._write()
+
+    def _write(self) -> Optional[Path]:
+        try:
+            PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+            stamp = datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+            path = PROFILE_DIR / f"{stamp}-{self.label}.collapsed"
+            with open(path, "w", encoding="utf-8") as f:
+                for stack, n in self.stacks.most_common():
+                    f.write(f"{stack} {n}\n")
+            self.path = path
+            _prune()
+            logger.info(
+                "Profile %s: %d amostras em %.2fs -> %s", self.label, self.samples, self.duration, path,
+            )
+            return path
+        except Exception:
+            logger.exception("Falha ao gravar profile %s", self.label)
+            return None
+
+
+def _prune() -> None:
+    files = sorted(PROFILE_DIR.glob("*.collapsed"))
+    for old in files[:-PROFILE_KEEP] if PROFILE_KEEP > 0 else []:
+        try:
+            old.unlink()
+        except OSError:
+            pass
+
+
+@contextmanager
+def profile_block(label: str):
+    """Amostra a thread atual enquanto o bloco roda; `prof.path` tem o arquivo ao sair."""
+    prof = SamplingProfiler(threading.get_ident(), label).start()
+    try:
+        yield prof
+    finally:
+        prof.stop()
+
+
+def profile_requested(request, user) -> bool:
+    """X-Profile: 1 ou ?profile=1, só para commander."""
+    if request.headers.get("x-profile") != "1" and request.query_params.get("profile") != "1":
+        return False
+    return getattr(user, "role", None) == "commander"
+
+
+# -----------------------------
+# sync (armado pelo admin)
+# -----------------------------
+_sync_lock = threading.Lock()
+_sync_armed: Optional[Dict[str, Any]] = None
+_last_sync_profile: Optional[Dict[str, Any]] = None
+
+
+def arm_sync_profile(requested_by: str) -> Dict[str, Any]:
+    global _sync_armed
+    with _sync_lock:
+        _sync_armed = {"requested_by": requested_by, "armed_at": time.time()}
+        return dict(_sync_armed)
+
+
+def start_sync_profile(label: str = "sync") -> Optional[SamplingProfiler]:
+    """Chamado no início do sync: consome o pedido armado (um sync por pedido)."""
+    global _sync_armed
+    with _sync_lock:
+        if _sync_armed is None:
+            return None
+        armed, _sync_armed = _sync_armed, None
+    logger.info("Profiling do sync ativado por %s", armed["requested_by"])
+    return SamplingProfiler(threading.get_ident(), label).start()
+
+
+def finish_sync_profile(prof: Optional[SamplingProfiler]) -> None:
+    global _last_sync_profile
+    if prof is None:
+        return
+    path = prof.stop()
+    _last_sync_profile = {
+        "file": path.name if path else None,
+        "samples": prof.samples,
+        "seconds": round(prof.duration, 2),
+        "finished_at": time.time(),
+    }
+
+
+def sync_profile_status() -> Dict[str, Any]:
+    with _sync_lock:
+        armed = dict(_sync_armed) if _sync_armed else None
+    return {"armed": armed, "last": _last_sync_profile}
+
+
+def list_profiles() -> List[Dict[str, Any]]:
+    if not PROFILE_DIR.exists():
+        return []
+    out = []
+    for p in sorted(PROFILE_DIR.glob("*.collapsed"), reverse=True):
+        st = p.stat()
+        out.append({"file": p.name, "bytes": st.st_size, "modified": st.st_mtime})
+    return out
+
+
+def profile_path(name: str) -> Optional[Path]:
+    """Arquivo dentro de PROFILE_DIR (nome simples, sem caminhos)."""
+    if not name.endswith(".collapsed") or os.path.basename(name) != name:
+        return None
+    path = PROFILE_DIR / name
+    return path if path.is_file() else None
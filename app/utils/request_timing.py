@@ -0,0 +1,160 @@
+# app/utils/request_timing.py
+"""
+Tempo por fase de cada requisição, devolvido no header `Server-Timing`.
+
+    with timed("facets"):
+        ...
+
+O middleware (app/main.py) abre um RequestTimings por requisição num
+contextvar; `timed()` fora de uma requisição (ex.: sync) não faz nada.
+Todo SQL passa pelos eventos before/after_cursor_execute do engine: o
+tempo entra na fase `db` e statements acima de SLOW_QUERY_MS vão para o
+logger `wotcs.slowquery` em JSON, com os parâmetros ligados.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import event
+
+slow_logger = logging.getLogger("wotcs.slowquery")
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))  # 0 desliga o log
+SLOW_QUERY_PARAMS_MAX = int(os.getenv("SLOW_QUERY_PARAMS_MAX", "500"))  # chars de parâmetros no log
+
+
+class RequestTimings:
+    def __init__(self, method: str = "", path: str = ""):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._phases: Dict[str, float] = {}  # nome -> ms, na ordem de entrada
+        self.sql_ms = 0.0
+        self.sql_count = 0
+
+    def add(self, name: str, ms: float) -> None:
+        with self._lock:
+            self._phases[name] = self._phases.get(name, 0.0) + ms
+
+    def add_sql(self, ms: float) -> None:
+        with self._lock:
+            self.sql_ms += ms
+            self.sql_count += 1
+
+    def server_timing(self) -> str:
+        total = (time.perf_counter() - self.started) * 1000.0
+        with self._lock:
+            parts: List[str] = [f"{name};dur={ms:.2f}" for name, ms in self._phases.items()]
+            if self.sql_count:
+                parts.append(f'db;dur={self.sql_ms:.2f};desc="{self.sql_count} queries"')
+        parts.append(f"total;dur={total:.2f}")
+        return ", ".join(parts)
+
+
+_CURRENT: ContextVar[Optional[RequestTimings]] = ContextVar("wotcs_request_timings", default=None)
+
+
+def begin_request(method: str, path: str):
+    """Abre as medições da requisição; devolve (timings, token para end_request)."""
+    timings = RequestTimings(method, path)
+    return timings, _CURRENT.set(timings)
+
+
+def end_request(token) -> None:
+    _CURRENT.reset(token)
+
+
+def current() -> Optional[RequestTimings]:
+    return _CURRENT.get()
+
+
+@contextmanager
+def timed(name: str):
+    timings = _CURRENT.get()
+    if timings is None:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, (time.perf_counter() - t0) * 1000.0)
+
+
+# -----------------------------
+# SQL (eventos do SQLAlchemy)
+# -----------------------------
+def _params_repr(params: Any) -> str:
+    try:
+        text = json.dumps(params, default=str, ensure_ascii=False)
+    except Exception:
+        text = repr(params)
+    if len(text) > SLOW_QUERY_PARAMS_MAX:
+        text = text[:SLOW_QUERY_PARAMS_MAX] + "…"
+    return text
+
+
+def _log_slow(ms: float, statement: str, params: Any, executemany: bool) -> None:
+    timings = _CURRENT.get()
+    slow_logger.warning(json.dumps({
+        "event": "slow_query",
+        "ms": round(ms, 2),
+        "statement": " ".join(statement.split()),
+        "params": _params_repr(params),
+        "executemany": executemany,
+        "request": f"{timings.method} {timings.path}" if timings else None,
+    }, ensure_ascii=False))
+
+
+def install_sql_timing(engine) -> None:
+    """Registra os eventos de tempo de SQL no engine (uma vez, no import de app.db)."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        stack: List[float] = conn.info.setdefault("wotcs_query_start", [])
+        stack.append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        stack: List[float] = conn.info.get("wotcs_query_start") or []
+        if not stack:
+            return
+        ms = (time.perf_counter() - stack.pop()) * 1000.0
+        timings = _CURRENT.get()
+        if timings is not None:
+            timings.add_sql(ms)
+        if SLOW_QUERY_MS and ms >= SLOW_QUERY_MS:
+            _log_slow(ms, statement, parameters, executemany)
+
+
+# -----------------------------
+# Middleware (ASGI puro: não bufferiza streams como o SSE)
+# -----------------------------
+class ServerTimingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings, token = begin_request(scope.get("method", ""), scope.get("path", ""))
+
+        async def _send(message):
+            if message["type"] == "http.response.start":
+                headers = [h for h in message.get("headers", []) if h[0].lower() != b"server-timing"]
+                headers.append((b"server-timing", timings.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            end_request(token)
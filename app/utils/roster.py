@@ -0,0 +1,162 @@
+# app/utils/roster.py
+"""
+Reconciliação do roster com a lista de membros do clã (etapa do sync completo).
+
+- quem saiu: Player.active = False + left_at; a garagem vai para
+  `garagetank_archive` (INSERT ... SELECT) e sai de `garagetank`, então
+  contagens, agregados e o dropdown do dashboard só veem o roster ativo;
+- garagem órfã (account_id sem Player) é arquivada do mesmo jeito (só no
+  sync de todos os clãs: num sync parcial não dá para saber de quem é);
+- quem voltou: reativado; o arquivo antigo é descartado (o sync regrava).
+
+Poda (purge_archived): arquivo, Player inativo e histórico de quem saiu há
+mais de ROSTER_RETENTION_DAYS são apagados.
+"""
+
+import os
+import time
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import delete, insert, update, or_, bindparam, DateTime
+from sqlmodel import Session, select
+
+from app.models import (
+    Player,
+    GarageTank,
+    GarageTankArchive,
+    AccountFreshness,
+    TankStatsDelta,
+    TankStatsDaily,
+    TankStatsWeekly,
+)
+
+logger = logging.getLogger("wotcs.roster")
+
+ROSTER_RETENTION_DAYS = int(os.getenv("ROSTER_RETENTION_DAYS", "90"))
+ROSTER_PURGE_INTERVAL = int(os.getenv("ROSTER_PURGE_INTERVAL", str(6 * 3600)))  # segundos
+# trava contra lista de membros parcial da API: não arquiva mais que essa fração do roster de uma vez
+ROSTER_MAX_DEPARTED_FRACTION = float(os.getenv("ROSTER_MAX_DEPARTED_FRACTION", "0.5"))
+ROSTER_BATCH = 500  # contas por IN (...)
+
+# colunas copiadas de garagetank para o arquivo (tudo menos o id)
+_ARCHIVE_COLUMNS = [c.name for c in GarageTank.__table__.columns if c.name != "id"]
+
+_last_purge_ts = 0
+
+
+def active_player_clause():
+    """Player ativo (NULL = coluna recém-adicionada, ainda não reconciliado)."""
+    return or_(Player.active.is_(None), Player.active == True)  # noqa: E712
+
+
+def _chunks(ids: List[int]) -> Iterable[List[int]]:
+    for i in range(0, len(ids), ROSTER_BATCH):
+        yield ids[i:i + ROSTER_BATCH]
+
+
+def _archive_accounts(s: Session, account_ids: List[int], now: datetime) -> int:
+    """Move a garagem das contas para garagetank_archive (sem commit). Retorna linhas movidas."""
+    moved = 0
+    src = GarageTank.__table__
+    dst = GarageTankArchive.__table__
+    for chunk in _chunks(account_ids):
+        archived_at = bindparam("archived_at", now, type_=DateTime(timezone=True)).label("archived_at")
+        sel = select(*[src.c[name] for name in _ARCHIVE_COLUMNS], archived_at).where(src.c.account_id.in_(chunk))
+        s.exec(insert(dst).from_select(_ARCHIVE_COLUMNS + ["archived_at"], sel))
+        res = s.exec(delete(GarageTank).where(GarageTank.account_id.in_(chunk)))
+        moved += max(0, res.rowcount or 0)
+        s.exec(delete(AccountFreshness).where(AccountFreshness.account_id.in_(chunk)))
+    return moved
+
+
+def reconcile_membership(engine, member_ids: Iterable[int], clan_ids: Optional[Iterable[int]] = None) -> Dict[str, Any]:
+    """
+    Compara os membros atuais com Player/garagetank e arquiva quem saiu.
+    Chamado depois de _persist_players (os membros atuais já existem em Player).
+    clan_ids: restringe a esses clãs (sync parcial); None = todos os jogadores.
+    """
+    members: Set[int] = {int(a) for a in member_ids}
+    now = datetime.now(timezone.utc)
+    result = {"departed": 0, "rejoined": 0, "orphans": 0, "archived_rows": 0, "skipped": False}
+    if not members:
+        result["skipped"] = True
+        return result
+
+    scoped = clan_ids is not None
+    scope = [Player.clan_id.in_([int(c) for c in clan_ids])] if scoped else []
+    with Session(engine) as s:
+        active = set(s.exec(select(Player.account_id).where(active_player_clause(), *scope)).all())
+        inactive = set(s.exec(select(Player.account_id).where(Player.active == False, *scope)).all())  # noqa: E712
+        garage_accounts = set(s.exec(select(GarageTank.account_id).distinct()).all())
+
+        departed = sorted(active - members)
+        # sync parcial: conta fora do escopo não é órfã
+        orphans = [] if scoped else sorted(garage_accounts - active - inactive - members)
+        rejoined = sorted(inactive & members)
+
+        if active and len(departed) > ROSTER_MAX_DEPARTED_FRACTION * len(active):
+            logger.warning(
+                "Reconciliação ignorada: %d de %d jogadores ativos sumiram da lista de membros "
+                "(> ROSTER_MAX_DEPARTED_FRACTION=%.2f); resposta parcial da API?",
+                len(departed), len(active), ROSTER_MAX_DEPARTED_FRACTION,
+            )
+            result["skipped"] = True
+            return result
+
+        # garagem de inativo (refresh antigo, sync interrompido) também sai da tabela quente
+        stale = sorted((garage_accounts & inactive) - members)
+        to_archive = sorted(set(departed) | set(orphans) | set(stale))
+        try:
+            if to_archive:
+                result["archived_rows"] = _archive_accounts(s, to_archive, now)
+            for chunk in _chunks(departed):
+                s.exec(update(Player).where(Player.account_id.in_(chunk)).values(active=False, left_at=now))
+            for chunk in _chunks(rejoined):
+                s.exec(update(Player).where(Player.account_id.in_(chunk)).values(active=True, left_at=None))
+                s.exec(delete(GarageTankArchive).where(GarageTankArchive.account_id.in_(chunk)))
+            # membros com active NULL (coluna recém-criada) viram True explícito
+            s.exec(update(Player).where(Player.active.is_(None)).values(active=True))
+            s.commit()
+        except Exception:
+            s.rollback()
+            logger.exception("Falha na reconciliação do roster")
+            raise
+
+    result.update(departed=len(departed), rejoined=len(rejoined), orphans=len(orphans))
+    if departed or rejoined or orphans or stale:
+        logger.info(
+            "Roster: %d saíram, %d voltaram, %d contas órfãs; %d linhas de garagem arquivadas",
+            len(departed), len(rejoined), len(orphans), result["archived_rows"],
+        )
+    return result
+
+
+def purge_archived(engine, force: bool = False) -> Dict[str, int]:
+    """Apaga arquivo, Player inativo e histórico de quem saiu há mais de ROSTER_RETENTION_DAYS."""
+    global _last_purge_ts
+    now_ts = int(time.time())
+    if not force and now_ts - _last_purge_ts < ROSTER_PURGE_INTERVAL:
+        return {}
+    _last_purge_ts = now_ts
+    cutoff = datetime.now(timezone.utc) - timedelta(days=ROSTER_RETENTION_DAYS)
+    out = {"archive_rows": 0, "players": 0}
+    try:
+        with Session(engine) as s:
+            res = s.exec(delete(GarageTankArchive).where(GarageTankArchive.archived_at < cutoff))
+            out["archive_rows"] = max(0, res.rowcount or 0)
+            gone = list(s.exec(
+                select(Player.account_id).where(Player.active == False, Player.left_at < cutoff)  # noqa: E712
+            ).all())
+            for chunk in _chunks(gone):
+                for model in (TankStatsDelta, TankStatsDaily, TankStatsWeekly):
+                    s.exec(delete(model).where(model.account_id.in_(chunk)))
+                s.exec(delete(Player).where(Player.account_id.in_(chunk)))
+            out["players"] = len(gone)
+            s.commit()
+        if out["archive_rows"] or out["players"]:
+            logger.info("Roster podado: %d linhas arquivadas, %d jogadores", out["archive_rows"], out["players"])
+    except Exception:
+        logger.exception("Falha ao podar arquivo do roster")
+    return out
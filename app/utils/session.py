@@ -0,0 +1,222 @@
+# app/utils/session.py
+"""
+Sessões assinadas (HMAC-SHA256) + cache de principals em memória.
+
+O cookie `session` carrega username e user id assinados com SECRET_KEY. O
+principal (role, account_id) vem do banco no cache miss — no máximo uma
+consulta por usuário a cada PRINCIPAL_CACHE_TTL —, então role alterada ou
+usuário apagado valem em todos os processos, inclusive depois de restart.
+Mudanças de role (ex.: /admin/promote) chamam `invalidate_principal()` para
+valer na hora neste processo.
+
+Sem SECRET_KEY (ou com o valor de exemplo) uma chave aleatória é gerada e
+guardada em data/secret_key: o valor padrão permitiria forjar sessões.
+"""
+
+import os
+import time
+import hmac
+import json
+import base64
+import hashlib
+import secrets
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional, Dict
+
+from fastapi import Request, HTTPException
+
+from app.utils.request_timing import timed
+
+logger = logging.getLogger("wotcs.session")
+
+_DEFAULT_SECRET_KEYS = ("", "change-me-to-a-strong-secret", "troque-por-uma-chave-segura")
+SECRET_KEY_PATH = Path(os.getenv("SECRET_KEY_PATH", "data/secret_key"))
+
+
+def _load_secret_key() -> str:
+    key = os.getenv("SECRET_KEY", "")
+    if key not in _DEFAULT_SECRET_KEYS:
+        return key
+    try:
+        if SECRET_KEY_PATH.exists():
+            stored = SECRET_KEY_PATH.read_text(encoding="utf-8").strip()
+            if stored:
+                return stored
+        SECRET_KEY_PATH.parent.mkdir(parents=True, exist_ok=True)
+        key = secrets.token_urlsafe(48)
+        try:
+            # O_EXCL: workers subindo juntos não geram chaves diferentes
+            fd = os.open(SECRET_KEY_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            for _ in range(50):
+                stored = SECRET_KEY_PATH.read_text(encoding="utf-8").strip()
+                if stored:
+                    return stored
+                time.sleep(0.01)
+            raise OSError(f"{SECRET_KEY_PATH} vazio")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(key)
+        logger.warning("SECRET_KEY não definida: chave aleatória gerada em %s", SECRET_KEY_PATH)
+        return key
+    except OSError:
+        logger.error(
+            "SECRET_KEY não definida e %s não pôde ser gravado: chave só deste processo "
+            "(sessões caem no restart e não valem entre workers). Defina SECRET_KEY.",
+            SECRET_KEY_PATH,
+        )
+        return secrets.token_urlsafe(48)
+
+
+SECRET_KEY = _load_secret_key()
+SESSION_COOKIE = "session"
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(60 * 60 * 24 * 7)))  # 7 dias
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", "512"))
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "300"))  # segundos
+
+
+@dataclass(frozen=True)
+class Principal:
+    """Usuário autenticado (mesmos atributos de User usados pelas rotas/templates)."""
+    id: Optional[int]
+    username: str
+    role: str
+    account_id: Optional[int] = None
+
+
+# -------------------------
+# Token helpers
+# -------------------------
+def _b64e(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def _b64d(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(payload: str) -> str:
+    return _b64e(hmac.new(SECRET_KEY.encode("utf-8"), payload.encode("ascii"), hashlib.sha256).digest())
+
+
+def issue_token(user) -> str:
+    """Gera `payload.assinatura` para um User (ou Principal)."""
+    now = int(time.time())
+    claims = {
+        "uid": getattr(user, "id", None),
+        "sub": user.username,
+        "role": getattr(user, "role", None) or "member",
+        "acc": getattr(user, "account_id", None),
+        "iat": now,
+        "exp": now + SESSION_TTL,
+    }
+    payload = _b64e(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+    return f"{payload}.{_sign(payload)}"
+
+
+def decode_token(token: str) -> Optional[Dict]:
+    """Retorna as claims se a assinatura e a validade conferem; senão None."""
+    try:
+        payload, sig = token.split(".", 1)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(sig, _sign(payload)):
+        return None
+    try:
+        claims = json.loads(_b64d(payload))
+    except Exception:
+        return None
+    if int(claims.get("exp", 0)) < int(time.time()):
+        return None
+    return claims
+
+
+# -------------------------
+# Principal cache (LRU + TTL)
+# -------------------------
+class PrincipalCache:
+    def __init__(self, maxsize: int = PRINCIPAL_CACHE_SIZE, ttl: int = PRINCIPAL_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def get(self, username: str) -> Optional[Principal]:
+        with self._lock:
+            item = self._data.get(username)
+            if not item:
+                return None
+            principal, expires = item
+            if expires < time.monotonic():
+                del self._data[username]
+                return None
+            self._data.move_to_end(username)
+            return principal
+
+    def put(self, principal: Principal) -> None:
+        with self._lock:
+            self._data[principal.username] = (principal, time.monotonic() + self.ttl)
+            self._data.move_to_end(principal.username)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, username: str) -> None:
+        with self._lock:
+            self._data.pop(username, None)
+
+
+PRINCIPAL_CACHE = PrincipalCache()
+
+
+def invalidate_principal(username: str) -> None:
+    """Chamar sempre que role/account_id de um usuário mudar."""
+    PRINCIPAL_CACHE.invalidate(username)
+
+
+def _load_principal_from_db(username: str) -> Optional[Principal]:
+    # import tardio: manter app.utils leve e sem dependência de engine no import
+    from sqlmodel import Session, select
+    from app.db import engine
+    from app.models import User
+
+    with Session(engine) as s:
+        user = s.exec(select(User).where(User.username == username)).first()
+        if not user:
+            return None
+        return Principal(id=user.id, username=user.username, role=user.role, account_id=user.account_id)
+
+
+def principal_from_token(token: Optional[str]) -> Optional[Principal]:
+    if not token:
+        return None
+    claims = decode_token(token)
+    if not claims or not claims.get("sub"):
+        return None
+    username = claims["sub"]
+
+    principal = PRINCIPAL_CACHE.get(username)
+    if principal is None:
+        # role/account_id atuais (e se o usuário ainda existe) vêm do banco
+        principal = _load_principal_from_db(username)
+        if principal is None:
+            return None
+        PRINCIPAL_CACHE.put(principal)
+    # username apagado e recriado: token do usuário antigo não vale
+    if claims.get("uid") is not None and claims["uid"] != principal.id:
+        return None
+    return principal
+
+
+def get_current_user_from_cookie(request: Request) -> Principal:
+    """Dependência FastAPI: valida o cookie de sessão (banco só no cache miss)."""
+    token = request.cookies.get(SESSION_COOKIE)
+    if not token:
+        raise HTTPException(status_code=401, detail="Não autenticado")
+    with timed("auth"):
+        principal = principal_from_token(token)
+    if principal is None:
+        raise HTTPException(status_code=401, detail="Sessão inválida ou expirada")
+    return principal
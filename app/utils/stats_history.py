@@ -0,0 +1,178 @@
+# app/utils/stats_history.py
+"""
+Histórico de estatísticas por tank, em deltas.
+
+O sync regrava `garagetank` com os contadores atuais; antes disso lemos os
+contadores anteriores da conta e, para cada tank cujo battles/wins/marca
+mudou, gravamos UMA linha compacta em `tankstats_delta` e somamos a variação
+nos rollups diário e semanal. Consultas de "últimos N dias" leem só os
+rollups — nunca o histórico bruto.
+
+Retenção (env): deltas brutos por HISTORY_RAW_RETENTION_DAYS (poda por mês
+inteiro), diário por HISTORY_DAILY_RETENTION_DAYS; semanal fica.
+"""
+
+import os
+import time
+import logging
+from datetime import datetime, date, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import func, and_, delete
+from sqlmodel import Session, select
+
+from app.models import GarageTank, TankStatsDelta, TankStatsDaily, TankStatsWeekly
+
+logger = logging.getLogger("wotcs.history")
+
+HISTORY_RAW_RETENTION_DAYS = int(os.getenv("HISTORY_RAW_RETENTION_DAYS", "90"))
+HISTORY_DAILY_RETENTION_DAYS = int(os.getenv("HISTORY_DAILY_RETENTION_DAYS", "400"))
+HISTORY_PRUNE_INTERVAL = int(os.getenv("HISTORY_PRUNE_INTERVAL", str(6 * 3600)))  # segundos
+
+Counters = Tuple[int, int, Optional[int]]  # (battles, wins, mark_of_mastery)
+
+_last_prune_ts = 0
+
+
+def _month_key(d: date) -> int:
+    return d.year * 100 + d.month
+
+
+def _week_start(d: date) -> date:
+    return d - timedelta(days=d.weekday())
+
+
+def load_previous_counters(s: Session, account_id: int) -> Dict[int, Counters]:
+    """Contadores atuais gravados em garagetank para a conta (antes de regravar)."""
+    rows = s.exec(
+        select(GarageTank.tank_id, GarageTank.battles, GarageTank.wins, GarageTank.mark_of_mastery)
+        .where(GarageTank.account_id == account_id)
+    ).all()
+    return {int(tid): (int(b or 0), int(w or 0), m) for tid, b, w, m in rows}
+
+
+def record_account_deltas(
+    s: Session,
+    account_id: int,
+    previous: Dict[int, Counters],
+    current: Dict[int, Counters],
+    now: Optional[datetime] = None,
+) -> int:
+    """
+    Adiciona na sessão (sem commit) os deltas da conta e atualiza os rollups.
+    Conta sem histórico anterior (primeiro sync) só vira baseline: nada é gravado.
+    O mesmo vale para um tank ausente do sync anterior (recomprado — a WG mantém
+    os contadores antigos — ou linha que não foi gravada): a vida inteira dele
+    não é atividade de agora.
+    Retorna o número de deltas gravados.
+    """
+    if not previous:
+        return 0
+    now = now or datetime.now(timezone.utc)
+    today = now.date()
+    week = _week_start(today)
+
+    deltas: List[TankStatsDelta] = []
+    for tid, (battles, wins, mark) in current.items():
+        if tid not in previous:
+            continue  # baseline; o delta começa no próximo sync
+        prev_b, prev_w, prev_m = previous[tid]
+        d_b, d_w = battles - prev_b, wins - prev_w
+        if d_b == 0 and d_w == 0 and (mark == prev_m or mark is None):
+            continue
+        if d_b < 0 or d_w < 0:
+            # contador voltou (API devolveu dado parcial?) — não é atividade
+            d_b, d_w = max(0, d_b), max(0, d_w)
+        deltas.append(TankStatsDelta(
+            month=_month_key(today), account_id=account_id, tank_id=tid, ts=now,
+            battles=battles, wins=wins, d_battles=d_b, d_wins=d_w, mark_of_mastery=mark,
+        ))
+    if not deltas:
+        return 0
+    s.add_all(deltas)
+
+    active = [d for d in deltas if d.d_battles or d.d_wins]
+    if active:
+        tids = [d.tank_id for d in active]
+        daily = {r.tank_id: r for r in s.exec(select(TankStatsDaily).where(
+            TankStatsDaily.day == today, TankStatsDaily.account_id == account_id,
+            TankStatsDaily.tank_id.in_(tids))).all()}
+        weekly = {r.tank_id: r for r in s.exec(select(TankStatsWeekly).where(
+            TankStatsWeekly.week_start == week, TankStatsWeekly.account_id == account_id,
+            TankStatsWeekly.tank_id.in_(tids))).all()}
+        for d in active:
+            drow = daily.get(d.tank_id) or TankStatsDaily(day=today, account_id=account_id, tank_id=d.tank_id)
+            drow.battles = (drow.battles or 0) + d.d_battles
+            drow.wins = (drow.wins or 0) + d.d_wins
+            s.add(drow)
+            wrow = weekly.get(d.tank_id) or TankStatsWeekly(week_start=week, account_id=account_id, tank_id=d.tank_id)
+            wrow.battles = (wrow.battles or 0) + d.d_battles
+            wrow.wins = (wrow.wins or 0) + d.d_wins
+            s.add(wrow)
+    return len(deltas)
+
+
+def prune_history(engine, force: bool = False) -> None:
+    """Remove meses inteiros de deltas e dias de rollup fora da retenção."""
+    global _last_prune_ts
+    now_ts = int(time.time())
+    if not force and now_ts - _last_prune_ts < HISTORY_PRUNE_INTERVAL:
+        return
+    _last_prune_ts = now_ts
+    today = datetime.now(timezone.utc).date()
+    raw_cutoff = _month_key(today - timedelta(days=HISTORY_RAW_RETENTION_DAYS))
+    daily_cutoff = today - timedelta(days=HISTORY_DAILY_RETENTION_DAYS)
+    try:
+        with Session(engine) as s:
+            r1 = s.exec(delete(TankStatsDelta).where(TankStatsDelta.month < raw_cutoff))
+            r2 = s.exec(delete(TankStatsDaily).where(TankStatsDaily.day < daily_cutoff))
+            s.commit()
+            logger.info("Histórico podado: %s deltas, %s linhas diárias", r1.rowcount, r2.rowcount)
+    except Exception:
+        logger.exception("Falha ao podar histórico de estatísticas")
+
+
+def activity_last_days(
+    engine,
+    days: int,
+    account_ids: Optional[Iterable[int]] = None,
+    tank_id: Optional[int] = None,
+    group_by: str = "account",
+) -> List[Dict]:
+    """
+    Batalhas/vitórias nos últimos N dias agrupadas por conta ou por tank.
+    Até HISTORY_DAILY_RETENTION_DAYS usa o rollup diário; além disso, o semanal.
+    """
+    days = max(1, int(days))
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+    if days <= HISTORY_DAILY_RETENTION_DAYS:
+        table, period_col, start = TankStatsDaily, TankStatsDaily.day, since
+    else:
+        table, period_col, start = TankStatsWeekly, TankStatsWeekly.week_start, _week_start(since)
+
+    key_col = table.tank_id if group_by == "tank" else table.account_id
+    conds = [period_col >= start]
+    if account_ids is not None:
+        conds.append(table.account_id.in_(list(account_ids)))
+    if tank_id is not None:
+        conds.append(table.tank_id == tank_id)
+
+    q = (
+        select(key_col, func.sum(table.battles), func.sum(table.wins))
+        .where(and_(*conds))
+        .group_by(key_col)
+        .order_by(func.sum(table.battles).desc())
+    )
+    key_name = "tank_id" if group_by == "tank" else "account_id"
+    with Session(engine) as s:
+        rows = s.exec(q).all()
+    out = []
+    for key, battles, wins in rows:
+        battles, wins = int(battles or 0), int(wins or 0)
+        out.append({
+            key_name: int(key),
+            "battles": battles,
+            "wins": wins,
+            "win_pct": round(wins / battles * 100.0, 2) if battles else 0.0,
+        })
+    return out
@@ -0,0 +1,129 @@
+# app/utils/sync_progress.py
+"""
+Progresso do sync em memória, publicado por SSE (/sync/events).
+
+O sync chama `SYNC_PROGRESS.begin/update/advance/finish`; cada mudança
+acorda os assinantes (um asyncio.Event por conexão), que enviam o snapshot
+atual. Sem polling: a página só recebe algo quando o estado muda.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, Optional, Set
+
+from app.utils.wg_api import call_counts
+
+logger = logging.getLogger("wotcs.progress")
+
+
+def _total_calls() -> int:
+    return sum(call_counts().values())
+
+
+class SyncProgress:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Set[asyncio.Event] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._calls_base = 0
+        self._state: Dict[str, Any] = self._idle_state()
+
+    @staticmethod
+    def _idle_state() -> Dict[str, Any]:
+        return {
+            "version": 0,
+            "running": False,
+            "job": None,
+            "phase": "idle",
+            "accounts_done": 0,
+            "accounts_total": 0,
+            "rows_written": 0,
+            "api_calls": 0,
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+        }
+
+    # -------------------------
+    # escrita (sync)
+    # -------------------------
+    def _publish(self, **fields: Any) -> None:
+        with self._lock:
+            self._state.update(fields)
+            if self._state["running"]:
+                self._state["api_calls"] = _total_calls() - self._calls_base
+            self._state["version"] += 1
+            subs, loop = list(self._subscribers), self._loop
+        self._wake(subs, loop)
+
+    @staticmethod
+    def _wake(subs, loop) -> None:
+        for ev in subs:
+            if loop is not None:
+                try:
+                    loop.call_soon_threadsafe(ev.set)
+                except RuntimeError:
+                    pass
+
+    def begin(self, job: str, accounts_total: int = 0) -> None:
+        self._calls_base = _total_calls()
+        self._publish(
+            running=True, job=job, phase="starting", accounts_done=0,
+            accounts_total=accounts_total, rows_written=0, api_calls=0,
+            started_at=time.time(), finished_at=None, error=None,
+        )
+
+    def update(self, **fields: Any) -> None:
+        self._publish(**fields)
+
+    def advance(self, accounts: int = 0, rows: int = 0, **fields: Any) -> None:
+        with self._lock:
+            done = self._state["accounts_done"] + accounts
+            written = self._state["rows_written"] + rows
+        self._publish(accounts_done=done, rows_written=written, **fields)
+
+    def finish(self, error: Optional[str] = None) -> None:
+        self._publish(running=False, phase="error" if error else "done", finished_at=time.time(), error=error)
+
+    def mirror(self, state: Dict[str, Any]) -> None:
+        """Web com worker separado: adota o snapshot publicado pelo worker (via banco)."""
+        with self._lock:
+            version = self._state["version"] + 1
+            self._state = {k: state.get(k, v) for k, v in self._idle_state().items()}
+            self._state["version"] = version
+            subs, loop = list(self._subscribers), self._loop
+        self._wake(subs, loop)
+
+    # -------------------------
+    # leitura (SSE / status)
+    # -------------------------
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            st = dict(self._state)
+        started = st.get("started_at")
+        st["elapsed"] = round((st.get("finished_at") or time.time()) - started, 1) if started else None
+        st["eta"] = None
+        done, total = st["accounts_done"], st["accounts_total"]
+        if st["running"] and started and 0 < done < total:
+            st["eta"] = round((time.time() - started) / done * (total - done), 1)
+        return st
+
+    def subscribe(self) -> asyncio.Event:
+        ev = asyncio.Event()
+        with self._lock:
+            self._loop = asyncio.get_running_loop()
+            self._subscribers.add(ev)
+        return ev
+
+    def unsubscribe(self, ev: asyncio.Event) -> None:
+        with self._lock:
+            self._subscribers.discard(ev)
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+
+SYNC_PROGRESS = SyncProgress()
@@ -0,0 +1,205 @@
+# app/utils/sync_queue.py
+"""
+Fila de jobs de sync com prioridade.
+
+- um único worker (no event loop do app) executa os jobs em ordem de
+  prioridade: refresh de uma conta (PRIORITY_ACCOUNT) passa na frente do
+  sync completo (PRIORITY_FULL: todos os clãs, um clã — "clan:<id>" — ou
+  uma fatia do sync contínuo, "slice");
+- pedidos repetidos para a mesma chave ("full", "slice", "clan:<id>", "account:<id>") enquanto o
+  job está na fila ou rodando viram um só;
+- cada chave tem cooldown próprio depois de terminar;
+- o sync completo chama `pop_priority()` entre lotes de contas para atender
+  refreshes pendentes sem esperar a volta inteira;
+- o handler pode devolver o resultado (`(status, detalhe)`: ran, skipped ou
+  error), repassado a `on_done`; sem retorno e sem exceção vale "ran".
+
+`submit()` pode ser chamado de rotas síncronas (threadpool): a estrutura é
+protegida por lock e o worker é acordado com call_soon_threadsafe.
+"""
+
+import time
+import heapq
+import asyncio
+import logging
+import threading
+from itertools import count
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+# (status, detalhe): ran | skipped (ex.: sync já rodando) | error
+JobOutcome = Tuple[str, Optional[str]]
+Handler = Callable[["SyncJob"], Awaitable[Optional[JobOutcome]]]
+
+logger = logging.getLogger("wotcs.syncqueue")
+
+PRIORITY_ACCOUNT = 0
+PRIORITY_FULL = 10
+
+
+class SyncJob:
+    __slots__ = ("key", "kind", "account_id", "clan_id", "priority", "created_at", "started_at")
+
+    def __init__(self, kind: str, account_id: Optional[int], priority: int, clan_id: Optional[int] = None):
+        self.kind = kind
+        self.account_id = account_id
+        self.clan_id = clan_id
+        if kind in ("full", "slice"):
+            self.key = kind
+        elif kind == "clan":
+            self.key = f"clan:{clan_id}"
+        else:
+            self.key = f"account:{account_id}"
+        self.priority = priority
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+
+    def as_dict(self) -> Dict:
+        return {
+            "key": self.key,
+            "kind": self.kind,
+            "account_id": self.account_id,
+            "clan_id": self.clan_id,
+            "priority": self.priority,
+            "created_at": int(self.created_at),
+            "started_at": int(self.started_at) if self.started_at else None,
+        }
+
+
+class SyncQueue:
+    def __init__(self, full_cooldown: int, account_cooldown: int, slice_cooldown: int = 0):
+        self.cooldowns = {
+            "full": full_cooldown,
+            "clan": full_cooldown,
+            "slice": slice_cooldown,
+            "account": account_cooldown,
+        }
+        self._lock = threading.Lock()
+        self._heap: List[Tuple[int, int, SyncJob]] = []
+        self._pending: Dict[str, SyncJob] = {}
+        self._last_done: Dict[str, float] = {}
+        self._seq = count()
+        self._active: List[SyncJob] = []  # pilha: o sync completo + refresh atendido dentro dele
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # chamado ao fim de cada job (job, status, detalhe): o worker separado marca sync_job
+        self.on_done: Optional[Callable[[SyncJob, str, Optional[str]], None]] = None
+
+    # -------------------------
+    # produtor
+    # -------------------------
+    def submit(self, kind: str, account_id: Optional[int] = None, clan_id: Optional[int] = None) -> Dict:
+        """
+        Enfileira um job. Retorna {"status": queued|duplicate|cooldown, ...}.
+        """
+        priority = PRIORITY_ACCOUNT if kind == "account" else PRIORITY_FULL
+        job = SyncJob(kind, account_id, priority, clan_id)
+        now = time.time()
+        with self._lock:
+            if job.key in self._pending or any(a.key == job.key for a in self._active):
+                return {"status": "duplicate", "job": job.key}
+            retry_after = self._last_done.get(job.key, 0) + self.cooldowns[kind] - now
+            if retry_after > 0:
+                return {"status": "cooldown", "job": job.key, "retry_after": int(retry_after) + 1}
+            self._pending[job.key] = job
+            heapq.heappush(self._heap, (priority, next(self._seq), job))
+            position = sum(1 for p, _s, _j in self._heap if p <= priority)
+        self._notify()
+        logger.info("Job de sync enfileirado: %s (prioridade %d)", job.key, priority)
+        return {"status": "queued", "job": job.key, "position": position}
+
+    def _notify(self) -> None:
+        loop, ev = self._loop, self._wakeup
+        if loop is None or ev is None:
+            return
+        try:
+            loop.call_soon_threadsafe(ev.set)
+        except RuntimeError:
+            pass  # loop encerrado
+
+    # -------------------------
+    # consumidor
+    # -------------------------
+    def _pop(self, max_priority: Optional[int] = None) -> Optional[SyncJob]:
+        with self._lock:
+            if not self._heap:
+                return None
+            if max_priority is not None and self._heap[0][0] > max_priority:
+                return None
+            _p, _s, job = heapq.heappop(self._heap)
+            self._pending.pop(job.key, None)
+            return job
+
+    def pop_priority(self) -> Optional[SyncJob]:
+        """Próximo job mais prioritário que o sync completo, se houver."""
+        return self._pop(max_priority=PRIORITY_FULL - 1)
+
+    def has_priority_pending(self) -> bool:
+        with self._lock:
+            return bool(self._heap) and self._heap[0][0] < PRIORITY_FULL
+
+    @property
+    def running(self) -> Optional[SyncJob]:
+        return self._active[-1] if self._active else None
+
+    @property
+    def busy(self) -> bool:
+        return bool(self._active)
+
+    async def run_job(self, job: SyncJob, handler: Handler) -> None:
+        job.started_at = time.time()
+        with self._lock:
+            self._active.append(job)
+        status, detail = "ran", None
+        try:
+            outcome = await handler(job)
+            if outcome is not None:
+                status, detail = outcome
+        except Exception as exc:
+            logger.exception("Job de sync falhou: %s", job.key)
+            status, detail = "error", str(exc) or type(exc).__name__
+        finally:
+            with self._lock:
+                self._active.remove(job)
+                self._last_done[job.key] = time.time()
+            logger.info("Job de sync concluído: %s (%s, %.1fs)", job.key, status, time.time() - job.started_at)
+            if self.on_done is not None:
+                try:
+                    self.on_done(job, status, detail)
+                except Exception:
+                    logger.exception("Falha no callback de fim do job %s", job.key)
+
+    async def _worker(self, handler: Handler) -> None:
+        while True:
+            job = self._pop()
+            if job is None:
+                self._wakeup.clear()
+                # re-checa depois do clear: submit pode ter chegado entre o pop e o clear
+                job = self._pop()
+                if job is None:
+                    await self._wakeup.wait()
+                    continue
+            await self.run_job(job, handler)
+
+    def start(self, handler: Handler) -> None:
+        """Inicia o worker no event loop corrente (startup do app)."""
+        if self._task is not None and not self._task.done():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._task = self._loop.create_task(self._worker(handler))
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            queued = [j.as_dict() for _p, _s, j in sorted(self._heap, key=lambda e: (e[0], e[1]))]
+            active = [j.as_dict() for j in self._active]
+        return {"running": active, "queued": queued}
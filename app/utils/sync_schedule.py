@@ -0,0 +1,120 @@
+# app/utils/sync_schedule.py
+"""
+Política do sync contínuo (SYNC_MODE=rolling).
+
+Em vez de um sync completo a cada 20 minutos (rajada na API e no banco,
+depois nada), o scheduler roda um passo a cada ROLLING_TICK_SECONDS e
+sincroniza no máximo ROLLING_SLICE_SIZE contas: a taxa de requisições e
+a carga de escrita ficam planas.
+
+Quem entra na fatia: as contas mais atrasadas em relação ao próprio
+intervalo, que depende do last_battle_time (/wot/account/info/, guardado
+em Player.last_battle_at) e do último sync (AccountFreshness.synced_at):
+
+- nunca sincronizada: imediatamente;
+- jogou depois do último sync: ROLLING_MIN_INTERVAL, dobrando a cada
+  ROLLING_DECAY_HOURS desde a última batalha (até ROLLING_MAX_INTERVAL);
+- não jogou desde o último sync: nada mudou, ROLLING_MAX_INTERVAL;
+- sem last_battle_time: SYNC_FULL_INTERVAL (o mesmo frescor do modo full).
+
+Os dados de uma fatia vão para o banco na hora, mas a geração do sync
+(chave dos caches de fragmentos e dos ETags) só avança quando a volta do
+roster roda ou a cada ROLLING_PUBLISH_INTERVAL: com um bump por passo o
+cache do dashboard quase nunca acertaria.
+
+SYNC_MODE=full mantém o comportamento antigo (sync completo periódico).
+"""
+
+import os
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, update
+from sqlmodel import Session, select
+
+from app.models import Player, AccountFreshness
+from app.utils.roster import active_player_clause
+
+logger = logging.getLogger("wotcs.schedule")
+
+SYNC_MODE = os.getenv("SYNC_MODE", "rolling").strip().lower()
+if SYNC_MODE not in ("rolling", "full"):
+    logger.warning("SYNC_MODE inválido (%r); usando rolling", SYNC_MODE)
+    SYNC_MODE = "rolling"
+
+SYNC_FULL_INTERVAL = int(os.getenv("SYNC_FULL_INTERVAL", str(20 * 60)))  # segundos
+ROLLING_TICK_SECONDS = int(os.getenv("ROLLING_TICK_SECONDS", "30"))
+ROLLING_SLICE_SIZE = int(os.getenv("ROLLING_SLICE_SIZE", "10"))  # contas por passo
+ROLLING_MIN_INTERVAL = int(os.getenv("ROLLING_MIN_INTERVAL", str(10 * 60)))
+ROLLING_MAX_INTERVAL = int(os.getenv("ROLLING_MAX_INTERVAL", str(24 * 3600)))
+ROLLING_DECAY_HOURS = float(os.getenv("ROLLING_DECAY_HOURS", "6"))
+ROLLING_ROSTER_INTERVAL = int(os.getenv("ROLLING_ROSTER_INTERVAL", str(20 * 60)))  # membros + reconciliação
+ROLLING_ROSTER_RETRY = int(os.getenv("ROLLING_ROSTER_RETRY", "120"))  # nova tentativa após falha do roster
+ROLLING_ACTIVITY_INTERVAL = int(os.getenv("ROLLING_ACTIVITY_INTERVAL", str(5 * 60)))  # last_battle_time
+# fatias não invalidam os caches (geração) a cada passo: no máximo uma vez por este intervalo
+# ou por volta do roster; até lá o dashboard pode servir fragmentos/ETags de até N segundos atrás
+ROLLING_PUBLISH_INTERVAL = int(os.getenv("ROLLING_PUBLISH_INTERVAL", str(5 * 60)))
+
+
+def _ts(dt: Optional[datetime]) -> Optional[float]:
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)  # SQLite devolve datetime sem tz
+    return dt.timestamp()
+
+
+def sync_interval(last_battle_ts: Optional[float], synced_ts: Optional[float], now: float) -> float:
+    """Intervalo (s) entre syncs de uma conta, pela regra do docstring do módulo."""
+    if last_battle_ts is None:
+        return float(SYNC_FULL_INTERVAL)
+    if synced_ts is not None and last_battle_ts <= synced_ts:
+        return float(ROLLING_MAX_INTERVAL)
+    idle_hours = max(0.0, now - last_battle_ts) / 3600.0
+    # expoente limitado: 2**60 segundos já passa de qualquer teto
+    factor = 2.0 ** min(60.0, idle_hours / max(ROLLING_DECAY_HOURS, 1e-6))
+    return float(min(ROLLING_MAX_INTERVAL, ROLLING_MIN_INTERVAL * factor))
+
+
+def pick_due(engine, limit: int, now: float) -> Tuple[List[Tuple[int, Optional[int]]], int]:
+    """
+    Contas vencidas, das mais atrasadas (em múltiplos do próprio intervalo)
+    para as menos. Retorna ([(account_id, clan_id), ...] até `limit`, total vencido).
+    """
+    with Session(engine) as s:
+        rows = s.exec(
+            select(Player.account_id, Player.clan_id, Player.last_battle_at, AccountFreshness.synced_at)
+            .join(AccountFreshness, AccountFreshness.account_id == Player.account_id, isouter=True)
+            .where(active_player_clause())
+        ).all()
+
+    due: List[Tuple[float, int, Optional[int]]] = []
+    for acc, clan_id, last_battle_at, synced_at in rows:
+        synced_ts = _ts(synced_at)
+        if synced_ts is None:
+            due.append((float("inf"), acc, clan_id))
+            continue
+        lateness = (now - synced_ts) / sync_interval(_ts(last_battle_at), synced_ts, now)
+        if lateness >= 1.0:
+            due.append((lateness, acc, clan_id))
+    due.sort(key=lambda d: (-d[0], d[1]))
+    return [(acc, clan_id) for _l, acc, clan_id in due[:limit]], len(due)
+
+
+def record_activity(engine, last_battle: Dict[int, int]) -> int:
+    """Grava last_battle_time (epoch) em Player.last_battle_at; um executemany."""
+    params = [
+        {"acc": int(acc), "lb": datetime.fromtimestamp(int(ts), tz=timezone.utc)}
+        for acc, ts in last_battle.items() if ts
+    ]
+    if not params:
+        return 0
+    stmt = (
+        update(Player.__table__)
+        .where(Player.__table__.c.account_id == bindparam("acc"))
+        .values(last_battle_at=bindparam("lb"))
+    )
+    with engine.begin() as conn:
+        conn.execute(stmt, params)
+    return len(params)
@@ -0,0 +1,33 @@
+# app/utils/sync_state.py
+"""
+Geração do sync: contador incrementado sempre que o sync grava dados novos.
+
+Caches derivados do banco (fragmentos do dashboard, ETags da API) usam a
+geração na chave, então invalidam sozinhos quando um sync termina.
+
+Com o worker separado (SYNC_IN_PROCESS=0) a geração vem do banco
+(sync_worker_state) e o web a adota com set_generation().
+"""
+
+import threading
+import time
+
+_lock = threading.Lock()
+_generation = int(time.time())  # base diferente a cada boot: caches persistidos não colidem
+
+
+def current_generation() -> int:
+    return _generation
+
+
+def bump_generation() -> int:
+    global _generation
+    with _lock:
+        _generation += 1
+        return _generation
+
+
+def set_generation(value: int) -> None:
+    global _generation
+    with _lock:
+        _generation = int(value)
@@ -0,0 +1,124 @@
+# app/utils/table_stats.py
+"""
+Estatísticas de tabelas mantidas pelo sync (tabelas `table_stats` e
+`account_freshness`).
+
+- contagem de linhas de garagetank atualizada incrementalmente a cada conta
+  gravada (inseridas - removidas) e recontada uma vez no fim do sync completo;
+- data do último sync e frescor por conta.
+
+/sync/check e /sync/status leem só essas tabelas pequenas: nada de
+varrer garagetank por requisição.
+"""
+
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy import func
+from sqlmodel import Session, select
+
+from app.models import Player, GarageTank, TableStats, AccountFreshness
+
+logger = logging.getLogger("wotcs.tablestats")
+
+# tabelas acompanhadas -> modelo (recount exato)
+TRACKED_TABLES = {
+    "garagetank": GarageTank,
+    "player": Player,
+}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _iso(dt: Optional[datetime]) -> Optional[str]:
+    if dt is None:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)  # SQLite devolve datetime sem tz
+    return dt.isoformat()
+
+
+def _row(s: Session, table_name: str) -> TableStats:
+    row = s.get(TableStats, table_name)
+    if row is None:
+        row = TableStats(table_name=table_name, row_count=0)
+    return row
+
+
+def record_account_sync(s: Session, account_id: int, deleted: int, inserted: int, now: Optional[datetime] = None) -> None:
+    """Na sessão do sync (sem commit): ajusta a contagem e o frescor da conta."""
+    now = now or _now()
+    stats = _row(s, "garagetank")
+    stats.row_count = max(0, (stats.row_count or 0) + inserted - max(0, deleted))
+    stats.last_sync_at = now
+    stats.updated_at = now
+    s.add(stats)
+
+    fresh = s.get(AccountFreshness, account_id)
+    if fresh is None:
+        fresh = AccountFreshness(account_id=account_id, synced_at=now, tank_rows=inserted)
+    else:
+        fresh.synced_at = now
+        fresh.tank_rows = inserted
+    s.add(fresh)
+
+
+def recount(engine, tables: Optional[Iterable[str]] = None, mark_sync: bool = False) -> Dict[str, int]:
+    """Contagem exata (COUNT(*)) — só no fim do sync ou quando ainda não há estatística."""
+    out = {}
+    now = _now()
+    with Session(engine) as s:
+        for name in tables or TRACKED_TABLES:
+            model = TRACKED_TABLES[name]
+            n = int(s.exec(select(func.count()).select_from(model)).one())
+            row = _row(s, name)
+            row.row_count = n
+            row.updated_at = now
+            if mark_sync:
+                row.last_sync_at = now
+            s.add(row)
+            out[name] = n
+        s.commit()
+    return out
+
+
+def get_table_stats(engine) -> Dict[str, Dict[str, Any]]:
+    """Lê table_stats; se uma tabela acompanhada ainda não tem linha, faz o recount uma vez."""
+    with Session(engine) as s:
+        rows = {r.table_name: r for r in s.exec(select(TableStats)).all()}
+    missing = [t for t in TRACKED_TABLES if t not in rows]
+    if missing:
+        try:
+            recount(engine, missing)
+        except Exception:
+            logger.exception("Falha ao inicializar table_stats")
+        with Session(engine) as s:
+            rows = {r.table_name: r for r in s.exec(select(TableStats)).all()}
+    return {
+        name: {
+            "row_count": r.row_count,
+            "last_sync_at": _iso(r.last_sync_at),
+            "updated_at": _iso(r.updated_at),
+        }
+        for name, r in rows.items()
+    }
+
+
+def freshness_summary(engine) -> Dict[str, Any]:
+    """Quantas contas têm dados e o intervalo de frescor (uma linha agregada)."""
+    with Session(engine) as s:
+        n, oldest, newest = s.exec(
+            select(func.count(), func.min(AccountFreshness.synced_at), func.max(AccountFreshness.synced_at))
+        ).one()
+    return {"accounts": int(n or 0), "oldest_synced_at": _iso(oldest), "newest_synced_at": _iso(newest)}
+
+
+def account_freshness(engine, account_id: int) -> Optional[Dict[str, Any]]:
+    with Session(engine) as s:
+        row = s.get(AccountFreshness, account_id)
+    if row is None:
+        return None
+    return {"account_id": row.account_id, "synced_at": _iso(row.synced_at), "tank_rows": row.tank_rows}
@@ -0,0 +1,223 @@
+# app/utils/wg_api.py
+"""
+Chamadas à API pública da Wargaming.
+
+- monta a URL (realm + application_id) e serializa listas como "a,b,c";
+- trata {"status": "error"} como exceção (WGApiError) em vez de devolver data vazio;
+- conta chamadas por endpoint (CALL_COUNTS) para logs/diagnóstico;
+- /wot/tanks/stats/ com projeção `fields=`, em lotes de até 100 tank_ids e
+  concorrência limitada por semáforo;
+- WG_CASSETTE_MODE=record|replay grava / reproduz as respostas
+  (app/utils/cassette.py) — sync e registro rodam offline com dados reais;
+- orçamento de requisições (WG_RATE_LIMIT por segundo, token bucket) por
+  processo: syncs de vários clãs em paralelo e o registro dividem o mesmo
+  balde. Processos diferentes (worker de sync, cada worker do gunicorn,
+  scripts) têm baldes próprios — a soma dos WG_RATE_LIMIT de todos não
+  deve passar do limite do application_id.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+import httpx
+
+from app.utils.metrics import WG_LATENCY, WG_REQUESTS, WG_RATE_WAIT_SECONDS
+from app.utils.cassette import CASSETTE
+
+logger = logging.getLogger("wotcs.wg")
+
+WOT_APP_ID = os.getenv("WOT_APP_ID", "")
+WOT_REALM = os.getenv("WOT_REALM", "https://api.worldoftanks.com")
+
+WG_CONCURRENCY = int(os.getenv("WG_CONCURRENCY", "4"))  # requisições simultâneas por sync
+WG_RATE_LIMIT = float(os.getenv("WG_RATE_LIMIT", "10"))  # requisições/s no processo (0 = sem limite)
+WG_RATE_BURST = max(1, int(os.getenv("WG_RATE_BURST", "10")))
+TANKS_STATS_BATCH = min(100, int(os.getenv("TANKS_STATS_BATCH", "100")))  # limite da API: 100 tank_id
+
+# só o que o banco guarda atravessa a rede
+TANK_STATS_FIELDS = (
+    "tank_id",
+    "mark_of_mastery",
+    "all.battles",
+    "all.wins",
+    "all.damage_dealt",
+    "all.damage_received",
+    "all.frags",
+    "all.spotted",
+    "all.dropped_capture_points",
+    "all.survived_battles",
+    "all.xp",
+)
+
+CALL_COUNTS: Counter = Counter()
+_counts_lock = threading.Lock()
+
+
+class WGApiError(Exception):
+    """Resposta com status != ok (ex.: INVALID_APPLICATION_ID, REQUEST_LIMIT_EXCEEDED)."""
+
+
+class RateLimiter:
+    """
+    Token bucket (na forma GCRA: guarda só o próximo instante teórico livre).
+    reserve() marca a vaga e devolve quanto esperar — quem chama dorme fora
+    do lock (asyncio.sleep no sync, time.sleep no registro/scripts).
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self._tat = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        interval = 1.0 / self.rate
+        with self._lock:
+            now = time.monotonic()
+            tat = max(self._tat, now)
+            self._tat = tat + interval
+            return max(0.0, tat - (self.burst - 1) * interval - now)
+
+    async def acquire(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            WG_RATE_WAIT_SECONDS.inc(wait)
+            await asyncio.sleep(wait)
+
+    def acquire_sync(self) -> None:
+        wait = self.reserve()
+        if wait > 0:
+            WG_RATE_WAIT_SECONDS.inc(wait)
+            time.sleep(wait)
+
+
+RATE_LIMITER = RateLimiter(WG_RATE_LIMIT, WG_RATE_BURST)
+
+
+def _count(path: str) -> None:
+    with _counts_lock:
+        CALL_COUNTS[path] += 1
+
+
+def build_params(**params: Any) -> Dict[str, str]:
+    out = {"application_id": WOT_APP_ID}
+    for k, v in params.items():
+        if v is None:
+            continue
+        if isinstance(v, (list, tuple, set, frozenset)):
+            v = ",".join(str(x) for x in v)
+        out[k] = str(v)
+    return out
+
+
+def _data(path: str, js: Dict[str, Any]) -> Any:
+    if js.get("status") != "ok":
+        err = js.get("error") or {}
+        raise WGApiError(f"{path}: {err.get('message') or js.get('status')} ({err.get('field') or '-'})")
+    return js.get("data") or {}
+
+
+def _observe(path: str, t0: float, result: str) -> None:
+    WG_LATENCY.observe(time.perf_counter() - t0, endpoint=path)
+    WG_REQUESTS.inc(endpoint=path, result=result)
+
+
+async def _aget(client: httpx.AsyncClient, path: str, params: Dict[str, str], kwargs: Dict[str, Any]) -> httpx.Response:
+    if CASSETTE.replaying:
+        return await CASSETTE.replay_async(path, params)
+    await RATE_LIMITER.acquire()
+    t0 = time.perf_counter()
+    r = await client.get(f"{WOT_REALM}{path}", params=params, **kwargs)
+    if CASSETTE.recording:
+        CASSETTE.record(path, params, r, time.perf_counter() - t0)
+    return r
+
+
+def _get(client: httpx.Client, path: str, params: Dict[str, str], kwargs: Dict[str, Any]) -> httpx.Response:
+    if CASSETTE.replaying:
+        return CASSETTE.replay(path, params)
+    RATE_LIMITER.acquire_sync()
+    t0 = time.perf_counter()
+    r = client.get(f"{WOT_REALM}{path}", params=params, **kwargs)
+    if CASSETTE.recording:
+        CASSETTE.record(path, params, r, time.perf_counter() - t0)
+    return r
+
+
+async def wg_get(client: httpx.AsyncClient, path: str, timeout: Optional[float] = None, **params: Any) -> Any:
+    """GET assíncrono em WOT_REALM + path; retorna o campo `data` da resposta."""
+    _count(path)
+    kwargs = {"timeout": timeout} if timeout is not None else {}
+    t0 = time.perf_counter()
+    try:
+        r = await _aget(client, path, build_params(**params), kwargs)
+        r.raise_for_status()
+        data = _data(path, r.json())
+    except Exception:
+        _observe(path, t0, "error")
+        raise
+    _observe(path, t0, "ok")
+    return data
+
+
+def wg_get_sync(client: httpx.Client, path: str, timeout: Optional[float] = None, **params: Any) -> Any:
+    """Variante síncrona (registro / scripts)."""
+    _count(path)
+    kwargs = {"timeout": timeout} if timeout is not None else {}
+    t0 = time.perf_counter()
+    try:
+        r = _get(client, path, build_params(**params), kwargs)
+        r.raise_for_status()
+        data = _data(path, r.json())
+    except Exception:
+        _observe(path, t0, "error")
+        raise
+    _observe(path, t0, "ok")
+    return data
+
+
+def call_counts() -> Dict[str, int]:
+    with _counts_lock:
+        return dict(CALL_COUNTS)
+
+
+async def fetch_tank_stats(
+    client: httpx.AsyncClient,
+    account_id: int,
+    tank_ids: Iterable[int],
+    sem: asyncio.Semaphore,
+) -> Dict[int, Dict[str, Any]]:
+    """
+    /wot/tanks/stats/ de uma conta, só para os tank_ids pedidos.
+    Retorna {tank_id: {"mark_of_mastery": .., "battles": .., "damage_dealt": .., ...}}.
+    Lotes com erro são registrados e ignorados (a conta fica só com battles/wins).
+    """
+    ids: List[int] = sorted({int(t) for t in tank_ids})
+    out: Dict[int, Dict[str, Any]] = {}
+    for i in range(0, len(ids), TANKS_STATS_BATCH):
+        batch = ids[i:i + TANKS_STATS_BATCH]
+        try:
+            async with sem:
+                data = await wg_get(
+                    client, "/wot/tanks/stats/",
+                    account_id=account_id, tank_id=batch, fields=TANK_STATS_FIELDS,
+                )
+        except Exception as exc:
+            logger.warning("Falha tanks/stats para %s (%d tanks): %s", account_id, len(batch), exc)
+            continue
+        for item in data.get(str(account_id)) or []:
+            try:
+                tid = int(item["tank_id"])
+            except (KeyError, TypeError, ValueError):
+                continue
+            stats = dict(item.get("all") or {})
+            stats["mark_of_mastery"] = item.get("mark_of_mastery")
+            out[tid] = stats
+    return out
@@ -0,0 +1,198 @@
+# app/utils/wn8.py
+"""
+WN8 por tank e por conta, calculado em lote (NumPy) depois que o sync grava
+a garagem — nada de loop Python por linha.
+
+Valores esperados vêm de um arquivo local no formato XVM
+(expected_tank_values_*.json):
+
+    {"header": {...}, "data": [{"IDNum": 1, "expDef": 0.9, "expFrag": 1.1,
+      "expSpot": 1.3, "expDamage": 950.0, "expWinRate": 53.1}, ...]}
+
+Caminho em WN8_EXPECTED_PATH. Sem arquivo, o estágio é pulado (wn8 fica NULL).
+Tanks sem damage/frags/spot/def gravados ou ausentes da tabela também ficam
+NULL e não entram no WN8 da conta.
+"""
+
+import os
+import json
+import logging
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import update
+from sqlmodel import Session, select
+
+from app.models import GarageTank, Player
+
+logger = logging.getLogger("wotcs.wn8")
+
+WN8_EXPECTED_PATH = Path(os.getenv("WN8_EXPECTED_PATH", "data/expected_tank_values.json"))
+WN8_UPDATE_BATCH = int(os.getenv("WN8_UPDATE_BATCH", "1000"))
+
+# colunas da matriz de valores esperados
+_EXP_FIELDS = ("expDamage", "expFrag", "expSpot", "expDef", "expWinRate")
+
+ExpectedTable = Tuple[np.ndarray, np.ndarray]  # (tank_ids ordenados, matriz n x 5)
+
+_expected_cache: Dict[str, object] = {"key": None, "table": None}
+
+
+def load_expected_values(path: Optional[Path] = None) -> Optional[ExpectedTable]:
+    """Lê (e mantém em memória até o arquivo mudar) a tabela de valores esperados."""
+    path = Path(path or WN8_EXPECTED_PATH)
+    try:
+        st = path.stat()
+    except OSError:
+        if _expected_cache["key"] != ("missing", str(path)):
+            logger.warning("Arquivo de valores esperados do WN8 não encontrado: %s", path)
+            _expected_cache.update(key=("missing", str(path)), table=None)
+        return None
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    if _expected_cache["key"] == key:
+        return _expected_cache["table"]  # type: ignore[return-value]
+
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            js = json.load(f)
+        data = js.get("data", js) if isinstance(js, dict) else js
+        rows = []
+        for item in data or []:
+            try:
+                rows.append((int(item["IDNum"]), *(float(item[k]) for k in _EXP_FIELDS)))
+            except (KeyError, TypeError, ValueError):
+                continue
+    except Exception:
+        logger.exception("Falha ao ler valores esperados do WN8 (%s)", path)
+        return None
+
+    if not rows:
+        logger.warning("Tabela de valores esperados vazia: %s", path)
+        return None
+    arr = np.array(rows, dtype=np.float64)
+    order = np.argsort(arr[:, 0], kind="stable")
+    table = (arr[order, 0].astype(np.int64), arr[order, 1:])
+    _expected_cache.update(key=key, table=table)
+    logger.info("Valores esperados do WN8 carregados: %d tanks (%s)", len(rows), path)
+    return table
+
+
+def _lookup(expected: ExpectedTable, tank_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Linha de valores esperados para cada tank_id + máscara de encontrados."""
+    ids, values = expected
+    pos = np.searchsorted(ids, tank_ids)
+    pos = np.clip(pos, 0, len(ids) - 1)
+    found = ids[pos] == tank_ids
+    return values[pos], found
+
+
+def wn8_formula(r_dmg, r_frag, r_spot, r_def, r_win) -> np.ndarray:
+    """Fórmula WN8 padrão sobre arrays de razões (real / esperado)."""
+    r_win_c = np.maximum(0.0, (r_win - 0.71) / (1 - 0.71))
+    r_dmg_c = np.maximum(0.0, (r_dmg - 0.22) / (1 - 0.22))
+    r_frag_c = np.maximum(0.0, np.minimum(r_dmg_c + 0.2, (r_frag - 0.12) / (1 - 0.12)))
+    r_spot_c = np.maximum(0.0, np.minimum(r_dmg_c + 0.1, (r_spot - 0.38) / (1 - 0.38)))
+    r_def_c = np.maximum(0.0, np.minimum(r_dmg_c + 0.1, (r_def - 0.10) / (1 - 0.10)))
+    return (
+        980 * r_dmg_c
+        + 210 * r_dmg_c * r_frag_c
+        + 155 * r_frag_c * r_spot_c
+        + 75 * r_def_c * r_frag_c
+        + 145 * np.minimum(1.8, r_win_c)
+    )
+
+
+def compute_wn8(
+    account_ids: np.ndarray,
+    tank_ids: np.ndarray,
+    stats: np.ndarray,
+    expected: ExpectedTable,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    stats: matriz n x 6 (battles, wins, damage_dealt, frags, spotted, dropped_capture_points).
+
+    Retorna (wn8 por linha com NaN onde não calculável, contas únicas, wn8 por conta).
+    O WN8 da conta usa as somas (real vs. esperado * batalhas) de todos os tanks válidos.
+    """
+    battles = stats[:, 0]
+    exp, found = _lookup(expected, tank_ids)
+    valid = found & (battles > 0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # esperado ponderado por batalhas: mesma base para tank e conta
+        exp_tot = exp * battles[:, None]
+        real = np.column_stack((
+            stats[:, 2],            # dano
+            stats[:, 3],            # frags
+            stats[:, 4],            # spots
+            stats[:, 5],            # defesa
+            stats[:, 1] * 100.0,    # vitórias em %
+        ))
+        ratios = real / exp_tot
+        tank_wn8 = wn8_formula(*ratios.T)
+    tank_wn8 = np.where(valid & np.isfinite(tank_wn8), tank_wn8, np.nan)
+
+    accounts, inverse = np.unique(account_ids, return_inverse=True)
+    ok = ~np.isnan(tank_wn8)
+    n = len(accounts)
+    sums_real = np.stack([np.bincount(inverse[ok], weights=real[ok, k], minlength=n) for k in range(5)], axis=1)
+    sums_exp = np.stack([np.bincount(inverse[ok], weights=exp_tot[ok, k], minlength=n) for k in range(5)], axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        acc_wn8 = wn8_formula(*(sums_real / sums_exp).T)
+    acc_wn8 = np.where(np.isfinite(acc_wn8), acc_wn8, np.nan)
+    return tank_wn8, accounts, acc_wn8
+
+
+def update_wn8(engine, account_ids: Optional[Iterable[int]] = None) -> Dict[str, int]:
+    """
+    Estágio de análise do sync: lê as colunas tipadas da garagem, calcula o WN8
+    de todas as linhas de uma vez e grava GarageTank.wn8 / Player.wn8 em lote.
+    """
+    expected = load_expected_values()
+    if expected is None:
+        return {"tanks": 0, "accounts": 0}
+
+    q = select(
+        GarageTank.id, GarageTank.account_id, GarageTank.tank_id,
+        GarageTank.battles, GarageTank.wins, GarageTank.damage_dealt,
+        GarageTank.frags, GarageTank.spotted, GarageTank.dropped_capture_points,
+    )
+    scope = None
+    if account_ids is not None:
+        scope = [int(a) for a in account_ids]
+        q = q.where(GarageTank.account_id.in_(scope))
+
+    with Session(engine) as s:
+        rows = s.exec(q).all()
+        if not rows:
+            return {"tanks": 0, "accounts": 0}
+
+        arr = np.array(
+            [tuple(np.nan if v is None else v for v in r) for r in rows],
+            dtype=np.float64,
+        )
+        row_ids = arr[:, 0].astype(np.int64)
+        tank_wn8, accounts, acc_wn8 = compute_wn8(
+            arr[:, 1].astype(np.int64), arr[:, 2].astype(np.int64), arr[:, 3:], expected
+        )
+
+        tank_params = [
+            {"id": int(i), "wn8": None if np.isnan(w) else round(float(w), 2)}
+            for i, w in zip(row_ids.tolist(), tank_wn8.tolist())
+        ]
+        for i in range(0, len(tank_params), WN8_UPDATE_BATCH):
+            s.execute(update(GarageTank), tank_params[i:i + WN8_UPDATE_BATCH])
+
+        acc_values = {int(a): (None if np.isnan(w) else round(float(w), 2)) for a, w in zip(accounts.tolist(), acc_wn8.tolist())}
+        for acc in scope or []:
+            acc_values.setdefault(acc, None)
+        existing = set(s.exec(select(Player.account_id).where(Player.account_id.in_(list(acc_values)))).all())
+        player_params = [{"account_id": a, "wn8": w} for a, w in acc_values.items() if a in existing]
+        if player_params:
+            s.execute(update(Player), player_params)
+        s.commit()
+
+    computed = int(np.count_nonzero(~np.isnan(tank_wn8)))
+    logger.info("WN8 calculado: %d/%d tanks, %d contas", computed, len(rows), len(player_params))
+    return {"tanks": computed, "accounts": len(player_params)}
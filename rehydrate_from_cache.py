@@ -1,26 +1,45 @@
 # scripts/rehydrate_from_cache.py
+"""
+Preenche metadados faltando em garagetank (nation, type, is_premium, nome,
+imagem, raw_json, last_updated) a partir de data/tank_cache.json.
+
+Set-based: os metadados dependem só do tank_id, então o trabalho é feito
+por veículo, não por linha. As linhas são agrupadas por tank_id (consulta
+agregada lida em streaming, cursor server-side no PostgreSQL) e cada lote
+de REHYDRATE_BATCH_SIZE veículos vira UM UPDATE ... FROM (VALUES ...) que
+só toca linhas com algum campo faltando. Memória constante em relação ao
+tamanho da tabela. UPDATE ... FROM: PostgreSQL ou SQLite >= 3.33.
+
+Uso:
+    python rehydrate_from_cache.py
+"""
 import os
 import json
 import time
-from typing import Dict, Any
+from typing import Dict, Any, Iterator, List, Tuple
 
-from sqlmodel import Session, select
+from sqlalchemy import text, bindparam, DateTime
 from dotenv import load_dotenv
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 
 # garantir que o package 'app' esteja importável (execute a partir da raiz do projeto)
 load_dotenv()
 
 from app.db import engine
-from app.models import GarageTank, Player
 
 CACHE_PATH = os.getenv("TANK_CACHE_PATH", "data/tank_cache.json")
-BATCH_SIZE = int(os.getenv("REHYDRATE_BATCH_SIZE", "200"))
+# veículos por UPDATE: cada UPDATE percorre garagetank uma vez (tank_id não tem índice),
+# então lotes grandes = menos varreduras. 7 parâmetros por veículo; o teto respeita o
+# limite de variáveis do SQLite (32766).
+BATCH_SIZE = max(1, min(int(os.getenv("REHYDRATE_BATCH_SIZE", "1000")), 4000))
+STREAM_CHUNK = int(os.getenv("REHYDRATE_STREAM_CHUNK", "1000"))  # linhas por fetch do cursor
+STALE_AFTER = timedelta(days=1)  # last_updated mais antigo que isso é renovado
+
+IS_POSTGRES = engine.dialect.name == "postgresql"
 
 def load_tank_cache(path: str = CACHE_PATH) -> Dict[str, Any]:
     if not os.path.exists(path):
         print(f"[WARN] cache não encontrado em {path}")
-        gt.last_updated = datetime.fromtimestamp(int(time.time()), tz=timezone.utc)
         return {}
     with open(path, "r", encoding="utf-8") as f:
         try:
@@ -43,120 +62,141 @@ def pick_image_from_meta(meta: dict) -> str | None:
             return icon
     return None
 
+def vehicle_values(tid: int, meta: dict) -> Dict[str, Any]:
+    """Uma linha do VALUES: o que o cache sabe sobre o veículo."""
+    nation = meta.get("nation") or meta.get("country") or meta.get("nation_name")
+    vtype = meta.get("type") or meta.get("vehicle_type")
+    name = meta.get("name") or meta.get("short_name") or meta.get("localized_name")
+    return {
+        "tank_id": int(tid),
+        "name": str(name) if name else None,
+        "nation": str(nation) if nation else None,
+        "vtype": str(vtype) if vtype else None,
+        "is_premium": bool(meta.get("is_premium", False)),
+        "image_url": pick_image_from_meta(meta),
+        "meta": json.dumps(meta, ensure_ascii=False),
+    }
+
+def iter_tank_groups(conn) -> Iterator[Tuple[int, int]]:
+    """(tank_id, linhas) agrupado no banco; lido em streaming (cursor server-side no PostgreSQL)."""
+    result = conn.execution_options(stream_results=True, yield_per=STREAM_CHUNK).execute(
+        text("SELECT tank_id, count(*) FROM garagetank WHERE tank_id IS NOT NULL GROUP BY tank_id")
+    )
+    for tid, n in result:
+        yield int(tid), int(n)
+
+def _update_sql(n: int) -> str:
+    cols = ("tank_id", "name", "nation", "vtype", "is_premium", "image_url", "meta")
+    # VALUES sem lista de colunas (SQLite não aceita `AS v(a, b)`): column1..N nos dois bancos
+    rows = ", ".join(
+        "(" + ", ".join(f":{c}_{i}" for c in cols) + ")" for i in range(n)
+    )
+    false = "false" if IS_POSTGRES else "0"
+    # SQLite: CAST(... AS JSON) teria afinidade NUMERIC; o texto já é o JSON
+    meta_expr = "CAST(v.meta AS JSON)" if IS_POSTGRES else "v.meta"
+    # Column(JSON) grava None como o texto JSON 'null', não como NULL SQL
+    raw_missing = "(garagetank.raw_json IS NULL OR CAST(garagetank.raw_json AS TEXT) = 'null')"
+    missing = f"""(
+            garagetank.is_premium IS NULL OR (garagetank.is_premium = {false} AND v.is_premium = {'true' if IS_POSTGRES else '1'})
+            OR (COALESCE(garagetank.nation, '') = '' AND v.nation IS NOT NULL)
+            OR (COALESCE(garagetank."type", '') = '' AND v.vtype IS NOT NULL)
+            OR ((garagetank.tank_name IS NULL OR garagetank.tank_name = '' OR garagetank.tank_name LIKE 'Tank %') AND v.name IS NOT NULL)
+            OR (COALESCE(garagetank.image_url, '') = '' AND v.image_url IS NOT NULL)
+            OR {raw_missing}
+            OR garagetank.last_updated IS NULL OR garagetank.last_updated < :stale
+        )"""
+    return f"""
+        UPDATE garagetank SET
+            is_premium = COALESCE(garagetank.is_premium, {false}) OR v.is_premium,
+            nation = COALESCE(NULLIF(garagetank.nation, ''), v.nation),
+            "type" = COALESCE(NULLIF(garagetank."type", ''), v.vtype),
+            tank_name = CASE
+                WHEN (garagetank.tank_name IS NULL OR garagetank.tank_name = '' OR garagetank.tank_name LIKE 'Tank %')
+                     AND v.name IS NOT NULL THEN v.name
+                ELSE garagetank.tank_name END,
+            image_url = COALESCE(NULLIF(garagetank.image_url, ''), v.image_url),
+            raw_json = CASE WHEN {raw_missing} THEN {meta_expr} ELSE garagetank.raw_json END,
+            last_updated = CASE
+                WHEN garagetank.last_updated IS NULL OR garagetank.last_updated < :stale THEN :now
+                ELSE garagetank.last_updated END
+        FROM (
+            SELECT column1 AS tank_id, column2 AS name, column3 AS nation, column4 AS vtype,
+                   column5 AS is_premium, column6 AS image_url, column7 AS meta
+            FROM (VALUES {rows}) AS vals
+        ) AS v
+        WHERE garagetank.tank_id = v.tank_id AND {missing}
+    """
+
+def apply_batch(batch: List[Dict[str, Any]], now: datetime) -> int:
+    """Um UPDATE para o lote inteiro de veículos; retorna linhas alteradas."""
+    params: Dict[str, Any] = {"now": now, "stale": now - STALE_AFTER}
+    for i, row in enumerate(batch):
+        for k, v in row.items():
+            params[f"{k}_{i}"] = v
+    stmt = text(_update_sql(len(batch))).bindparams(
+        bindparam("now", type_=DateTime(timezone=True)),
+        bindparam("stale", type_=DateTime(timezone=True)),
+    )
+    with engine.begin() as conn:
+        return max(0, conn.execute(stmt, params).rowcount or 0)
+
 def rehydrate_from_cache():
+    if engine.dialect.name == "sqlite" and engine.dialect.dbapi.sqlite_version_info < (3, 33):
+        print(f"[ERROR] SQLite {engine.dialect.dbapi.sqlite_version} não suporta UPDATE ... FROM (precisa >= 3.33)")
+        return
+
     tcache = load_tank_cache()
     if not tcache:
         print("[WARN] cache vazio — nada a fazer.")
         return
 
     updated = 0
-    skipped = 0
-    no_meta = 0
-    now_ts = int(time.time())
-
-    # Query all GarageTank entries (we'll update only if fields missing)
-    with Session(engine) as s:
-        q = select(GarageTank)
-        all_rows = s.exec(q).all()
-        total = len(all_rows)
-        print(f"[INFO] Found {total} GarageTank rows to inspect.")
-
-        # Iterate in batches to commit incrementalmente
-        for i in range(0, total, BATCH_SIZE):
-            batch = all_rows[i:i+BATCH_SIZE]
-            for gt in batch:
+    scanned = 0
+    vehicles = 0
+    no_meta_rows = 0
+    no_meta_vehicles = 0
+    now = datetime.now(timezone.utc)
+    t0 = time.perf_counter()
+
+    batch: List[Dict[str, Any]] = []
+    batch_rows = 0
+    with engine.connect() as reader:
+        for tid, n in iter_tank_groups(reader):
+            scanned += n
+            meta = tcache.get(str(tid)) or {}
+            if not meta:
+                # nada a preencher a partir do cache
+                no_meta_rows += n
+                no_meta_vehicles += 1
+                continue
+            batch.append(vehicle_values(tid, meta))
+            batch_rows += n
+            vehicles += 1
+            if len(batch) >= BATCH_SIZE:
                 try:
-                    tid = getattr(gt, "tank_id", None)
-                    if not tid:
-                        skipped += 1
-                        continue
-                    meta = tcache.get(str(tid)) or tcache.get(int(tid)) or {}
-                    if not meta:
-                        no_meta += 1
-                        # nada a preencher a partir do cache, pular
-                        continue
-
-                    changed = False
-
-                    # is_premium
-                    if (not hasattr(gt, "is_premium") or getattr(gt, "is_premium") in (None, False)):
-                        if hasattr(gt, "is_premium"):
-                            val = bool(meta.get("is_premium", False))
-                            setattr(gt, "is_premium", val)
-                            changed = True
-
-                    # nation (pode vir como 'nation' ou 'country')
-                    if (not hasattr(gt, "nation") or not getattr(gt, "nation")):
-                        if hasattr(gt, "nation"):
-                            nat = meta.get("nation") or meta.get("country") or meta.get("nation_name")
-                            if nat:
-                                setattr(gt, "nation", str(nat))
-                                changed = True
-
-                    # type / vehicle type
-                    if (not hasattr(gt, "type") or not getattr(gt, "type")):
-                        if hasattr(gt, "type"):
-                            vtype = meta.get("type") or meta.get("vehicle_type")
-                            if vtype:
-                                setattr(gt, "type", str(vtype))
-                                changed = True
-
-                    # name (sometimes present but check)
-                    if hasattr(gt, "tank_name") and (not getattr(gt, "tank_name") or getattr(gt, "tank_name").startswith("Tank ")):
-                        name = meta.get("name") or meta.get("short_name") or meta.get("localized_name")
-                        if name:
-                            setattr(gt, "tank_name", str(name))
-                            changed = True
-
-                    # image_url
-                    if (hasattr(gt, "image_url") and (not getattr(gt, "image_url"))):
-                        img = pick_image_from_meta(meta)
-                        if img:
-                            setattr(gt, "image_url", img)
-                            changed = True
-
-                    # raw_json / raw_stats: we will store the metadata (not the player's stats)
-                    # Prefer field raw_json; fallback raw_stats
-                    meta_blob = None
-                    if hasattr(gt, "raw_json"):
-                        current = getattr(gt, "raw_json")
-                        if not current:
-                            meta_blob = json.dumps(meta)
-                            setattr(gt, "raw_json", meta_blob)
-                            changed = True
-                    elif hasattr(gt, "raw_stats"):
-                        current = getattr(gt, "raw_stats")
-                        if not current:
-                            meta_blob = json.dumps(meta)
-                            setattr(gt, "raw_stats", meta_blob)
-                            changed = True
-
-                    # last_updated
-                    if hasattr(gt, "last_updated"):
-                        # atualiza para agora se estiver vazio ou muito antigo
-                        cur_ts = getattr(gt, "last_updated") or 0
-                        if not cur_ts or (now_ts - int(cur_ts) > 60*60*24):  # 1 dia
-                            setattr(gt, "last_updated", now_ts)
-                            changed = True
-
-                    if changed:
-                        s.add(gt)
-                        updated += 1
-                    else:
-                        skipped += 1
-
+                    updated += apply_batch(batch, now)
                 except Exception as e:
-                    print(f"[ERROR] falha ao processar tank_id={getattr(gt,'tank_id',None)}: {e}")
-                    s.rollback()
-
-            # commit batch
+                    print(f"[ERROR] UPDATE falhou para {len(batch)} veículos ({batch_rows} linhas): {e}")
+                _progress(scanned, updated, t0)
+                batch, batch_rows = [], 0
+        if batch:
             try:
-                s.commit()
+                updated += apply_batch(batch, now)
             except Exception as e:
-                print(f"[ERROR] commit falhou no batch: {e}")
-                s.rollback()
+                print(f"[ERROR] UPDATE falhou para {len(batch)} veículos ({batch_rows} linhas): {e}")
+
+    elapsed = time.perf_counter() - t0
+    rate = scanned / elapsed if elapsed > 0 else 0.0
+    print(
+        f"[RESULT] Rehydrate finished. updated={updated}, skipped={scanned - updated - no_meta_rows}, "
+        f"no_meta={no_meta_rows} ({no_meta_vehicles} veículos), vehicles={vehicles}, "
+        f"rows={scanned} em {elapsed:.2f}s ({rate:,.0f} linhas/s)"
+    )
 
-    print(f"[RESULT] Rehydrate finished. updated={updated}, skipped={skipped}, no_meta={no_meta}")
+def _progress(scanned: int, updated: int, t0: float) -> None:
+    elapsed = time.perf_counter() - t0
+    rate = scanned / elapsed if elapsed > 0 else 0.0
+    print(f"[INFO] {scanned} linhas verificadas, {updated} atualizadas ({rate:,.0f} linhas/s)")
 
 if __name__ == "__main__":
-    rehydrate_from_cache()
\ No newline at end of file
+    rehydrate_from_cache()
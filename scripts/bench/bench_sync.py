@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+scripts/bench/bench_sync.py
+
+Benchmark do sync completo (`fetch_and_sync`) contra o fake WG local
+(scripts/bench/fake_wg.py) com clãs sintéticos de 50, 500 e 5.000 membros.
+
+Uso:
+    python scripts/bench/bench_sync.py
+    python scripts/bench/bench_sync.py --sizes 50,500 --tanks 60 --latency-ms 20 --json bench_sync.json
+    python scripts/bench/bench_sync.py --sizes 500 --error-rate 0.02 --rps 50
+    python scripts/bench/bench_sync.py --sizes 200 --clans 3   # N clãs de 200 numa instalação
+
+Cada tamanho roda isolado: um servidor fake novo e um processo filho com
+banco SQLite e data/ próprios (diretório temporário), para que o pico de RSS
+seja só daquele sync. Reporta tempo total, chamadas à API (lado do app e do
+servidor), linhas gravadas e pico de RSS.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import subprocess
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+CLAN_ID = 500_000_001
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux: KiB; macOS: bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+# -----------------------------
+# processo filho: um sync
+# -----------------------------
+def run_child() -> int:
+    import asyncio
+    import logging
+
+    logging.basicConfig(level=os.getenv("BENCH_LOG_LEVEL", "WARNING"), format="%(asctime)s %(levelname)s %(message)s")
+
+    from sqlalchemy import text
+    from app.db import engine, init_db
+    from app import sync
+    from app.utils.wg_api import call_counts
+    from app.utils.sync_progress import SYNC_PROGRESS
+
+    init_db()
+    rss_before = _peak_rss_mb()
+    t0 = time.perf_counter()
+    asyncio.run(sync.fetch_and_sync())
+    wall = time.perf_counter() - t0
+
+    with engine.connect() as conn:
+        rows = {t: conn.execute(text(f"SELECT count(*) FROM {t}")).scalar() for t in ("player", "garagetank")}
+        by_clan = dict(conn.execute(text("SELECT clan_id, count(*) FROM garagetank GROUP BY clan_id")).all())
+    calls = call_counts()
+    print(json.dumps({
+        "wall_seconds": round(wall, 3),
+        "api_calls": sum(calls.values()),
+        "api_calls_by_endpoint": calls,
+        "rows": rows,
+        "garagetank_by_clan": {str(k): v for k, v in by_clan.items()},
+        "peak_rss_mb": _peak_rss_mb(),
+        "rss_after_imports_mb": rss_before,
+        "error": SYNC_PROGRESS.snapshot().get("error"),
+    }))
+    return 0
+
+
+# -----------------------------
+# orquestração
+# -----------------------------
+def _wait_ready(base_url: str, timeout: float = 30.0) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/_health", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"fake WG não respondeu em {base_url}")
+
+
+def bench_size(members: int, args) -> Dict[str, Any]:
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server_cmd = [
+        sys.executable, os.path.join(project_root, "scripts", "bench", "fake_wg.py"),
+        "--members", str(members), "--tanks", str(args.tanks), "--vehicles", str(args.vehicles),
+        "--clan-id", str(CLAN_ID), "--clans", str(args.clans), "--seed", str(args.seed), "--port", str(port),
+        "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+        "--error-rate", str(args.error_rate), "--rps", str(args.rps),
+    ]
+    server = subprocess.Popen(server_cmd)
+    try:
+        _wait_ready(base_url)
+        with tempfile.TemporaryDirectory(prefix="wotcs-bench-") as workdir:
+            env = dict(os.environ)
+            env.update({
+                "WOT_APP_ID": "bench",
+                "CLAN_IDS": ",".join(str(CLAN_ID + i) for i in range(args.clans)),
+                # orçamento do app = limite do fake (0 = sem limite nos dois)
+                "WG_RATE_LIMIT": str(args.rps),
+                "WOT_REALM": base_url,
+                "DATABASE_URL": f"sqlite:///{os.path.join(workdir, 'bench.sqlite3')}",
+                "SLEEP_BETWEEN_BATCHES": str(args.sleep),
+                "PYTHONPATH": project_root + os.pathsep + env.get("PYTHONPATH", ""),
+            })
+            os.makedirs(os.path.join(workdir, "data"), exist_ok=True)
+            proc = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--child"],
+                cwd=workdir, env=env, capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                sys.stderr.write(proc.stderr)
+                raise RuntimeError(f"sync com {members} membros falhou (exit {proc.returncode})")
+            result = json.loads(proc.stdout.strip().splitlines()[-1])
+        result["server"] = httpx.get(f"{base_url}/_stats", timeout=5).json()
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    result["members"] = members * args.clans
+    result["clans"] = args.clans
+    result["tanks_per_member"] = args.tanks
+    result["members_per_second"] = round(result["members"] / result["wall_seconds"], 2) if result["wall_seconds"] else None
+    return result
+
+
+def _print_table(results: List[Dict[str, Any]]) -> None:
+    print(f"{'clãs':>5} {'membros':>8} {'tempo (s)':>10} {'contas/s':>9} {'chamadas':>9} {'garagetank':>11} {'pico RSS (MB)':>14}  erro")
+    for r in results:
+        print(
+            f"{r['clans']:>5} {r['members']:>8} {r['wall_seconds']:>10.2f} {r['members_per_second'] or 0:>9.1f} "
+            f"{r['api_calls']:>9} {r['rows']['garagetank']:>11} {str(r['peak_rss_mb']):>14}  {r['error'] or '-'}"
+        )
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark do sync contra o fake WG")
+    ap.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    ap.add_argument("--sizes", default="50,500,5000", help="membros por clã em cada execução, separados por vírgula")
+    ap.add_argument("--clans", type=int, default=1, help="clãs sincronizados juntos (CLAN_IDS)")
+    ap.add_argument("--tanks", type=int, default=60, help="tanks por membro")
+    ap.add_argument("--vehicles", type=int, default=800)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--latency-ms", type=float, default=20.0)
+    ap.add_argument("--jitter-ms", type=float, default=5.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--rps", type=float, default=0.0)
+    ap.add_argument("--sleep", type=float, default=0.0, help="SLEEP_BETWEEN_BATCHES do sync")
+    ap.add_argument("--json", dest="json_path", help="grava os resultados neste arquivo")
+    args = ap.parse_args(argv)
+
+    if args.child:
+        return run_child()
+
+    results = []
+    for members in (int(x) for x in args.sizes.split(",") if x.strip()):
+        print(f"-> {args.clans} × {members} membros ...", flush=True)
+        results.append(bench_size(members, args))
+    _print_table(results)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({"params": {k: v for k, v in vars(args).items() if k not in ("child", "json_path")},
+                       "results": results}, f, indent=2)
+        print(f"Resultados gravados em {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+scripts/bench/fake_wg.py
+
+Servidor local que imita a API pública da Wargaming para benchmarks do sync
+(sem gastar a cota do application_id nem depender da rede).
+
+Uso:
+    python scripts/bench/fake_wg.py --members 500 --tanks 60 --port 8900
+    python scripts/bench/fake_wg.py --members 5000 --latency-ms 80 --jitter-ms 40 --error-rate 0.01 --rps 20
+    python scripts/bench/fake_wg.py --members 500 --clans 3   # clan_id, clan_id+1, clan_id+2
+
+Depois aponte o app para ele:
+    WOT_REALM=http://127.0.0.1:8900 CLAN_ID=500000001 WOT_APP_ID=bench
+
+Endpoints: /wot/clans/info/, /wot/account/tanks/, /wot/account/info/,
+/wot/encyclopedia/vehicles/, /wot/tanks/stats/ — mesmo envelope da API real
+({"status": "ok", "data": ...} / {"status": "error", "error": {...}}).
+GET /_stats devolve contadores por endpoint e resultado.
+
+- latência: --latency-ms ± --jitter-ms por requisição;
+- falhas: --error-rate (0..1) responde SOURCE_NOT_AVAILABLE;
+- limite: --rps (token bucket, rajada = rps) responde REQUEST_LIMIT_EXCEEDED, como a WG.
+"""
+
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+# --- garantir project root no sys.path (para permitir "from scripts.bench ...")
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from scripts.bench.synthetic import SyntheticClan, BASE_ACCOUNT_ID
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1.0:
+                self.tokens -= 1.0
+                return True
+            return False
+
+
+def _ok(data: Any) -> JSONResponse:
+    return JSONResponse({"status": "ok", "meta": {"count": len(data) if hasattr(data, "__len__") else 1}, "data": data})
+
+
+def _error(code: int, message: str, field: Optional[str] = None) -> JSONResponse:
+    # a WG responde 200 com status=error
+    return JSONResponse({"status": "error", "error": {"code": code, "message": message, "field": field, "value": None}})
+
+
+def _ids(value: Optional[str]):
+    if not value:
+        return []
+    return [int(x) for x in str(value).split(",") if x.strip()]
+
+
+def create_app(
+    clan: Union[SyntheticClan, Sequence[SyntheticClan]],
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    error_rate: float = 0.0,
+    rps: float = 0.0,
+    seed: int = 42,
+) -> FastAPI:
+    app = FastAPI(title="Fake WG API")
+    clans: List[SyntheticClan] = [clan] if isinstance(clan, SyntheticClan) else list(clan)
+    by_id = {c.clan_id: c for c in clans}
+    catalog = clans[0]  # enciclopédia compartilhada
+
+    def _owner(account_id: int) -> Optional[SyntheticClan]:
+        for c in clans:
+            if c.is_member(account_id):
+                return c
+        return None
+    stats: Counter = Counter()
+    bucket = TokenBucket(rps) if rps > 0 else None
+    rng = random.Random(seed)
+
+    async def _gate(request: Request, endpoint: str) -> Optional[JSONResponse]:
+        """Latência, limite de taxa e falhas aleatórias; None = segue."""
+        delay = latency_ms + (rng.uniform(-jitter_ms, jitter_ms) if jitter_ms else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000.0)
+        if not request.query_params.get("application_id"):
+            stats[(endpoint, "invalid_app_id")] += 1
+            return _error(407, "INVALID_APPLICATION_ID", "application_id")
+        if bucket is not None and not bucket.take():
+            stats[(endpoint, "rate_limited")] += 1
+            return _error(407, "REQUEST_LIMIT_EXCEEDED")
+        if error_rate and rng.random() < error_rate:
+            stats[(endpoint, "error")] += 1
+            return _error(504, "SOURCE_NOT_AVAILABLE")
+        stats[(endpoint, "ok")] += 1
+        return None
+
+    @app.get("/wot/clans/info/")
+    async def clans_info(request: Request, clan_id: str = ""):
+        if (err := await _gate(request, "clans/info")) is not None:
+            return err
+        data = {}
+        for cid in _ids(clan_id):
+            c = by_id.get(cid)
+            data[str(cid)] = {
+                "clan_id": cid, "tag": f"BN{cid % 100:02d}", "name": f"Synthetic Clan {cid}",
+                "members_count": len(c.account_ids), "members": c.members(),
+            } if c is not None else None
+        return _ok(data)
+
+    @app.get("/wot/account/tanks/")
+    async def account_tanks(request: Request, account_id: str = ""):
+        if (err := await _gate(request, "account/tanks")) is not None:
+            return err
+        out = {}
+        for a in _ids(account_id):
+            c = _owner(a)
+            out[str(a)] = c.account_tanks(a) if c is not None else None
+        return _ok(out)
+
+    @app.get("/wot/account/info/")
+    async def account_info(request: Request, account_id: str = ""):
+        if (err := await _gate(request, "account/info")) is not None:
+            return err
+        ids = _ids(account_id)
+        if len(ids) > 100:
+            return _error(407, "ACCOUNT_ID_LIST_LIMIT_EXCEEDED", "account_id")
+        out = {}
+        for a in ids:
+            c = _owner(a)
+            out[str(a)] = c.account_info(a) if c is not None else None
+        return _ok(out)
+
+    @app.get("/wot/encyclopedia/vehicles/")
+    async def encyclopedia_vehicles(request: Request, tank_id: str = ""):
+        if (err := await _gate(request, "encyclopedia/vehicles")) is not None:
+            return err
+        ids = _ids(tank_id)
+        if len(ids) > 100:
+            return _error(407, "TANK_ID_LIST_LIMIT_EXCEEDED", "tank_id")
+        return _ok(catalog.vehicles(ids or None))
+
+    @app.get("/wot/tanks/stats/")
+    async def tanks_stats(request: Request, account_id: str = "", tank_id: str = ""):
+        if (err := await _gate(request, "tanks/stats")) is not None:
+            return err
+        ids = _ids(tank_id)
+        if len(ids) > 100:
+            return _error(407, "TANK_ID_LIST_LIMIT_EXCEEDED", "tank_id")
+        acc = int(account_id)
+        c = _owner(acc)
+        return _ok({str(acc): c.tank_stats(acc, ids or None) if c is not None else None})
+
+    @app.get("/_stats")
+    async def server_stats():
+        out: Dict[str, Dict[str, int]] = {}
+        for (endpoint, result), n in sorted(stats.items()):
+            out.setdefault(endpoint, {})[result] = n
+        return {"requests": out, "total": sum(stats.values())}
+
+    @app.get("/_health")
+    async def health():
+        return {"status": "ok", "members": sum(len(c.account_ids) for c in clans), "clan_ids": sorted(by_id)}
+
+    return app
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Fake WG API para benchmarks do sync")
+    ap.add_argument("--members", type=int, default=50)
+    ap.add_argument("--tanks", type=int, default=60, help="tanks por membro")
+    ap.add_argument("--vehicles", type=int, default=800, help="tamanho da enciclopédia")
+    ap.add_argument("--clan-id", type=int, default=500_000_001)
+    ap.add_argument("--clans", type=int, default=1, help="clãs de --members cada (clan_id consecutivos)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--rps", type=float, default=0.0, help="0 = sem limite")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8900)
+    args = ap.parse_args(argv)
+
+    import uvicorn
+
+    clans = [
+        SyntheticClan(args.members, args.tanks, args.vehicles, args.clan_id + i, args.seed,
+                      account_base=BASE_ACCOUNT_ID + i * 10_000_000)
+        for i in range(max(1, args.clans))
+    ]
+    app = create_app(clans, args.latency_ms, args.jitter_ms, args.error_rate, args.rps, args.seed)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,153 @@
+# scripts/bench/synthetic.py
+"""
+Gerador determinístico de um clã sintético (N membros × M tanks) para os
+benchmarks — mesmas respostas para a mesma seed, sem guardar tudo em memória:
+a garagem de cada conta é derivada de (seed, account_id) sob demanda.
+
+    clan = SyntheticClan(members=500, tanks_per_member=60)
+    clan.members()                 # /wot/clans/info/
+    clan.account_tanks(acc)        # /wot/account/tanks/
+    clan.tank_stats(acc, [tids])   # /wot/tanks/stats/
+    clan.account_info(acc)         # /wot/account/info/
+    clan.vehicles([tids])          # /wot/encyclopedia/vehicles/
+"""
+
+import random
+from typing import Any, Dict, Iterable, List, Optional
+
+NATIONS = ("ussr", "germany", "usa", "france", "uk", "china", "japan", "czech", "sweden", "poland", "italy")
+TYPES = ("heavyTank", "mediumTank", "lightTank", "AT-SPG", "SPG")
+# distribuição aproximada da enciclopédia (mais veículos nos tiers médios)
+TIER_WEIGHTS = (4, 6, 8, 9, 10, 11, 11, 12, 10, 9)
+
+BASE_ACCOUNT_ID = 1_000_000_000
+BASE_TIMESTAMP = 1_700_000_000
+
+
+class SyntheticClan:
+    def __init__(
+        self,
+        members: int = 50,
+        tanks_per_member: int = 60,
+        vehicles: int = 800,
+        clan_id: int = 500_000_001,
+        seed: int = 42,
+        account_base: int = BASE_ACCOUNT_ID,
+    ):
+        self.clan_id = clan_id
+        self.seed = seed
+        self.tanks_per_member = min(tanks_per_member, vehicles)
+        # vários clãs no mesmo fake: faixas de account_id distintas, mesma enciclopédia (mesma seed)
+        self.account_base = account_base
+        self.account_ids = [account_base + i for i in range(members)]
+        self._vehicles = self._build_vehicles(vehicles)
+        self._vehicle_ids = sorted(self._vehicles)
+
+    # -------------------------
+    # catálogo
+    # -------------------------
+    def _build_vehicles(self, n: int) -> Dict[int, Dict[str, Any]]:
+        rng = random.Random(self.seed)
+        out = {}
+        for i in range(n):
+            nation_idx = i % len(NATIONS)
+            tank_id = (i + 1) * 256 + nation_idx * 16 + 1  # mesmo "formato" dos ids reais
+            tier = rng.choices(range(1, 11), weights=TIER_WEIGHTS)[0]
+            out[tank_id] = {
+                "tank_id": tank_id,
+                "name": f"Synthetic {NATIONS[nation_idx].upper()} T{tier} #{i}",
+                "tier": tier,
+                "nation": NATIONS[nation_idx],
+                "type": rng.choice(TYPES),
+                "is_premium": rng.random() < 0.15,
+                "images": {
+                    "small_icon": f"https://example.invalid/small/{tank_id}.png",
+                    "big_icon": f"https://example.invalid/big/{tank_id}.png",
+                },
+            }
+        return out
+
+    def vehicles(self, tank_ids: Optional[Iterable[int]] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+        ids = self._vehicle_ids if tank_ids is None else tank_ids
+        return {str(t): self._vehicles.get(int(t)) for t in ids}
+
+    # -------------------------
+    # contas
+    # -------------------------
+    def _rng(self, account_id: int) -> random.Random:
+        return random.Random(self.seed * 1_000_003 + account_id)
+
+    def is_member(self, account_id: int) -> bool:
+        return self.account_base <= account_id < self.account_base + len(self.account_ids)
+
+    def nickname(self, account_id: int) -> str:
+        return f"bench_{account_id - BASE_ACCOUNT_ID:05d}"
+
+    def members(self) -> List[Dict[str, Any]]:
+        return [
+            {"account_id": acc, "account_name": self.nickname(acc), "role": "private",
+             "joined_at": BASE_TIMESTAMP - (acc - self.account_base) * 3600}
+            for acc in self.account_ids
+        ]
+
+    def vehicle_ids(self, tiers: Optional[Iterable[int]] = None) -> List[int]:
+        if tiers is None:
+            return self._vehicle_ids
+        wanted = set(tiers)
+        return [t for t in self._vehicle_ids if self._vehicles[t]["tier"] in wanted]
+
+    def vehicle(self, tank_id: int) -> Dict[str, Any]:
+        return self._vehicles[tank_id]
+
+    def garage(self, account_id: int, tiers: Optional[Iterable[int]] = None) -> List[int]:
+        pool = self.vehicle_ids(tiers)
+        return sorted(self._rng(account_id).sample(pool, min(self.tanks_per_member, len(pool))))
+
+    def counters(self, account_id: int, tank_id: int) -> Dict[str, int]:
+        rng = random.Random(self.seed ^ (account_id * 131 + tank_id))
+        battles = rng.randint(1, 1500)
+        tier = self._vehicles[tank_id]["tier"]
+        return {
+            "battles": battles,
+            "wins": int(battles * rng.uniform(0.42, 0.62)),
+            "damage_dealt": int(battles * tier * rng.uniform(120, 320)),
+            "damage_received": int(battles * tier * rng.uniform(90, 250)),
+            "frags": int(battles * rng.uniform(0.4, 1.4)),
+            "spotted": int(battles * rng.uniform(0.3, 2.0)),
+            "dropped_capture_points": int(battles * rng.uniform(0.1, 1.2)),
+            "survived_battles": int(battles * rng.uniform(0.2, 0.5)),
+            "xp": int(battles * tier * rng.uniform(60, 120)),
+            "mark_of_mastery": rng.choice((0, 0, 1, 2, 3, 4)),
+        }
+
+    def account_tanks(self, account_id: int) -> List[Dict[str, Any]]:
+        out = []
+        for tid in self.garage(account_id):
+            c = self.counters(account_id, tid)
+            out.append({
+                "tank_id": tid,
+                "mark_of_mastery": c["mark_of_mastery"],
+                "statistics": {"battles": c["battles"], "wins": c["wins"]},
+            })
+        return out
+
+    def tank_stats(self, account_id: int, tank_ids: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+        garage = set(self.garage(account_id))
+        wanted = garage if tank_ids is None else garage & {int(t) for t in tank_ids}
+        out = []
+        for tid in sorted(wanted):
+            c = self.counters(account_id, tid)
+            mark = c.pop("mark_of_mastery")
+            out.append({"tank_id": tid, "account_id": account_id, "mark_of_mastery": mark, "all": c})
+        return out
+
+    def account_info(self, account_id: int) -> Dict[str, Any]:
+        rng = self._rng(account_id)
+        return {
+            "account_id": account_id,
+            "nickname": self.nickname(account_id),
+            "clan_id": self.clan_id,
+            "created_at": BASE_TIMESTAMP - rng.randint(0, 10 * 365) * 86400,
+            "last_battle_time": BASE_TIMESTAMP + rng.randint(0, 90 * 86400),
+            "statistics": {"all": {"battles": sum(self.counters(account_id, t)["battles"] for t in self.garage(account_id))}},
+        }
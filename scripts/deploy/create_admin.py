@@ -19,8 +19,6 @@ O script:
 import sys
 import os
 import logging
-import hashlib
-import base64
 import json
 from typing import Optional
 
@@ -41,32 +39,13 @@ except Exception as exc:
     logger.exception("Falha ao importar módulos do app. Verifique se está executando a partir da raiz do projeto.")
     raise SystemExit(2) from exc
 
-# passlib (bcrypt)
+# hash de senha compartilhado com o app (pré-hash SHA256 -> base64-url -> bcrypt, custo BCRYPT_ROUNDS)
 try:
-    from passlib.context import CryptContext
+    from app.utils.passwords import hash_password
 except Exception as exc:
     logger.exception("passlib não disponível no venv. Instale passlib[bcrypt].")
     raise SystemExit(3) from exc
 
-# Contexto bcrypt (utilizado em todo o projeto)
-pwdctx = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-
-def _prehash_to_b64(password: str) -> str:
-    """
-    Pre-hash: SHA256 -> base64-url (sem '=' final).
-    Isso mantém a entrada para bcrypt dentro dos limites e padroniza.
-    """
-    digest = hashlib.sha256(password.encode("utf-8")).digest()
-    b64 = base64.urlsafe_b64encode(digest).rstrip(b"=").decode("ascii")
-    return b64
-
-
-def hash_password(pw: str) -> str:
-    short = _prehash_to_b64(pw)
-    # Note: bcrypt has a 72-byte input limit; pré-hash garante tamanho controlado.
-    return pwdctx.hash(short)
-
 
 def create_user(username: str, password: str, role: str = "member", account_id: Optional[int] = None) -> bool:
     """